@@ -1,16 +1,34 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from routers import (
     azimuthal_integrator,
+    frame_stats,
     initial_scans_fetching,
+    linecuts,
     q_vectors,
     raw_data_overview,
+    scans,
     scatter_subplot,
+    tiles,
 )
+from src.array_compression import ArrayEncodingMiddleware
+from src.tiled_async import close_async_tiled_clients
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Close the pooled connections to the Tiled server
+    await close_async_tiled_clients()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Middleware
+# Arrays are compressed with the codecs a client lists in X-Array-Encoding
+app.add_middleware(ArrayEncodingMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -28,6 +46,7 @@ app.include_router(raw_data_overview.router, tags=["Raw Data Overview"])
 app.include_router(
     initial_scans_fetching.router, prefix="/api", tags=["Initial Scans Fetching"]
 )
+app.include_router(scans.router, prefix="/api", tags=["Scans"])
 app.include_router(scatter_subplot.router, prefix="/api", tags=["Scatter Images"])
 app.include_router(
     azimuthal_integrator.router, prefix="/api", tags=["Azimuthal Integrator"]
@@ -36,6 +55,9 @@ app.include_router(
     azimuthal_integrator.router, prefix="/api", tags=["Azimuthal Calibration"]
 )
 app.include_router(q_vectors.router, prefix="/api", tags=["Q Vectors"])
+app.include_router(frame_stats.router, prefix="/api", tags=["Frame Stats"])
+app.include_router(linecuts.router, prefix="/api", tags=["Linecuts"])
+app.include_router(tiles.router, prefix="/api", tags=["Tiles"])
 
 
 @app.get("/")
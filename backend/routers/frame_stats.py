@@ -0,0 +1,76 @@
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Query
+from routers.params import get_session, parse_list_parameter
+from src.array_codec import encode_array, msgpack_response
+from src.frame_stats import get_frame_stats, query_percentiles
+
+router = APIRouter()
+
+
+@router.get("/frame-stats")
+def frame_stats(
+    frames: str = Query(default="0,1", description="Comma separated frame indices"),
+    percentiles: str = Query(
+        default="1,99", description="Comma separated percentiles in [0, 100]"
+    ),
+    log_scale: bool = Query(
+        default=False, description="Also return log10 percentiles of positive pixels"
+    ),
+    session=Depends(get_session),
+):
+    """
+    Answers percentile, min/max and log-scale range queries over the union of the
+    pixels of one or more frames, from the stats computed in the preprocessing
+    pass when each frame version is loaded.
+    """
+    frames_indices = parse_list_parameter(frames, int)
+    percentiles_values = parse_list_parameter(percentiles, float)
+
+    if not frames_indices:
+        raise HTTPException(status_code=400, detail="No frame requested")
+    if any(not 0 <= p <= 100 for p in percentiles_values):
+        raise HTTPException(status_code=400, detail="Percentiles must be in [0, 100]")
+    if any(not 0 <= index < session.num_of_files for index in frames_indices):
+        raise HTTPException(status_code=404, detail="Frame index out of range")
+
+    frames_stats = []
+    for index in frames_indices:
+        image_uri = session.all_files_uris[index]
+        frames_stats.append(
+            get_frame_stats(
+                session.get_loaded_frame_cache_key(image_uri),
+                lambda image_uri=image_uri: session.get_processed_frame(image_uri),
+            )
+        )
+
+    result_data = {
+        "frames": frames_indices,
+        "count": sum(stats["count"] for stats in frames_stats),
+        "min": float(np.nanmin([stats["min"] for stats in frames_stats])),
+        "max": float(np.nanmax([stats["max"] for stats in frames_stats])),
+        "percentiles": encode_array(percentiles_values, np.float64),
+        "values": encode_array(query_percentiles(frames_stats, percentiles_values)),
+        "per_frame": [
+            {
+                "count": stats["count"],
+                "min": stats["min"],
+                "max": stats["max"],
+                "mean": stats["mean"],
+                "std": stats["std"],
+                "histogram_counts": encode_array(stats["histogram_counts"]),
+                "histogram_edges": encode_array(stats["histogram_edges"]),
+            }
+            for stats in frames_stats
+        ],
+    }
+
+    if log_scale:
+        positive_values = query_percentiles(
+            frames_stats, percentiles_values, positive=True
+        )
+        result_data["min_positive"] = float(
+            np.nanmin([stats["min_positive"] for stats in frames_stats])
+        )
+        result_data["log_values"] = encode_array(np.log10(positive_values))
+
+    return msgpack_response(result_data)
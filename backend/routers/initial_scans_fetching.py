@@ -1,11 +1,13 @@
-import os
+import asyncio
 
-from dotenv import load_dotenv
-from fastapi import APIRouter, HTTPException
-from src.get_images_arrays_and_names import get_images_arrays_and_names
-from src.get_local_files_names import get_local_files_names
-from src.get_scans import get_scan_options
-from tiled.client import from_uri
+from fastapi import APIRouter, Depends, HTTPException
+from routers.params import get_session
+from src.array_codec import msgpack_response
+from src.array_compression import encoded_array_cache
+from src.array_quantization import quantize_arrays, validate_quantization
+from src.dataset_session import get_dataset_session_async, invalidate_dataset_session
+from src.frame_cache import frame_cache
+from src.frame_prefetch import frame_prefetcher
 
 # from fastapi_cache import FastAPICache
 # from fastapi_cache.backends.memory import MemoryCacheBackend
@@ -13,71 +15,42 @@ from tiled.client import from_uri
 router = APIRouter()
 
 
-@router.get("/initial-scans-fetching")
-async def get_initial_scans(left_image_index: int = 0, right_image_index: int = 1):
-
-    DEV_MODE = False
-
-    if DEV_MODE:
+async def get_initial_scans(
+    left_image_index: int = 0,
+    right_image_index: int = 1,
+    include_catalog: bool = False,
+):
+    """
+    Loads the two displayed frames. The scan names are paged through with
+    /api/scans, the full list and the mask are only included with include_catalog.
+
+    Also the dependency of the routes working on the displayed frames, it always
+    returns the plain dict of processed frames.
+    """
+    # The session keeps the clients, catalog and mask between requests
+    try:
+        session = await get_dataset_session_async()
+    except EnvironmentError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if session.DEV_MODE:
         right_image_index = 0
 
-    # Load the .env file
-    load_dotenv("../.env")
-    # Get the values of TILED_URI and MASK_FILE_NAME
-    tiled_uri = os.getenv("TILED_URI_IMAGES")
-    mask_uri = os.getenv("TILED_URI_MASK")  # "MASK_FILE_NAME")
-
-    mask_file_name = mask_uri.split("/")[-1]
-    tiled_api_key_images = os.getenv("TILED_API_KEY_IMAGES")
-    tiled_api_key_mask = os.getenv("TILED_API_KEY_MASK")
-
-    if not tiled_uri or not mask_uri or not tiled_api_key_images:
-        raise HTTPException(
-            status_code=500, detail="Environment variables not set correctly"
-        )
-
-    data_local_path = "../new_camera"  # "./SALT_DATA"
-    # data_local_path = "../SALT_DATA"
-
-    if DEV_MODE:
-        data_files_type = ".edf"
-        mask_file_name = "new_mask.npy"  # "mask.npy"
-        # mask_file_name = "mask.npy"
-        all_files_uris, mask_detector = get_local_files_names(
-            data_local_path, data_files_type, mask_file_name
-        )
-    else:
-
-        tiled_client = from_uri(tiled_uri, api_key=tiled_api_key_images)
-
-        TILED_BASE_URI = tiled_client.uri
-        scan_options = get_scan_options(tiled_client, TILED_BASE_URI)
-        all_files_uris = scan_options
-
-        mask_client = from_uri(mask_uri, api_key=tiled_api_key_mask)
-        mask_detector = mask_client.read()  # This retrieves the actual NumPy array
-        all_files_uris = [file_name.replace("/", "", 1) for file_name in all_files_uris]
-        all_files_uris = [file for file in all_files_uris if file != mask_file_name]
-
-    num_of_files = len(all_files_uris)
-
-    accumulated_data = {
-        "max_intensities": [],
-        "avg_intensities": [],
-        "image_names": [],
-    }
+    images_indices = [left_image_index, right_image_index]
 
-    images_arrays_full_res, images_names = get_images_arrays_and_names(
-        all_files_uris,
-        [left_image_index, right_image_index],
-        mask_detector,
-        tiled_uri,
-        data_local_path,
-        DEV_MODE,
-        accumulated_data,
-        initialization_mode=False,
+    # Frames being prefetched are awaited instead of loaded a second time
+    await frame_prefetcher.wait_for(
+        session, [session.all_files_uris[index] for index in images_indices]
     )
 
+    # Both frames are loaded concurrently without blocking the event loop
+    images_arrays_full_res, images_names = (
+        await session.get_images_arrays_and_names_async(images_indices)
+    )
+
+    # Load the neighbouring frames in the background, the user likely steps there
+    frame_prefetcher.schedule(session, images_indices)
+
     (
         scatter_image_array_1_full_res,
         scatter_image_array_2_full_res,
@@ -85,15 +58,101 @@ async def get_initial_scans(left_image_index: int = 0, right_image_index: int =
 
     left_image_name, right_image_name = images_names
 
-    return {
+    result_data = {
         "scatter_image_array_1_full_res": scatter_image_array_1_full_res,
         "scatter_image_array_2_full_res": scatter_image_array_2_full_res,
         "left_image_name": left_image_name,
         "right_image_name": right_image_name,
-        "num_of_files": num_of_files,
-        "all_files_uris": all_files_uris,
-        "mask_detector": mask_detector,
-        "tiled_uri": tiled_uri,
-        "data_local_path": data_local_path,
-        "DEV_MODE": DEV_MODE,
+        "num_of_files": session.num_of_files,
+        "tiled_uri": session.tiled_uri,
+        "data_local_path": session.data_local_path,
+        "DEV_MODE": session.DEV_MODE,
+    }
+
+    # Grow with the dataset (and the detector), only sent when asked for
+    if include_catalog:
+        result_data["all_files_uris"] = session.all_files_uris
+        result_data["mask_detector"] = session.mask_detector
+
+    return result_data
+
+
+def get_displayed_frames(
+    left_image_index: int = 0, right_image_index: int = 1, session=Depends(get_session)
+):
+    """
+    Lighter dependency than get_initial_scans for routes called repeatedly on the
+    displayed frames (e.g. while a slider moves): returns the session, the two
+    processed frames and their names, without waiting for or scheduling
+    prefetches.
+    """
+    # Same frames as get_initial_scans
+    if session.DEV_MODE:
+        right_image_index = 0
+
+    images_indices = [left_image_index, right_image_index]
+    if any(not 0 <= index < session.num_of_files for index in images_indices):
+        raise HTTPException(status_code=404, detail="Frame index out of range")
+
+    images_arrays, images_names = session.get_images_arrays_and_names(images_indices)
+    return session, images_arrays, images_names
+
+
+@router.get("/initial-scans-fetching")
+async def initial_scans_fetching(
+    left_image_index: int = 0,
+    right_image_index: int = 1,
+    include_catalog: bool = False,
+    quantize: str = None,
+    scaling: str = "linear",
+):
+    """
+    Returns the two displayed frames (see get_initial_scans).
+
+    With quantize (uint8, uint16 or float16), the frames are scaled (linear or
+    log) and quantized on the server, and sent as msgpack with their scale,
+    offset and NaN mask.
+    """
+    if quantize is not None:
+        try:
+            validate_quantization(quantize, scaling)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    result_data = await get_initial_scans(
+        left_image_index, right_image_index, include_catalog
+    )
+    if quantize is None:
+        return result_data
+
+    # The quantization kernels run in a worker thread, off the event loop
+    (
+        result_data["scatter_image_array_1_full_res"],
+        result_data["scatter_image_array_2_full_res"],
+    ) = await asyncio.to_thread(
+        quantize_arrays,
+        [
+            result_data["scatter_image_array_1_full_res"],
+            result_data["scatter_image_array_2_full_res"],
+        ],
+        quantize,
+        scaling,
+    )
+    return msgpack_response(result_data)
+
+
+@router.post("/dataset-session/invalidate")
+async def invalidate_session():
+    """Forget the cached dataset session (e.g. after new scans were written)"""
+    invalidate_dataset_session()
+    return {"message": "Dataset session invalidated"}
+
+
+@router.get("/frame-cache/stats")
+async def get_frame_cache_stats():
+    """Size, hit, miss and eviction counters of the shared processed-frame cache
+    (and of the cache of their compressed encodings)"""
+    return {
+        **frame_cache.get_stats(),
+        "encoded_arrays": encoded_array_cache.get_stats(),
     }
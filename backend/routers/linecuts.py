@@ -0,0 +1,157 @@
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Query
+from routers.params import calibration_parameters, get_session
+from scipy.ndimage import map_coordinates
+from src.array_codec import encode_array, msgpack_response
+from src.integrator_cache import get_q_xy_arrays
+from src.linecuts import (
+    get_inclined_linecut_samples,
+    horizontal_linecut,
+    inclined_linecut,
+    vertical_linecut,
+)
+
+router = APIRouter()
+
+unit_qx = "qx_nm^-1"
+unit_qy = "qy_nm^-1"
+
+
+def get_linecut_frames(session, left_image_index, right_image_index):
+    """Processed frames of both images, from the session's frame cache"""
+    if session.DEV_MODE:
+        right_image_index = 0
+
+    try:
+        images_arrays, _ = session.get_images_arrays_and_names(
+            [left_image_index, right_image_index]
+        )
+    except IndexError:
+        raise HTTPException(status_code=404, detail="Image index out of range")
+    return images_arrays
+
+
+def linecut_response(intensity_1, intensity_2, extra_data):
+    result_data = {
+        "intensity_1": encode_array(intensity_1, np.float32),
+        "intensity_2": encode_array(intensity_2, np.float32),
+    }
+    result_data.update(extra_data)
+    return msgpack_response(result_data)
+
+
+@router.get("/linecuts/horizontal")
+def get_horizontal_linecut(
+    row: float = Query(description="Row of the linecut center in pixels"),
+    width: float = Query(default=0.0, ge=0, description="Band width in pixels"),
+    left_image_index: int = 0,
+    right_image_index: int = 1,
+    q_axis: bool = Query(default=False, description="Also return the q_x axis"),
+    calibration_params: dict = Depends(calibration_parameters),
+    session=Depends(get_session),
+):
+    """
+    Intensity profile along x, averaged over a band of rows (NaN pixels ignored)
+    """
+    image_1, image_2 = get_linecut_frames(session, left_image_index, right_image_index)
+
+    try:
+        intensity_1 = horizontal_linecut(image_1, row, width)
+        intensity_2 = horizontal_linecut(image_2, row, width)
+    except IndexError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    extra_data = {"pixel_positions": encode_array(np.arange(image_1.shape[1]))}
+    if q_axis:
+        q_x, _ = get_q_xy_arrays(calibration_params, image_1.shape, unit_qx, unit_qy)
+        row_index = int(np.clip(round(row), 0, image_1.shape[0] - 1))
+        extra_data["q"] = encode_array(q_x[row_index, :], np.float32)
+
+    return linecut_response(intensity_1, intensity_2, extra_data)
+
+
+@router.get("/linecuts/vertical")
+def get_vertical_linecut(
+    column: float = Query(description="Column of the linecut center in pixels"),
+    width: float = Query(default=0.0, ge=0, description="Band width in pixels"),
+    left_image_index: int = 0,
+    right_image_index: int = 1,
+    q_axis: bool = Query(default=False, description="Also return the q_y axis"),
+    calibration_params: dict = Depends(calibration_parameters),
+    session=Depends(get_session),
+):
+    """
+    Intensity profile along y, averaged over a band of columns (NaN pixels ignored)
+    """
+    image_1, image_2 = get_linecut_frames(session, left_image_index, right_image_index)
+
+    try:
+        intensity_1 = vertical_linecut(image_1, column, width)
+        intensity_2 = vertical_linecut(image_2, column, width)
+    except IndexError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    extra_data = {"pixel_positions": encode_array(np.arange(image_1.shape[0]))}
+    if q_axis:
+        _, q_y = get_q_xy_arrays(calibration_params, image_1.shape, unit_qx, unit_qy)
+        column_index = int(np.clip(round(column), 0, image_1.shape[1] - 1))
+        extra_data["q"] = encode_array(q_y[:, column_index], np.float32)
+
+    return linecut_response(intensity_1, intensity_2, extra_data)
+
+
+@router.get("/linecuts/inclined")
+def get_inclined_linecut(
+    angle: float = Query(description="Angle in degrees, counter-clockwise from x"),
+    width: float = Query(default=0.0, ge=0, description="Band width in pixels"),
+    center_x: float | None = Query(
+        default=None, description="Line center in pixels (default: beam center)"
+    ),
+    center_y: float | None = Query(
+        default=None, description="Line center in pixels (default: beam center)"
+    ),
+    left_image_index: int = 0,
+    right_image_index: int = 1,
+    q_axis: bool = Query(default=False, description="Also return the q axis"),
+    calibration_params: dict = Depends(calibration_parameters),
+    session=Depends(get_session),
+):
+    """
+    Intensity profile along a line through the beam center (or the given center),
+    bilinearly interpolated and averaged across a band of the given width
+    """
+    image_1, image_2 = get_linecut_frames(session, left_image_index, right_image_index)
+
+    if center_x is None:
+        center_x = calibration_params["beam_center_x"]
+    if center_y is None:
+        center_y = calibration_params["beam_center_y"]
+
+    try:
+        x, y, t = get_inclined_linecut_samples(
+            image_1.shape, center_x, center_y, angle, width
+        )
+    except IndexError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # All points and band samples are interpolated in one vectorized call
+    intensity_1 = inclined_linecut(image_1, x, y)
+    intensity_2 = inclined_linecut(image_2, x, y)
+
+    center_line = x.shape[1] // 2
+    extra_data = {
+        "pixel_positions": encode_array(t, np.float32),
+        "x": encode_array(x[:, center_line], np.float32),
+        "y": encode_array(y[:, center_line], np.float32),
+    }
+    if q_axis:
+        q_x, q_y = get_q_xy_arrays(calibration_params, image_1.shape, unit_qx, unit_qy)
+        coordinates = np.stack([y[:, center_line], x[:, center_line]])
+        q_x_line = map_coordinates(q_x, coordinates, order=1, mode="nearest")
+        q_y_line = map_coordinates(q_y, coordinates, order=1, mode="nearest")
+        # Signed |q|, negative on the side of the line before the center
+        extra_data["q"] = encode_array(
+            np.sign(t) * np.hypot(q_x_line, q_y_line), np.float32
+        )
+
+    return linecut_response(intensity_1, intensity_2, extra_data)
@@ -0,0 +1,60 @@
+# Query parameter dependencies and parsers shared by several routers
+from fastapi import HTTPException, Query
+from src.dataset_session import get_dataset_session_async
+
+
+async def get_session():
+    """Dataset session dependency, a missing configuration is a 500 error"""
+    try:
+        return await get_dataset_session_async()
+    except EnvironmentError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def calibration_parameters(
+    # Calibration parameters as query parameters with defaults
+    sample_detector_distance: float = Query(
+        default=274.83,
+        description="Distance between sample and detector in millimeters",
+    ),
+    beam_center_x: float = Query(
+        default=317.8, description="X-coordinate of beam center in pixels"
+    ),
+    beam_center_y: float = Query(
+        default=1245.28, description="Y-coordinate of beam center in pixels"
+    ),
+    pixel_size_x: float = Query(
+        default=172, description="Pixel size in X direction (micrometers)"
+    ),
+    pixel_size_y: float = Query(
+        default=172, description="Pixel size in Y direction (micrometers)"
+    ),
+    wavelength: float = Query(
+        default=1.2398, description="X-ray wavelength in Angstroms"
+    ),
+    tilt: float = Query(default=0.0, description="Detector tilt angle in degrees"),
+    tilt_plan_rotation: float = Query(
+        default=0.0, description="Rotation of tilt plane in degrees"
+    ),
+):
+    # Package all calibration parameters into a dictionary for easier handling
+    return {
+        "sample_detector_distance": sample_detector_distance,
+        "beam_center_x": beam_center_x,
+        "beam_center_y": beam_center_y,
+        "pixel_size_x": pixel_size_x,
+        "pixel_size_y": pixel_size_y,
+        "wavelength": wavelength,
+        "tilt": tilt,
+        "tilt_plan_rotation": tilt_plan_rotation,
+    }
+
+
+def parse_list_parameter(param, cast):
+    """Parse a comma separated query parameter like "1,99" into a list"""
+    try:
+        return [cast(value) for value in param.split(",") if value.strip()]
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400, detail=f"Invalid list parameter {param}. Error: {e}"
+        )
@@ -1,13 +1,12 @@
-import msgpack
 import numpy as np
 from fastapi import APIRouter, Depends, Query
-from fastapi.responses import Response
 from pydantic import BaseModel
-from pyFAI.integrator.azimuthal import AzimuthalIntegrator
 
 # import pyFAI
 # from pyFAI.units import get_unit_fiber
 from routers.initial_scans_fetching import get_initial_scans
+from src.array_codec import encode_array, msgpack_response
+from src.integrator_cache import get_q_xy_arrays
 
 
 class CalibrationParameters(BaseModel):
@@ -70,19 +69,6 @@ def q_vectors(
         "tilt_plan_rotation": tilt_plan_rotation,
     }
 
-    # # Initialize the azimuthal integrator with our experimental geometry
-    ai = AzimuthalIntegrator()
-    ai.setFit2D(
-        directDist=azimuthal_integration_calibration_params["sample_detector_distance"],
-        centerX=azimuthal_integration_calibration_params["beam_center_x"],
-        centerY=azimuthal_integration_calibration_params["beam_center_y"],
-        tilt=azimuthal_integration_calibration_params["tilt"],
-        tiltPlanRotation=azimuthal_integration_calibration_params["tilt_plan_rotation"],
-        pixelX=azimuthal_integration_calibration_params["pixel_size_x"],
-        pixelY=azimuthal_integration_calibration_params["pixel_size_y"],
-        wavelength=azimuthal_integration_calibration_params["wavelength"],
-    )
-
     # unit_qx = "qxgi_nm^-1"
     # unit_qy = "qygi_nm^-1"
     unit_qx = "qx_nm^-1"
@@ -91,19 +77,16 @@ def q_vectors(
     # Ensure the detector shape is defined
     image_shape = scatter_image_array_1.shape  # e.g., (height, width)
 
-    # Compute q arrays with the specified units
-    q_x = ai.array_from_unit(shape=image_shape, unit=unit_qx)  # [0, :]
-    q_y = ai.array_from_unit(shape=image_shape, unit=unit_qy)  # [:, 0]
+    # Compute q arrays with the specified units (cached per geometry and shape)
+    q_x, q_y = get_q_xy_arrays(
+        azimuthal_integration_calibration_params, image_shape, unit_qx, unit_qy
+    )
 
     # Package the results for frontend using msgpack
-    # Convert NumPy arrays to lists for serialization
+    # Arrays are sent as raw float32 buffers, not as lists of Python floats
     result_data = {
-        "q_x": q_x.tolist(),
-        "q_y": q_y.tolist(),
+        "q_x": encode_array(q_x, np.float32),
+        "q_y": encode_array(q_y, np.float32),
     }
 
-    # Serialize the data using msgpack
-    packed_data = msgpack.packb(result_data)
-
-    # Return the packed data with appropriate media type
-    return Response(content=packed_data, media_type="application/x-msgpack")
+    return msgpack_response(result_data)
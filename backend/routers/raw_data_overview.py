@@ -1,17 +1,29 @@
-# import asyncio
-import concurrent.futures
+import asyncio
+import time
+from contextlib import aclosing
 
-import msgpack
 import numpy as np
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from fastapi.responses import Response
-from routers.initial_scans_fetching import get_initial_scans
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Query,
+    WebSocket,
+    WebSocketDisconnect,
+)
+from routers.params import calibration_parameters, get_session, parse_list_parameter
+from src.array_codec import encode_array, msgpack_response, pack_data
+from src.dataset_session import get_dataset_session_async
+from src.frame_workers import frame_worker_pool
 
 # from src.get_images_arrays_and_names import get_images_arrays_and_names
-from src.get_single_image_array_and_name import get_single_image_array_and_name
-
-# import time
-
+from src.metrics_index import get_metrics_index
+from src.overview_metrics import (
+    DEFAULT_OVERVIEW_METRICS,
+    OVERVIEW_METRICS,
+    get_roi_key,
+    make_roi_spec,
+)
 
 router = APIRouter()
 
@@ -46,34 +58,6 @@ async def send_progress_update(progress_percentage, message=""):
                 pass
 
 
-# Process a single image and return its metrics
-# import time
-
-
-def process_single_image(args):
-    index, uri, mask_detector, tiled_uri, data_local_path, DEV_MODE = args
-    try:
-        # t0 = time.time()
-
-        # Get the image array and name
-        image_array, image_name = get_single_image_array_and_name(
-            uri, mask_detector, tiled_uri, data_local_path, DEV_MODE
-        )
-        # t1 = time.time()
-
-        # Calculate metrics
-        max_intensity = np.nanmax(image_array)
-        avg_intensity = np.nanmean(image_array)
-        # t2 = time.time()
-
-        # print(f"Image {index}: Load={t1-t0:.4f}s, Process={t2-t1:.4f}s")
-
-        return index, max_intensity, avg_intensity, image_name, True
-    except Exception as e:
-        print(f"Error processing image {index}: {str(e)}")
-        return index, 0.0, 0.0, f"Error: {uri}", False
-
-
 # @router.get("/api/raw-data-overview")
 # async def create_raw_data_overview():
 #     results_get_initial_scans = await get_initial_scans()
@@ -138,48 +122,186 @@ def process_single_image(args):
 #     return Response(content=packed_data, media_type="application/octet-stream")
 
 
+def get_indexed_metrics(indexed_metrics, roi_key):
+    """Overview metrics from a metrics index entry, None if some are missing.
+
+    ROI intensities are indexed per ROI, under "roi_intensity:<roi key>".
+    """
+    metrics = {
+        name: indexed_metrics[name]
+        for name in OVERVIEW_METRICS
+        if name != "roi_intensity" and name in indexed_metrics
+    }
+    if len(metrics) != len(OVERVIEW_METRICS) - 1:
+        return None
+
+    if roi_key is not None:
+        if f"roi_intensity:{roi_key}" not in indexed_metrics:
+            return None
+        metrics["roi_intensity"] = indexed_metrics[f"roi_intensity:{roi_key}"]
+
+    return metrics
+
+
+def get_indexed_fingerprints(session, metrics_index):
+    """Indexed metrics of the dataset and the current fingerprint of every frame"""
+    indexed_metrics = metrics_index.get_dataset_metrics(session.dataset_key)
+    fingerprints = []
+    for uri in session.all_files_uris:
+        indexed = indexed_metrics.get(uri)
+        # Tiled frames are checked against the version they were indexed with
+        fingerprints.append(
+            session.get_frame_fingerprint(uri, indexed[0] if indexed else None)
+        )
+    return indexed_metrics, fingerprints
+
+
+async def iterate_overview_metrics(session, roi_spec=None):
+    """Yield (index, metrics, image_name, success) per frame.
+
+    Metrics is the dict of compute_overview_metrics (all series, from a single
+    pass over the frame). Frames whose metrics are up to date in the metrics
+    index are yielded first, the others as soon as the frame worker pool
+    finishes them. Closing or cancelling the iteration cancels the frames not
+    started yet, the metrics computed so far are still stored in the index.
+    """
+    all_files_uris = session.all_files_uris
+    roi_key = get_roi_key(roi_spec) if roi_spec is not None else None
+
+    # Reuse the metrics of frames that did not change since they were indexed.
+    # The index read and the file stats (or Tiled revalidations) block, they run
+    # in a worker thread.
+    metrics_index = get_metrics_index()
+    indexed_metrics, fingerprints = await asyncio.to_thread(
+        get_indexed_fingerprints, session, metrics_index
+    )
+
+    indices_to_process = []
+    for i, uri in enumerate(all_files_uris):
+        indexed = indexed_metrics.get(uri)
+        metrics = None
+        if fingerprints[i] is not None and indexed and indexed[0] == fingerprints[i]:
+            metrics = get_indexed_metrics(indexed[1], roi_key)
+
+        if metrics is not None:
+            yield i, metrics, uri, True
+        else:
+            indices_to_process.append(i)
+
+    new_entries = []
+    # Only the frame index and URI are sent to the workers, the mask is shared.
+    # The pool is kept until the iteration ends, even if the session changes.
+    with frame_worker_pool(session) as pool:
+        loop = asyncio.get_running_loop()
+        futures = [
+            pool.submit_frame_metrics(i, all_files_uris[i], loop, roi_spec=roi_spec)
+            for i in indices_to_process
+        ]
+
+        try:
+            # Process results as they complete
+            for next_result in asyncio.as_completed(futures):
+                index, metrics, image_name, success, frame_version = await next_result
+
+                if frame_version is not None:
+                    # Version of the Tiled frame the metrics were computed from
+                    session.set_frame_version(image_name, frame_version)
+                    fingerprints[index] = session.get_frame_fingerprint(
+                        image_name, revalidate=False
+                    )
+
+                if success and fingerprints[index] is not None:
+                    # Keep the intensities of other ROIs of an unchanged frame
+                    indexed = indexed_metrics.get(image_name)
+                    entry_metrics = (
+                        dict(indexed[1])
+                        if indexed and indexed[0] == fingerprints[index]
+                        else {}
+                    )
+                    entry_metrics.update(metrics)
+                    if roi_key is not None:
+                        entry_metrics[f"roi_intensity:{roi_key}"] = entry_metrics.pop(
+                            "roi_intensity"
+                        )
+                    new_entries.append((image_name, fingerprints[index], entry_metrics))
+
+                yield index, metrics, image_name, success
+        finally:
+            # Stop loading frames nobody is waiting for anymore
+            for future in futures:
+                future.cancel()
+
+            await asyncio.to_thread(
+                metrics_index.put_metrics, session.dataset_key, new_entries
+            )
+
+
+def parse_overview_selection(metrics, roi, q_band, calibration_params):
+    """Selected series and ROI spec of an overview request.
+
+    Raises:
+        ValueError: Unknown metric, malformed ROI, or roi_intensity without ROI
+    """
+    selected_metrics = [name.strip() for name in metrics if name.strip()]
+    unknown_metrics = set(selected_metrics) - set(OVERVIEW_METRICS)
+    if unknown_metrics:
+        raise ValueError(f"Unknown overview metrics: {sorted(unknown_metrics)}")
+
+    roi_spec = make_roi_spec(roi, q_band, calibration_params)
+    if "roi_intensity" in selected_metrics and roi_spec is None:
+        raise ValueError("roi_intensity needs a roi or q_band")
+
+    return selected_metrics, roi_spec
+
+
 @router.get("/api/raw-data-overview")
-async def create_raw_data_overview():
-    results_get_initial_scans = await get_initial_scans()
+async def create_raw_data_overview(
+    metrics: str = Query(
+        default=",".join(DEFAULT_OVERVIEW_METRICS),
+        description=f"Comma separated series among {', '.join(OVERVIEW_METRICS)}",
+    ),
+    roi: str | None = Query(
+        default=None, description="ROI rectangle in pixels: x_min,x_max,y_min,y_max"
+    ),
+    q_band: str | None = Query(
+        default=None, description="q band of the ROI in nm^-1: q_min,q_max"
+    ),
+    calibration_params: dict = Depends(calibration_parameters),
+    session=Depends(get_session),
+):
+    """
+    Per-frame overview series. Every metric (min, max, sum, mean, std, valid
+    pixel count and the integrated intensity of a ROI / q band) is computed in a
+    single pass over the unmasked pixels, the selected ones are returned in
+    "series". max_intensities and avg_intensities are always included.
+    """
+    try:
+        selected_metrics, roi_spec = parse_overview_selection(
+            metrics.split(","),
+            parse_list_parameter(roi, float) if roi else None,
+            parse_list_parameter(q_band, float) if q_band else None,
+            calibration_params,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    num_of_files = results_get_initial_scans["num_of_files"]
-    all_files_uris = results_get_initial_scans["all_files_uris"]
-    mask_detector = results_get_initial_scans["mask_detector"]
-    tiled_uri = results_get_initial_scans["tiled_uri"]
-    data_local_path = results_get_initial_scans["data_local_path"]
-    DEV_MODE = results_get_initial_scans["DEV_MODE"]
+    # Only the catalog and mask are needed, no need to load the displayed frames
+    num_of_files = session.num_of_files
 
     # Send initial progress
     await send_progress_update(0, f"Initializing processing for {num_of_files} images")
 
     # Preallocate arrays for efficiency
-    max_intensities = np.zeros(num_of_files, dtype=float)
-    avg_intensities = np.zeros(num_of_files, dtype=float)
+    series_names = set(selected_metrics) | set(DEFAULT_OVERVIEW_METRICS)
+    series = {name: np.zeros(num_of_files, dtype=float) for name in series_names}
     image_names = [""] * num_of_files  # Pre-allocate with empty strings
 
-    # Prepare arguments for the worker function
-    args_list = [
-        (i, all_files_uris[i], mask_detector, tiled_uri, data_local_path, DEV_MODE)
-        for i in range(num_of_files)
-    ]
-
-    # Process images with a thread pool
     processed_count = 0
-    max_workers = 16  # Adjust based on your server capabilities
-
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # Submit all tasks
-        future_to_index = {
-            executor.submit(process_single_image, args): args[0] for args in args_list
-        }
-
-        # Process results as they complete
-        for future in concurrent.futures.as_completed(future_to_index):
-            index, max_intensity, avg_intensity, image_name, success = future.result()
-
+    async with aclosing(iterate_overview_metrics(session, roi_spec)) as results:
+        async for index, frame_metrics, image_name, success in results:
             if success:
-                max_intensities[index] = max_intensity
-                avg_intensities[index] = avg_intensity
+                for name in series_names:
+                    series[name][index] = frame_metrics[name]
                 image_names[index] = image_name
 
             # Update progress
@@ -191,15 +313,129 @@ async def create_raw_data_overview():
 
     # Prepare serializable data
     serializable_data = {
-        "max_intensities": max_intensities.tolist(),
-        "avg_intensities": avg_intensities.tolist(),
+        "max_intensities": encode_array(series["max_intensity"]),
+        "avg_intensities": encode_array(series["avg_intensity"]),
+        "series": {name: encode_array(series[name]) for name in selected_metrics},
         "image_names": image_names,
     }
 
     # Send completion notification
     await send_progress_update(100, "Data processing complete")
 
-    # Pack data using msgpack
-    packed_data = msgpack.packb(serializable_data, use_bin_type=True)
+    return msgpack_response(serializable_data)
+
+
+async def stream_overview_batches(
+    websocket, session, batch_size, batch_interval, selected_metrics, roi_spec=None
+):
+    """Send the overview metrics in batches as the frames complete"""
+    num_of_files = session.num_of_files
+    await websocket.send_bytes(
+        pack_data({"type": "start", "num_of_files": num_of_files})
+    )
 
-    return Response(content=packed_data, media_type="application/octet-stream")
+    batch = []
+    processed_count = 0
+    last_sent = time.monotonic()
+
+    def batch_series(name):
+        return encode_array([item[1].get(name, 0.0) for item in batch])
+
+    async def send_batch():
+        await websocket.send_bytes(
+            pack_data(
+                {
+                    "type": "batch",
+                    "indices": encode_array([item[0] for item in batch], np.int32),
+                    "max_intensities": batch_series("max_intensity"),
+                    "avg_intensities": batch_series("avg_intensity"),
+                    "series": {name: batch_series(name) for name in selected_metrics},
+                    "image_names": [item[2] for item in batch],
+                    "success": [item[3] for item in batch],
+                    "progress": (processed_count / num_of_files) * 100,
+                }
+            )
+        )
+
+    # Closing the iteration (also on cancellation) skips the frames not loaded yet
+    async with aclosing(iterate_overview_metrics(session, roi_spec)) as results:
+        async for result in results:
+            batch.append(result)
+            processed_count += 1
+
+            # Send when the batch is full, or regularly so slow loads still show up
+            if (
+                len(batch) >= batch_size
+                or time.monotonic() - last_sent >= batch_interval
+            ):
+                await send_batch()
+                batch = []
+                last_sent = time.monotonic()
+
+    if batch:
+        await send_batch()
+
+    await websocket.send_bytes(pack_data({"type": "complete", "progress": 100}))
+
+
+@router.websocket("/ws/raw-data-overview")
+async def raw_data_overview_stream(websocket: WebSocket):
+    """
+    Streams the raw data overview as msgpack messages: {"type": "start"}, then
+    {"type": "batch"} messages with the index, name and metrics of completed
+    frames, and {"type": "complete"}. The client starts a run by sending
+    {"action": "start", "batch_size": 64, "batch_interval": 0.5} and may send
+    {"action": "cancel"} (or disconnect) to stop it, frames not loaded yet are
+    then skipped. The start message can select series with "metrics" (list),
+    and a ROI with "roi" ([x_min, x_max, y_min, y_max]) and/or "q_band"
+    ([q_min, q_max], with the geometry in "calibration").
+    """
+    await websocket.accept()
+    stream_task = None
+
+    try:
+        while True:
+            message = await websocket.receive_json()
+            action = message.get("action")
+
+            if action == "start" and (stream_task is None or stream_task.done()):
+                try:
+                    selected_metrics, roi_spec = parse_overview_selection(
+                        message.get("metrics", DEFAULT_OVERVIEW_METRICS),
+                        message.get("roi"),
+                        message.get("q_band"),
+                        message.get("calibration"),
+                    )
+                except (ValueError, TypeError) as e:
+                    await websocket.send_bytes(
+                        pack_data({"type": "error", "detail": str(e)})
+                    )
+                    continue
+
+                try:
+                    session = await get_dataset_session_async()
+                except EnvironmentError as e:
+                    await websocket.send_bytes(
+                        pack_data({"type": "error", "detail": str(e)})
+                    )
+                    continue
+
+                stream_task = asyncio.create_task(
+                    stream_overview_batches(
+                        websocket,
+                        session,
+                        batch_size=max(int(message.get("batch_size", 64)), 1),
+                        batch_interval=float(message.get("batch_interval", 0.5)),
+                        selected_metrics=selected_metrics,
+                        roi_spec=roi_spec,
+                    )
+                )
+            elif action == "cancel" and stream_task is not None:
+                stream_task.cancel()
+                await asyncio.gather(stream_task, return_exceptions=True)
+                await websocket.send_bytes(pack_data({"type": "cancelled"}))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if stream_task is not None:
+            stream_task.cancel()
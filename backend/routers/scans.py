@@ -0,0 +1,65 @@
+from fastapi import APIRouter, HTTPException, Query
+from routers.params import get_session
+from src.scan_catalog import (
+    DEFAULT_SCANS_PAGE_LIMIT,
+    MAX_SCANS_PAGE_LIMIT,
+    InvalidCursorError,
+)
+
+router = APIRouter()
+
+
+@router.get("/scans")
+async def list_scans(
+    cursor: str = Query(
+        default=None, description="next_cursor of the previous page, omit for the first"
+    ),
+    limit: int = Query(default=DEFAULT_SCANS_PAGE_LIMIT, ge=1, le=MAX_SCANS_PAGE_LIMIT),
+    prefix: str = Query(default=None, description="Keep scans starting with prefix"),
+    contains: str = Query(
+        default=None, description="Keep scans containing a substring"
+    ),
+):
+    """
+    Pages through the scans of the dataset in frame order, optionally filtered by
+    prefix and/or substring. Each scan comes with its frame index.
+    """
+    session = await get_session()
+
+    try:
+        indices, next_cursor, total = session.scan_catalog.page(
+            cursor=cursor, limit=limit, prefix=prefix, contains=contains
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {
+        "scans": [
+            {"index": index, "name": session.all_files_uris[index]} for index in indices
+        ],
+        "next_cursor": next_cursor,
+        "total": total,
+        "num_of_files": session.num_of_files,
+    }
+
+
+@router.get("/scans/lookup")
+async def lookup_scan(
+    name: str = Query(default=None, description="Scan name to find the index of"),
+    index: int = Query(default=None, description="Frame index to find the name of"),
+):
+    """Maps a scan name to its frame index, or a frame index to its name"""
+    if (name is None) == (index is None):
+        raise HTTPException(status_code=400, detail="Give exactly one of name, index")
+
+    session = await get_session()
+    catalog = session.scan_catalog
+
+    if name is not None:
+        index = catalog.index_of(name)
+    else:
+        name = catalog.name_of(index)
+    if index is None or name is None:
+        raise HTTPException(status_code=404, detail="Scan not found")
+
+    return {"index": index, "name": name}
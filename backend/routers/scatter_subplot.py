@@ -1,42 +1,27 @@
-import msgpack
+import asyncio
+import copy
+from functools import lru_cache
+
 import numpy as np
 import plotly.graph_objects as go
-from fastapi import APIRouter
-from fastapi.responses import Response
+from fastapi import APIRouter, HTTPException, Query
 from plotly.subplots import make_subplots
 from routers.initial_scans_fetching import get_initial_scans
+from src.array_codec import encode_array, msgpack_response
+from src.array_quantization import quantize_arrays, validate_quantization
+from src.comparison_arrays import COMPARISONS, compute_comparison, get_frames_range
+from src.preprocess_image import frame_buffers
 
 router = APIRouter()
 
 
-@router.get("/scatter-subplot")
-async def create_scatter_subplot(left_image_index: int = 0, right_image_index: int = 1):
-
-    scans = await get_initial_scans(
-        left_image_index=left_image_index, right_image_index=right_image_index
-    )
-
-    # Convert arrays to NumPy
-    scatter_image_array_1 = np.array(scans["scatter_image_array_1_full_res"])
-    scatter_image_array_2 = np.array(scans["scatter_image_array_2_full_res"])
-
-    # Compute absolute difference
-    difference_array = scatter_image_array_1 - scatter_image_array_2
-
-    scatter_image_array_1 = scatter_image_array_1.astype(np.float32)
-    scatter_image_array_2 = scatter_image_array_2.astype(np.float32)
-    difference_array = difference_array.astype(np.float32)
-
-    zmin = float(min(np.min(scatter_image_array_1), np.min(scatter_image_array_2)))
-    zmax = float(max(np.max(scatter_image_array_1), np.max(scatter_image_array_2)))
-
-    # Divergent color scale for the difference plot
-    diff_min = float(-max(abs(np.min(difference_array)), abs(np.max(difference_array))))
-    diff_max = float(max(abs(np.min(difference_array)), abs(np.max(difference_array))))
-
-    # diff_min = float(np.min(difference_array))
-    # diff_max = float(np.max(difference_array))
+@lru_cache(maxsize=1)
+def get_scatter_subplot_template():
+    """Serialized three-panel figure, built once.
 
+    Only the color axis ranges depend on the frames, they are patched into a
+    shallow copy with set_color_ranges.
+    """
     # Create the subplots figure
     scatter_subplot_fig = make_subplots(
         rows=1,
@@ -77,12 +62,10 @@ async def create_scatter_subplot(left_image_index: int = 0, right_image_index: i
         col=3,
     )
 
-    # Update layout for the subplots, setting zmin and zmax for coloraxis
+    # Update layout for the subplots, the color ranges are set per request
     scatter_subplot_fig.update_layout(
         coloraxis=dict(
             colorscale="viridis",
-            cmin=zmin,
-            cmax=zmax,
             colorbar=dict(
                 len=0.7,  # Adjust the height of the colorbar
                 thickness=20,  # Adjust the thickness of the colorbar
@@ -95,8 +78,6 @@ async def create_scatter_subplot(left_image_index: int = 0, right_image_index: i
         ),
         coloraxis2=dict(
             colorscale="RdBu",
-            cmin=diff_min,
-            cmax=diff_max,
             cmid=0,
             colorbar=dict(
                 len=0.7,  # Adjust the height of the colorbar
@@ -167,27 +148,117 @@ async def create_scatter_subplot(left_image_index: int = 0, right_image_index: i
         ),
     )
 
-    # Serialize arrays to bytes
-    array_1_bytes = scatter_image_array_1.tobytes()
-    array_2_bytes = scatter_image_array_2.tobytes()
-    # diff_bytes = difference_array.tobytes()
-
-    # Prepare metadata for reconstruction
-    metadata = {
-        "shape_1": scatter_image_array_1.shape,
-        "dtype_1": str(scatter_image_array_1.dtype),
-        "shape_2": scatter_image_array_2.shape,
-        "dtype_2": str(scatter_image_array_2.dtype),
-        "plotly": scatter_subplot_fig.to_plotly_json(),  # Serialize Plotly structure
+    return scatter_subplot_fig.to_plotly_json()
+
+
+def set_color_ranges(template, zmin, zmax, diff_min, diff_max):
+    """Copy of the figure template with the given color axis ranges"""
+    layout = copy.copy(template["layout"])
+    layout["coloraxis"] = {**layout["coloraxis"], "cmin": zmin, "cmax": zmax}
+    layout["coloraxis2"] = {**layout["coloraxis2"], "cmin": diff_min, "cmax": diff_max}
+    return {**template, "layout": layout}
+
+
+def build_scatter_subplot(scans, comparison=None, quantize=None, scaling="linear"):
+    """Figure, encoded frames and comparison of the /scatter-subplot response.
+
+    Runs the range, comparison and quantization kernels, called in a worker
+    thread so the event loop keeps serving meanwhile.
+    """
+    # Frames come processed (float32, NaN where masked) from the frame cache
+    scatter_image_array_1 = np.asarray(
+        scans["scatter_image_array_1_full_res"], dtype=np.float32
+    )
+    scatter_image_array_2 = np.asarray(
+        scans["scatter_image_array_2_full_res"], dtype=np.float32
+    )
+
+    # Ranges skip the masked (NaN) pixels
+    zmin, zmax = get_frames_range(scatter_image_array_1, scatter_image_array_2)
+
+    # The difference only gets its own array when it is returned
+    if comparison == "difference":
+        difference_array, (low, high) = compute_comparison(
+            scatter_image_array_1, scatter_image_array_2, "difference"
+        )
+    else:
+        with frame_buffers.buffer(scatter_image_array_1.shape) as buffer:
+            _, (low, high) = compute_comparison(
+                scatter_image_array_1, scatter_image_array_2, "difference", out=buffer
+            )
+
+    # Divergent color scale for the difference plot
+    diff_max = max(abs(low), abs(high))
+    diff_min = -diff_max
+
+    # Arrays are encoded as raw float32 buffers with dtype and shape metadata
+    result_data = {
+        "metadata": {
+            "plotly": set_color_ranges(
+                get_scatter_subplot_template(), zmin, zmax, diff_min, diff_max
+            ),
+        },
     }
 
-    # Pack metadata and binary data
-    packed_data = msgpack.packb(
-        {
-            "metadata": metadata,
-            "array_1": msgpack.ExtType(1, array_1_bytes),
-            "array_2": msgpack.ExtType(2, array_2_bytes),
-        }
+    # Scaled and quantized frames come with their scale, offset and NaN mask
+    if quantize is not None:
+        result_data["array_1"], result_data["array_2"] = quantize_arrays(
+            [scatter_image_array_1, scatter_image_array_2], quantize, scaling
+        )
+    else:
+        result_data["array_1"] = encode_array(scatter_image_array_1)
+        result_data["array_2"] = encode_array(scatter_image_array_2)
+
+    if comparison == "difference":
+        result_data["comparison_array"] = encode_array(difference_array)
+        result_data["comparison_range"] = [low, high]
+    elif comparison == "ratio":
+        ratio_array, ratio_range = compute_comparison(
+            scatter_image_array_1, scatter_image_array_2, "ratio"
+        )
+        result_data["comparison_array"] = encode_array(ratio_array)
+        result_data["comparison_range"] = list(ratio_range)
+    if comparison is not None:
+        result_data["comparison"] = comparison
+
+    return result_data
+
+
+@router.get("/scatter-subplot")
+async def create_scatter_subplot(
+    left_image_index: int = 0,
+    right_image_index: int = 1,
+    comparison: str = Query(
+        default=None,
+        description="Also return the difference or ratio of the two frames",
+    ),
+    quantize: str = Query(
+        default=None,
+        description="Send the frames quantized to uint8, uint16 or float16",
+    ),
+    scaling: str = Query(
+        default="linear", description="Scaling applied before quantizing (linear, log)"
+    ),
+):
+    if comparison is not None and comparison not in COMPARISONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid comparison {comparison}, expected one of "
+            f"{', '.join(COMPARISONS)}",
+        )
+
+    if quantize is not None:
+        try:
+            validate_quantization(quantize, scaling)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    scans = await get_initial_scans(
+        left_image_index=left_image_index, right_image_index=right_image_index
+    )
+
+    result_data = await asyncio.to_thread(
+        build_scatter_subplot, scans, comparison, quantize, scaling
     )
 
-    return Response(content=packed_data, media_type="application/octet-stream")
+    return msgpack_response(result_data)
@@ -0,0 +1,72 @@
+from fastapi import APIRouter, Depends, HTTPException
+from routers.params import get_session
+from src.array_codec import encode_array, msgpack_response
+from src.tile_pyramid import (
+    DEFAULT_TILE_SIZE,
+    get_pyramid_description,
+    get_tile,
+    get_tile_pyramid,
+)
+
+router = APIRouter()
+
+
+def get_frame_pyramid(session, frame):
+    """Return the frame URI and the tile pyramid of a frame index"""
+    if not 0 <= frame < session.num_of_files:
+        raise HTTPException(status_code=404, detail=f"Frame {frame} not found")
+
+    image_uri = session.all_files_uris[frame]
+    levels = get_tile_pyramid(
+        session.get_loaded_frame_cache_key(image_uri),
+        lambda: session.get_processed_frame(image_uri),
+    )
+    return image_uri, levels
+
+
+@router.get("/tiles/{frame}")
+def get_tiles_description(frame: int, session=Depends(get_session)):
+    """
+    Describes the multi-resolution pyramid of a processed frame: level 0 is the
+    full resolution frame and level n is downsampled by 2**n (NaN-aware mean).
+    """
+    image_uri, levels = get_frame_pyramid(session, frame)
+
+    return msgpack_response(
+        {
+            "image_name": image_uri,
+            "tile_size": DEFAULT_TILE_SIZE,
+            "levels": get_pyramid_description(levels),
+        }
+    )
+
+
+@router.get("/tiles/{frame}/{level}/{x}/{y}")
+def get_frame_tile(
+    frame: int, level: int, x: int, y: int, session=Depends(get_session)
+):
+    """
+    Returns the tile at column x and row y of a pyramid level, so the browser only
+    fetches the zoom level and viewport it displays.
+    """
+    _, levels = get_frame_pyramid(session, frame)
+
+    try:
+        tile = get_tile(levels, level, x, y)
+    except IndexError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    return msgpack_response(
+        {
+            "tile": encode_array(tile),
+            "level": level,
+            "factor": 2**level,
+            "x": x,
+            "y": y,
+            # Position of the tile's first pixel in full resolution coordinates
+            "origin": [
+                y * DEFAULT_TILE_SIZE * 2**level,
+                x * DEFAULT_TILE_SIZE * 2**level,
+            ],
+        }
+    )
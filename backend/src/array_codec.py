@@ -0,0 +1,77 @@
+import msgpack
+import numpy as np
+from fastapi.responses import Response
+from src.array_compression import compress_encoded_array, decompress_array
+
+# Media type of every msgpack response of the API
+MSGPACK_MEDIA_TYPE = "application/x-msgpack"
+
+
+def encode_array(array, dtype=None):
+    """Encode a NumPy array as a msgpack-ready map without converting it to lists.
+
+    The pixel buffer is sent as raw bytes next to the dtype (with explicit byte
+    order, e.g. "<f4") and shape needed to rebuild it, so the client can view it
+    directly as a typed array.
+
+    Args:
+        array: Array to encode
+        dtype: Optional dtype to cast to first (e.g. np.float32 to halve float64 payloads)
+
+    Returns:
+        Dict with "dtype", "shape" and "data" keys, plus "codec" and "shuffle"
+        when the data is compressed
+    """
+    array = np.asarray(array)
+    if dtype is not None:
+        array = array.astype(dtype, copy=False)
+
+    # Typed arrays in the browser are little-endian
+    if array.dtype.byteorder == ">":
+        array = array.astype(array.dtype.newbyteorder("<"))
+
+    array = np.ascontiguousarray(array)
+
+    encoded = {
+        "dtype": array.dtype.str,
+        "shape": list(array.shape),
+        "data": memoryview(array).cast("B"),
+    }
+
+    # Large arrays are compressed with a codec the client asked for in the
+    # X-Array-Encoding header, "codec" and "shuffle" then describe the data
+    compressed = compress_encoded_array(array)
+    if compressed is not None:
+        encoded.update(compressed)
+
+    return encoded
+
+
+def decode_array(encoded):
+    """Rebuild the NumPy array encoded by encode_array"""
+    if "codec" in encoded:
+        return decompress_array(
+            encoded["data"], encoded["codec"], encoded["shuffle"], encoded["dtype"]
+        ).reshape(encoded["shape"])
+    return np.frombuffer(encoded["data"], dtype=np.dtype(encoded["dtype"])).reshape(
+        encoded["shape"]
+    )
+
+
+def _default(obj):
+    # Called by msgpack for the types it cannot serialize on its own
+    if isinstance(obj, np.ndarray):
+        return encode_array(obj)
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Cannot serialize object of type {type(obj)}")
+
+
+def pack_data(data):
+    """Serialize data with msgpack, NumPy arrays are encoded with encode_array"""
+    return msgpack.packb(data, default=_default, use_bin_type=True)
+
+
+def msgpack_response(data):
+    """Return data as a msgpack Response"""
+    return Response(content=pack_data(data), media_type=MSGPACK_MEDIA_TYPE)
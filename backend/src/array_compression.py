@@ -0,0 +1,210 @@
+import contextvars
+import os
+import threading
+import weakref
+import zlib
+
+import numpy as np
+from src.frame_cache import FrameCache
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+# Request header listing the codecs the client decodes, in order of preference
+# (e.g. "zstd, lz4, deflate"). Not Accept-Encoding, which browsers fill in on
+# their own.
+ARRAY_ENCODING_HEADER = "x-array-encoding"
+
+# Arrays smaller than this are sent as is, compressing them saves little
+MIN_COMPRESSED_BYTES = 64 * 1024
+
+# Arrays above this size are compressed with the fastest level of their codec
+LARGE_ARRAY_BYTES = 16 * 1024**2
+
+# A compressed array is only sent if it is at most this fraction of the raw size
+MAX_COMPRESSION_RATIO = 0.9
+
+# Bytes of compressed arrays kept in memory, can be overridden with the
+# ENCODED_ARRAY_CACHE_BYTES environment variable
+DEFAULT_ENCODED_ARRAY_CACHE_BYTES = 256 * 1024**2
+
+
+def _compress_zstd(data, level):
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+def _compress_lz4(data, level):
+    return lz4.frame.compress(data, compression_level=level)
+
+
+def _compress_deflate(data, level):
+    return zlib.compress(data, level)
+
+
+def _decompress_zstd(data):
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+# codec: (compress function, level for regular arrays, level for large arrays)
+_codecs = {"deflate": (_compress_deflate, 6, 1)}
+_decompressors = {"deflate": zlib.decompress}
+if zstandard is not None:
+    _codecs["zstd"] = (_compress_zstd, 3, 1)
+    _decompressors["zstd"] = _decompress_zstd
+if lz4 is not None:
+    _codecs["lz4"] = (_compress_lz4, 0, 0)
+    _decompressors["lz4"] = lz4.frame.decompress
+
+# Codecs the current request accepts, set by ArrayEncodingMiddleware
+_accepted_codecs = contextvars.ContextVar("accepted_codecs", default=())
+
+
+def get_available_codecs():
+    return tuple(_codecs)
+
+
+def parse_accepted_codecs(header):
+    """Supported codecs of an X-Array-Encoding header, in the client's order"""
+    if not header:
+        return ()
+    codecs = [codec.split(";")[0].strip().lower() for codec in header.split(",")]
+    return tuple(codec for codec in codecs if codec in _codecs)
+
+
+def get_accepted_codecs():
+    return _accepted_codecs.get()
+
+
+def select_codec(nbytes, accepted_codecs=None):
+    """(codec, level) to compress an array of nbytes with, None to send it raw"""
+    if accepted_codecs is None:
+        accepted_codecs = get_accepted_codecs()
+    if not accepted_codecs or nbytes < MIN_COMPRESSED_BYTES:
+        return None
+
+    codec = accepted_codecs[0]
+    _, level, large_level = _codecs[codec]
+    return codec, large_level if nbytes > LARGE_ARRAY_BYTES else level
+
+
+def shuffle_bytes(array):
+    """Bytes of a contiguous array grouped by byte position within each item.
+
+    Neighbouring float pixels share their sign, exponent and high mantissa
+    bytes (and the NaN pattern of masked areas), so grouping them gives the
+    compressor long runs.
+    """
+    items = array.reshape(-1).view(np.uint8).reshape(-1, array.dtype.itemsize)
+    return np.ascontiguousarray(items.T)
+
+
+def compress_array(array, codec, level):
+    """Byte-shuffled, compressed bytes of a contiguous array"""
+    compress, _, _ = _codecs[codec]
+    data = shuffle_bytes(array) if array.dtype.itemsize > 1 else array
+    return compress(memoryview(data).cast("B"), level)
+
+
+def decompress_array(data, codec, shuffle, dtype):
+    """Flat array of the bytes compressed by compress_array"""
+    dtype = np.dtype(dtype)
+    raw = np.frombuffer(_decompressors[codec](data), dtype=np.uint8)
+    if shuffle:
+        raw = np.ascontiguousarray(raw.reshape(dtype.itemsize, -1).T)
+    return raw.view(dtype)
+
+
+class EncodedArrayCache:
+    """Compressed encodings of read-only arrays, bounded by a byte budget.
+
+    Cached frames are shared read-only arrays, so their compressed encoding is
+    computed once per codec and level. Entries are keyed by array identity, a
+    weak reference makes sure an entry is never served for another array that
+    reuses the id of a freed one.
+    """
+
+    def __init__(self, max_bytes):
+        self._encodings = FrameCache(max_bytes)
+        self._sources = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def get_or_compress(self, array, codec, level):
+        if array.flags.writeable:
+            # May change after being encoded
+            return compress_array(array, codec, level)
+
+        key = (id(array), codec, level)
+        with self._lock:
+            known = self._sources.get(id(array)) is array
+        if known:
+            compressed = self._encodings.get(key)
+            if compressed is not None:
+                return compressed
+
+        compressed = np.frombuffer(compress_array(array, codec, level), dtype=np.uint8)
+        with self._lock:
+            self._sources[id(array)] = array
+        self._encodings.put(key, compressed)
+        return compressed
+
+    def get_stats(self):
+        return self._encodings.get_stats()
+
+
+encoded_array_cache = EncodedArrayCache(
+    int(os.getenv("ENCODED_ARRAY_CACHE_BYTES", DEFAULT_ENCODED_ARRAY_CACHE_BYTES))
+)
+
+
+def compress_encoded_array(array):
+    """Compressed data and encoding fields of a contiguous array, or None.
+
+    None when the request accepts no codec, the array is small or it does not
+    compress well enough.
+    """
+    selected = select_codec(array.nbytes)
+    if selected is None:
+        return None
+    codec, level = selected
+
+    compressed = encoded_array_cache.get_or_compress(array, codec, level)
+    if len(compressed) > MAX_COMPRESSION_RATIO * array.nbytes:
+        return None
+
+    return {
+        "data": memoryview(compressed).cast("B"),
+        "codec": codec,
+        "shuffle": array.dtype.itemsize > 1,
+    }
+
+
+class ArrayEncodingMiddleware:
+    """Reads the X-Array-Encoding header of each HTTP request for encode_array"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        header = next(
+            (
+                value.decode("latin-1")
+                for name, value in scope["headers"]
+                if name.decode("latin-1").lower() == ARRAY_ENCODING_HEADER
+            ),
+            None,
+        )
+        token = _accepted_codecs.set(parse_accepted_codecs(header))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _accepted_codecs.reset(token)
@@ -0,0 +1,160 @@
+import numpy as np
+from numba import njit
+from src.array_codec import decode_array, encode_array
+
+# Transport dtypes of quantized frames and scalings applied before quantizing
+QUANTIZED_DTYPES = ("uint8", "uint16", "float16")
+SCALINGS = ("linear", "log")
+
+# Largest finite float16, float16 frames are scaled down to stay below it
+_FLOAT16_MAX = float(np.finfo(np.float16).max)
+
+
+@njit(cache=True, nogil=True)
+def _min_positive_kernel(image):
+    min_positive = np.inf
+    for i in range(image.size):
+        value = image[i]
+        if value > 0 and value < min_positive:
+            min_positive = value
+    return min_positive
+
+
+@njit(cache=True, nogil=True)
+def _scale_kernel(image, log, log_min_positive, out):
+    # Log scaling as in the viewer: 0 stays 0, negatives take the log of the
+    # smallest positive value. Returns the min and max of the scaled pixels,
+    # skipping NaNs.
+    low = np.inf
+    high = -np.inf
+    for i in range(image.size):
+        value = image[i]
+        if np.isnan(value):
+            out[i] = np.nan
+            continue
+        if log:
+            if value > 0:
+                value = np.log10(value)
+            elif value < 0:
+                value = log_min_positive
+        out[i] = value
+        if value < low:
+            low = value
+        if value > high:
+            high = value
+    return low, high
+
+
+@njit(cache=True, nogil=True)
+def _quantize_kernel(scaled, offset, inverse_scale, max_level, out):
+    # Rounds (value - offset) / scale to the nearest level, NaNs become 0 (they
+    # are flagged in the separate NaN mask)
+    for i in range(scaled.size):
+        value = scaled[i]
+        if np.isnan(value):
+            out[i] = 0
+            continue
+        level = np.floor((value - offset) * inverse_scale + 0.5)
+        if level < 0:
+            level = 0
+        elif level > max_level:
+            level = max_level
+        out[i] = level
+
+
+def _get_scale_and_offset(dtype, low, high):
+    if low > high:
+        # No valid pixel
+        low = high = 0.0
+    if dtype == "float16":
+        largest = max(abs(low), abs(high))
+        return (largest / _FLOAT16_MAX if largest > _FLOAT16_MAX else 1.0), 0.0
+    max_level = np.iinfo(dtype).max
+    return ((high - low) / max_level if high > low else 1.0), low
+
+
+def validate_quantization(dtype, scaling):
+    """Raise ValueError for an unknown transport dtype or scaling"""
+    if dtype not in QUANTIZED_DTYPES:
+        raise ValueError(
+            f"Unknown dtype {dtype}, expected one of {', '.join(QUANTIZED_DTYPES)}"
+        )
+    if scaling not in SCALINGS:
+        raise ValueError(
+            f"Unknown scaling {scaling}, expected one of {', '.join(SCALINGS)}"
+        )
+
+
+def quantize_arrays(arrays, dtype="uint8", scaling="linear"):
+    """Scale and quantize frames for transport, with one shared scale and offset.
+
+    Frames are scaled (linear or log10, as in the viewer), then mapped onto the
+    levels of dtype over the scaled range of all frames. A frame is rebuilt as
+    data * scale + offset (in the scaled space), with NaN where the packed
+    nan_mask bit is set.
+
+    Returns:
+        One encode_array dict per frame, with a "quantization" entry holding
+        "scaling", "scale", "offset" and the encoded "nan_mask"
+    """
+    validate_quantization(dtype, scaling)
+
+    arrays = [np.ascontiguousarray(array, dtype=np.float32) for array in arrays]
+    scaled_arrays = [np.empty(array.shape, dtype=np.float32) for array in arrays]
+
+    low, high = np.inf, -np.inf
+    for array, scaled in zip(arrays, scaled_arrays):
+        flat = array.reshape(-1)
+        log_min_positive = 0.0
+        if scaling == "log":
+            min_positive = _min_positive_kernel(flat)
+            log_min_positive = np.log10(min_positive) if min_positive < np.inf else 0.0
+        array_low, array_high = _scale_kernel(
+            flat, scaling == "log", log_min_positive, scaled.reshape(-1)
+        )
+        low, high = min(low, array_low), max(high, array_high)
+
+    scale, offset = _get_scale_and_offset(dtype, float(low), float(high))
+
+    encoded_arrays = []
+    for scaled in scaled_arrays:
+        nan_mask = np.isnan(scaled)
+        if dtype == "float16":
+            # Keeps the relative precision of float16 over the whole range
+            quantized = np.where(nan_mask, 0.0, scaled / np.float32(scale)).astype(
+                np.float16
+            )
+        else:
+            quantized = np.empty(scaled.shape, dtype=dtype)
+            _quantize_kernel(
+                scaled.reshape(-1),
+                offset,
+                1.0 / scale,
+                float(np.iinfo(dtype).max),
+                quantized.reshape(-1),
+            )
+        packed_nan_mask = np.packbits(nan_mask)
+
+        encoded = encode_array(quantized)
+        encoded["quantization"] = {
+            "scaling": scaling,
+            "scale": scale,
+            "offset": offset,
+            "nan_mask": encode_array(packed_nan_mask),
+        }
+        encoded_arrays.append(encoded)
+
+    return encoded_arrays
+
+
+def dequantize_array(encoded):
+    """Rebuild the scaled float32 frame of a quantize_arrays encoding"""
+    quantization = encoded["quantization"]
+    values = decode_array(encoded).astype(np.float32) * np.float32(
+        quantization["scale"]
+    ) + np.float32(quantization["offset"])
+    nan_mask = np.unpackbits(
+        decode_array(quantization["nan_mask"]), count=values.size
+    ).astype(bool)
+    values.reshape(-1)[nan_mask] = np.nan
+    return values
@@ -0,0 +1,66 @@
+import threading
+from collections import OrderedDict
+
+
+class BoundedLRUCache:
+    """Thread-safe least-recently-used cache holding at most maxsize entries.
+
+    Values are built by a factory on a miss. Builds of the same key are
+    serialized by a re-entrant lock of that key, so two requests asking for the
+    same expensive value (e.g. a CSR lookup table) do not both build it, while
+    builds of other keys (e.g. frames fetched over the network) run meanwhile.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # key -> [build lock, number of threads holding or waiting for it]
+        self._build_locks = {}
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_or_create(self, key, factory):
+        """Return the value cached under key, building it with factory() on a miss"""
+        missing = object()
+
+        value = self.get(key, missing)
+        if value is not missing:
+            return value
+
+        with self._lock:
+            build_lock = self._build_locks.setdefault(key, [threading.RLock(), 0])
+            build_lock[1] += 1
+        try:
+            with build_lock[0]:
+                # Another thread may have built it while we were waiting
+                value = self.get(key, missing)
+                if value is missing:
+                    value = factory()
+                    self.put(key, value)
+        finally:
+            with self._lock:
+                build_lock[1] -= 1
+                if not build_lock[1]:
+                    del self._build_locks[key]
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
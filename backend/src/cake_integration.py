@@ -0,0 +1,158 @@
+import os
+
+import numpy as np
+from src.bounded_cache import BoundedLRUCache
+from src.integrator_cache import (
+    get_cake_matrix,
+    get_geometry_key,
+    number_of_azimuthal_points,
+    number_of_integration_points,
+)
+
+# Frames whose cake is kept in memory (about 3 MB each with the default bins),
+# can be overridden with the CAKE_CACHE_SIZE environment variable
+DEFAULT_CAKE_CACHE_SIZE = 16
+
+_cakes = BoundedLRUCache(int(os.getenv("CAKE_CACHE_SIZE", DEFAULT_CAKE_CACHE_SIZE)))
+
+
+class FrameCake:
+    """2D (q, chi) integration of one frame, re-sliced without touching pixels.
+
+    The summed signal and normalization of every cake bin are kept as
+    cumulative sums along chi, so the profile of any azimuth range is the
+    difference of two interpolated columns (bins cut by the range edges count
+    for the fraction they overlap), O(q bins) per slice. A q range is re-binned
+    the same way along q, into npt bins spanning it as in a 1D integration.
+
+    Cake bins are assumed uniform inside, so profiles differ from a 1D
+    integration of the pixels where a range edge cuts through cake bins: within
+    about 1.5% over the full azimuth range, about 1% (median) for partial
+    azimuth ranges and up to about 13% in their lowest q bins, which hold few
+    pixels.
+    """
+
+    def __init__(self, sum_signal, sum_normalization, q, chi, empty):
+        # (q bins, chi bins) -> cumulative along chi, with a leading zero column
+        self.cumulative_signal = self._cumulate(sum_signal)
+        self.cumulative_normalization = self._cumulate(sum_normalization)
+        self.q = q
+        self.empty = empty
+
+        # q bins (radial unit) are uniform
+        q_step = float(q[1] - q[0]) if len(q) > 1 else 1.0
+        self.q_edges = np.append(q - q_step / 2, q[-1] + q_step / 2)
+
+        # Chi bins (degrees) are uniform
+        self.chi_step = float(chi[1] - chi[0]) if len(chi) > 1 else 360.0
+        self.chi_start = float(chi[0]) - self.chi_step / 2
+        self.chi_bins = len(chi)
+
+    @staticmethod
+    def _cumulate(sums):
+        cumulative = np.zeros((sums.shape[0], sums.shape[1] + 1), dtype=np.float64)
+        np.cumsum(sums, axis=1, out=cumulative[:, 1:])
+        cumulative.setflags(write=False)
+        return cumulative
+
+    def _cumulative_at(self, cumulative, chi_deg):
+        # Sums of the bins below chi_deg, linearly interpolated inside a bin
+        position = min(
+            max((chi_deg - self.chi_start) / self.chi_step, 0.0), self.chi_bins
+        )
+        index = min(int(position), self.chi_bins - 1)
+        fraction = position - index
+        return cumulative[:, index] + fraction * (
+            cumulative[:, index + 1] - cumulative[:, index]
+        )
+
+    def _rebin(self, sums, q_edges):
+        # Sums over new q bins, cake bins cut by an edge count for the fraction
+        # they overlap
+        cumulative = np.concatenate([[0.0], np.cumsum(sums)])
+        return np.diff(np.interp(q_edges, self.q_edges, cumulative))
+
+    def slice(self, azimuth_range=None, q_range=None, npt=None):
+        """q bins and mean intensities over an azimuth range (degrees) and q range.
+
+        Without q range, the profile has the q bins of the cake. With a q range
+        it is re-binned into npt bins (default: as many as the cake) spanning
+        it, like a 1D integration with that radial range.
+        """
+        if azimuth_range is None:
+            sum_signal = self.cumulative_signal[:, -1]
+            sum_normalization = self.cumulative_normalization[:, -1]
+        else:
+            chi_min, chi_max = azimuth_range
+            if chi_min > chi_max:
+                raise ValueError(f"Invalid azimuth range {azimuth_range}")
+            sum_signal = self._cumulative_at(
+                self.cumulative_signal, chi_max
+            ) - self._cumulative_at(self.cumulative_signal, chi_min)
+            sum_normalization = self._cumulative_at(
+                self.cumulative_normalization, chi_max
+            ) - self._cumulative_at(self.cumulative_normalization, chi_min)
+
+        q = self.q
+        if q_range is not None:
+            if q_range[0] >= q_range[1]:
+                raise ValueError(f"Invalid q range {q_range}")
+            q_edges = np.linspace(q_range[0], q_range[1], (npt or len(self.q)) + 1)
+            q = (q_edges[:-1] + q_edges[1:]) / 2
+            sum_signal = self._rebin(sum_signal, q_edges)
+            sum_normalization = self._rebin(sum_normalization, q_edges)
+
+        intensity = np.full(len(q), self.empty, dtype=np.float32)
+        np.divide(
+            sum_signal,
+            sum_normalization,
+            out=intensity,
+            where=sum_normalization > 0,
+            casting="unsafe",
+        )
+        return q, intensity
+
+
+def _compute_cake(frame, calibration_params, npt_rad, npt_azim):
+    matrix, q, chi, empty = get_cake_matrix(
+        calibration_params, frame.shape, npt_rad, npt_azim
+    )
+
+    # NaN pixels contribute neither to the signal nor to the normalization
+    pixels = frame.reshape(-1)
+    valid = np.isfinite(pixels)
+    sum_signal = matrix @ np.where(valid, pixels, np.float32(0.0))
+    sum_normalization = matrix @ valid.astype(np.float32)
+
+    # Matrix rows are radial-major
+    return FrameCake(
+        sum_signal.reshape(npt_rad, npt_azim),
+        sum_normalization.reshape(npt_rad, npt_azim),
+        q,
+        chi,
+        empty,
+    )
+
+
+def get_frame_cake(
+    frame_key,
+    frame,
+    calibration_params,
+    npt_rad=number_of_integration_points,
+    npt_azim=number_of_azimuthal_points,
+):
+    """Return the cached cake of a frame, integrating it on first use.
+
+    frame_key identifies the frame version (e.g. its frame cache key), cakes
+    are cached per frame, geometry and number of bins.
+    """
+    key = (
+        frame_key,
+        get_geometry_key(calibration_params),
+        tuple(frame.shape),
+        int(npt_rad),
+        int(npt_azim),
+    )
+    return _cakes.get_or_create(
+        key, lambda: _compute_cake(frame, calibration_params, npt_rad, npt_azim)
+    )
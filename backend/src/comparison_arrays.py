@@ -0,0 +1,90 @@
+import numpy as np
+from numba import njit
+
+# Comparisons of two frames the scatter subplot can return
+COMPARISONS = ("difference", "ratio")
+
+
+@njit(cache=True, nogil=True)
+def _range_kernel(image_1, image_2):
+    # Min and max over the pixels of both frames, skipping NaNs
+    low = np.inf
+    high = -np.inf
+    for image in (image_1, image_2):
+        for i in range(image.size):
+            value = image[i]
+            if not np.isnan(value):
+                if value < low:
+                    low = value
+                if value > high:
+                    high = value
+    return low, high
+
+
+@njit(cache=True, nogil=True)
+def _comparison_kernel(image_1, image_2, ratio, out):
+    # Single pass: out = image_1 - image_2 (or image_1 / image_2, dividing by 1
+    # where image_2 is 0), NaN where either pixel is NaN. Returns the min and max
+    # of the result, skipping NaNs.
+    low = np.inf
+    high = -np.inf
+    for i in range(image_1.size):
+        value_1 = image_1[i]
+        value_2 = image_2[i]
+        if np.isnan(value_1) or np.isnan(value_2):
+            out[i] = np.nan
+            continue
+        if ratio:
+            value = value_1 / value_2 if value_2 != 0 else value_1
+        else:
+            value = value_1 - value_2
+        out[i] = value
+        if value < low:
+            low = value
+        if value > high:
+            high = value
+    return low, high
+
+
+def _finite_range(low, high):
+    # Frames without any valid pixel get an empty [0, 0] range instead of inf
+    if low > high:
+        return 0.0, 0.0
+    return float(low), float(high)
+
+
+def _flat(image):
+    return np.ascontiguousarray(image, dtype=np.float32).reshape(-1)
+
+
+def get_frames_range(image_1, image_2):
+    """Shared (min, max) of two frames, ignoring NaN pixels"""
+    return _finite_range(*_range_kernel(_flat(image_1), _flat(image_2)))
+
+
+def compute_comparison(image_1, image_2, comparison="difference", out=None):
+    """Pixel-wise difference or ratio of two frames, NaN where either is NaN.
+
+    Pixels where the second frame is 0 keep the value of the first frame in the
+    ratio, as in the viewer. The result is written to out when given (e.g. a
+    buffer from frame_buffers).
+
+    Returns:
+        (float32 comparison array, (min, max) of its non-NaN pixels)
+    """
+    if comparison not in COMPARISONS:
+        raise ValueError(
+            f"Unknown comparison {comparison}, expected one of {', '.join(COMPARISONS)}"
+        )
+    if np.shape(image_1) != np.shape(image_2):
+        raise ValueError(
+            f"Frames shapes {np.shape(image_1)} and {np.shape(image_2)} do not match"
+        )
+
+    if out is None:
+        out = np.empty(np.shape(image_1), dtype=np.float32)
+
+    low, high = _comparison_kernel(
+        _flat(image_1), _flat(image_2), comparison == "ratio", out.reshape(-1)
+    )
+    return out, _finite_range(low, high)
@@ -0,0 +1,342 @@
+import asyncio
+import os
+import threading
+import time
+
+import httpx
+from dotenv import load_dotenv
+from src.frame_cache import frame_cache
+from src.frame_stats import get_processed_image_and_stats, store_frame_stats
+from src.get_single_image_array_and_name import read_image_array, read_image_array_async
+from src.local_catalog import get_local_catalog
+from src.metrics_index import (
+    get_fingerprint_frame_version,
+    get_frame_fingerprint,
+    get_mask_fingerprint,
+)
+from src.scan_catalog import ScanCatalog
+from src.tiled_catalog import crawl_scan_fingerprints
+from src.tiled_frames import get_frame_versions, get_tiled_dataset_client
+from tiled.client import from_uri
+
+# Read frames from the local data folder instead of the Tiled server
+DEV_MODE = False
+
+data_local_path = "../new_camera"  # "./SALT_DATA"
+# data_local_path = "../SALT_DATA"
+data_files_type = ".edf"
+local_mask_file_name = "new_mask.npy"  # "mask.npy"
+
+# Seconds a session stays valid before the catalog and mask are fetched again.
+# Can be overridden with the DATASET_SESSION_TTL environment variable.
+DEFAULT_SESSION_TTL = 600.0
+
+
+class DatasetSession:
+    """Long-lived state of the dataset browsed by the GUI.
+
+    Holds the Tiled clients, the scan catalog, the detector mask and any data
+    derived from them, so that requests only pay for the work that changed
+    (e.g. loading a newly selected frame) instead of rebuilding everything.
+    """
+
+    def __init__(
+        self,
+        all_files_uris,
+        mask_detector,
+        tiled_uri,
+        data_local_path,
+        DEV_MODE,
+        tiled_client=None,
+        tiled_api_key=None,
+        local_catalog=None,
+        catalog_version=None,
+        scan_fingerprints=None,
+    ):
+        self.all_files_uris = all_files_uris
+        self.mask_detector = mask_detector
+        self.tiled_uri = tiled_uri
+        self.data_local_path = data_local_path
+        self.DEV_MODE = DEV_MODE
+        self.tiled_client = tiled_client
+        self.tiled_api_key = tiled_api_key
+        self.local_catalog = local_catalog
+        self.catalog_version = catalog_version
+        # {scan path: fingerprint of its Tiled node}, from the catalog crawl
+        self.scan_fingerprints = scan_fingerprints or {}
+
+        self.created_at = time.monotonic()
+
+        self._derived = {}
+        self._lock = threading.Lock()
+
+    @property
+    def num_of_files(self):
+        return len(self.all_files_uris)
+
+    @property
+    def dataset_key(self):
+        """Identifies the dataset in caches that outlive the session"""
+        return self.data_local_path if self.DEV_MODE else self.tiled_uri
+
+    def is_expired(self, ttl):
+        return time.monotonic() - self.created_at > ttl
+
+    def is_stale(self):
+        """Whether the local frames or mask changed since the session was built"""
+        if self.local_catalog is None:
+            return False
+        self.local_catalog.refresh()
+        return self.local_catalog.version != self.catalog_version
+
+    def get_derived(self, key, factory):
+        """Return the derived value stored under key, computing it on first use"""
+        with self._lock:
+            if key in self._derived:
+                return self._derived[key]
+        value = factory()
+        with self._lock:
+            return self._derived.setdefault(key, value)
+
+    @property
+    def mask_fingerprint(self):
+        return self.get_derived(
+            "mask_fingerprint", lambda: get_mask_fingerprint(self.mask_detector)
+        )
+
+    @property
+    def scan_catalog(self):
+        """Indexed view of the scan names (name to index lookups, search, paging)"""
+        return self.get_derived(
+            "scan_catalog", lambda: ScanCatalog(self.all_files_uris)
+        )
+
+    def get_frame_version(self, image_uri, known_version=None, revalidate=True):
+        """Content version of a Tiled frame (see TiledDatasetClient.get_frame_version)"""
+        client = get_tiled_dataset_client(self.tiled_uri, self.tiled_api_key)
+        return client.get_frame_version(image_uri, known_version, revalidate)
+
+    def set_frame_version(self, image_uri, version):
+        """Record the version of a Tiled frame read elsewhere (e.g. a worker process)"""
+        get_frame_versions(self.tiled_uri).set(image_uri, version)
+
+    def get_frame_fingerprint(
+        self, image_uri, previous_fingerprint=None, revalidate=True
+    ):
+        """Version of a frame (see get_frame_fingerprint), None if it is not known.
+
+        Tiled frames are versioned once read by this process, or when
+        previous_fingerprint (e.g. from the metrics index) is confirmed by the
+        server. None also when the frame cannot be reached.
+        """
+        try:
+            if self.DEV_MODE:
+                return get_frame_fingerprint(
+                    image_uri, self.mask_fingerprint, self.data_local_path, True
+                )
+
+            node_fingerprint = self.scan_fingerprints.get(image_uri)
+            version = self.get_frame_version(
+                image_uri,
+                get_fingerprint_frame_version(
+                    previous_fingerprint, self.mask_fingerprint, node_fingerprint
+                ),
+                revalidate,
+            )
+            if version is None:
+                return None
+            return get_frame_fingerprint(
+                image_uri,
+                self.mask_fingerprint,
+                self.data_local_path,
+                False,
+                node_fingerprint,
+                version,
+            )
+        except (OSError, httpx.HTTPError):
+            return None
+
+    def get_frame_cache_key(self, image_uri, revalidate=True):
+        """Key of the current version of a frame in the shared frame cache.
+
+        Frames depend on the mask and on their file modification time or Tiled
+        array version, so an edited file or a new mask is never served from the
+        cache. Without revalidate, the last known version of a Tiled frame is
+        used as is (no request to the server).
+        """
+        return (
+            self.dataset_key,
+            image_uri,
+            self.get_frame_fingerprint(image_uri, revalidate=revalidate),
+        )
+
+    def get_loaded_frame_cache_key(self, image_uri):
+        """get_frame_cache_key, loading the frame first if its version is unknown.
+
+        Data derived from a frame (stats, tile pyramids, cakes) is cached under
+        this key, never under an unknown version.
+        """
+        key = self.get_frame_cache_key(image_uri)
+        if key[2] is None:
+            self.get_processed_frame(image_uri)
+            key = self.get_frame_cache_key(image_uri)
+        return key
+
+    def _get_cached_frame(self, image_uri):
+        return frame_cache.get(self.get_frame_cache_key(image_uri))
+
+    def _cache_frame(self, image_uri, processed_image, stats):
+        # The stats are kept next to the frame, under the same key
+        key = self.get_frame_cache_key(image_uri)
+        if key[2] is not None:
+            frame_cache.put(key, processed_image)
+            store_frame_stats(key, stats)
+
+    def get_processed_frame(self, image_uri):
+        """Return the processed frame for image_uri, loading it if not in the frame cache"""
+        processed_image = self._get_cached_frame(image_uri)
+        if processed_image is not None:
+            return processed_image
+
+        image_array = read_image_array(
+            image_uri,
+            self.tiled_uri,
+            self.data_local_path,
+            self.DEV_MODE,
+            api_key=self.tiled_api_key,
+            node_fingerprint=self.scan_fingerprints.get(image_uri),
+        )
+        # Preprocessing and frame stats in a single pass over the pixels
+        processed_image, stats = get_processed_image_and_stats(
+            image_array, self.mask_detector
+        )
+        self._cache_frame(image_uri, processed_image, stats)
+
+        return processed_image
+
+    async def get_processed_frame_async(self, image_uri):
+        """Awaitable get_processed_frame, the event loop keeps serving meanwhile"""
+        processed_image = await asyncio.to_thread(self._get_cached_frame, image_uri)
+        if processed_image is not None:
+            return processed_image
+
+        image_array = await read_image_array_async(
+            image_uri,
+            self.tiled_uri,
+            self.data_local_path,
+            self.DEV_MODE,
+            api_key=self.tiled_api_key,
+            node_fingerprint=self.scan_fingerprints.get(image_uri),
+        )
+        processed_image, stats = await asyncio.to_thread(
+            get_processed_image_and_stats, image_array, self.mask_detector
+        )
+        await asyncio.to_thread(self._cache_frame, image_uri, processed_image, stats)
+
+        return processed_image
+
+    def get_images_arrays_and_names(self, images_indices):
+        """Return the processed frames and names for the given catalog indices"""
+        images_names = [self.all_files_uris[index] for index in images_indices]
+        images_arrays = [self.get_processed_frame(name) for name in images_names]
+        return images_arrays, images_names
+
+    async def get_images_arrays_and_names_async(self, images_indices):
+        """Awaitable get_images_arrays_and_names, the frames are loaded concurrently"""
+        images_names = [self.all_files_uris[index] for index in images_indices]
+        images_arrays = await asyncio.gather(
+            *[self.get_processed_frame_async(name) for name in images_names]
+        )
+        return list(images_arrays), images_names
+
+
+def create_dataset_session():
+    """Read the configuration and build a new session (catalog walk + mask load)"""
+
+    # Load the .env file
+    load_dotenv("../.env")
+    # Get the values of TILED_URI and MASK_FILE_NAME
+    tiled_uri = os.getenv("TILED_URI_IMAGES")
+    mask_uri = os.getenv("TILED_URI_MASK")  # "MASK_FILE_NAME")
+    tiled_api_key_images = os.getenv("TILED_API_KEY_IMAGES")
+    tiled_api_key_mask = os.getenv("TILED_API_KEY_MASK")
+
+    if not tiled_uri or not mask_uri or not tiled_api_key_images:
+        raise EnvironmentError("Environment variables not set correctly")
+
+    if DEV_MODE:
+        # The catalog is kept up to date incrementally, no folder listing or
+        # mask decoding unless something changed
+        local_catalog = get_local_catalog(
+            data_local_path, data_files_type, local_mask_file_name
+        )
+        all_files_uris, mask_detector, catalog_version = (
+            local_catalog.get_files_names_and_mask()
+        )
+        return DatasetSession(
+            all_files_uris,
+            mask_detector,
+            tiled_uri,
+            data_local_path,
+            DEV_MODE,
+            local_catalog=local_catalog,
+            catalog_version=catalog_version,
+        )
+
+    mask_file_name = mask_uri.split("/")[-1]
+
+    # Only the containers that changed since the last crawl are listed again
+    scan_fingerprints = crawl_scan_fingerprints(tiled_uri, api_key=tiled_api_key_images)
+
+    mask_client = from_uri(mask_uri, api_key=tiled_api_key_mask)
+    mask_detector = mask_client.read()  # This retrieves the actual NumPy array
+    all_files_uris = [file for file in scan_fingerprints if file != mask_file_name]
+
+    return DatasetSession(
+        all_files_uris,
+        mask_detector,
+        tiled_uri,
+        data_local_path,
+        DEV_MODE,
+        tiled_api_key=tiled_api_key_images,
+        scan_fingerprints=scan_fingerprints,
+    )
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session_ttl():
+    return float(os.getenv("DATASET_SESSION_TTL", DEFAULT_SESSION_TTL))
+
+
+def get_dataset_session():
+    """Return the process-wide dataset session, rebuilding it once expired.
+
+    The lock is held while building so concurrent requests wait for a single
+    catalog walk instead of each starting their own.
+    """
+    global _session
+
+    with _session_lock:
+        if (
+            _session is None
+            or _session.is_expired(get_session_ttl())
+            or _session.is_stale()
+        ):
+            _session = create_dataset_session()
+        return _session
+
+
+async def get_dataset_session_async():
+    """Awaitable get_dataset_session, a catalog walk runs in a worker thread"""
+    return await asyncio.to_thread(get_dataset_session)
+
+
+def invalidate_dataset_session():
+    """Drop the current session, the next request rebuilds it from scratch"""
+    global _session
+
+    with _session_lock:
+        _session = None
@@ -0,0 +1,83 @@
+import os
+import threading
+from collections import OrderedDict
+
+# Bytes of processed frames kept in memory, shared by every route. Can be
+# overridden with the FRAME_CACHE_BYTES environment variable.
+DEFAULT_FRAME_CACHE_BYTES = 1024**3
+
+
+class FrameCache:
+    """Thread-safe LRU cache of processed frames bounded by a byte budget.
+
+    Keys identify a frame version (dataset, frame URI, mask and file
+    fingerprint). Cached frames are made read-only since every route shares
+    them. Hits, misses and evictions are counted for monitoring.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return the frame cached under key, or None"""
+        with self._lock:
+            frame = self._entries.get(key)
+            if frame is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return frame
+
+    def contains(self, key):
+        """Whether key is cached, without counting a hit or miss"""
+        with self._lock:
+            return key in self._entries
+
+    def put(self, key, frame):
+        """Cache a frame, evicting the least recently used ones over the budget"""
+        # A frame larger than the whole budget would only evict everything else
+        if frame.nbytes > self.max_bytes:
+            return
+
+        frame.flags.writeable = False
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= previous.nbytes
+
+            self._entries[key] = frame
+            self.current_bytes += frame.nbytes
+
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "current_bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+frame_cache = FrameCache(int(os.getenv("FRAME_CACHE_BYTES", DEFAULT_FRAME_CACHE_BYTES)))
@@ -0,0 +1,110 @@
+import asyncio
+import os
+
+from src.frame_cache import frame_cache
+
+# Frames prefetched on each side of the displayed ones, and loaded at once.
+# Can be overridden with the FRAME_PREFETCH_RADIUS and
+# FRAME_PREFETCH_CONCURRENCY environment variables (a radius of 0 disables it).
+DEFAULT_FRAME_PREFETCH_RADIUS = 2
+DEFAULT_FRAME_PREFETCH_CONCURRENCY = 2
+
+
+class FramePrefetcher:
+    """Loads the neighbours of the displayed frames into the frame cache.
+
+    Users step through a scan frame by frame, so after frames i and j are
+    served, i±1..radius and j±1..radius are loaded in the background (nearest
+    first). Prefetches of frames that are no longer neighbours of the displayed
+    ones are cancelled when the user jumps elsewhere.
+    """
+
+    def __init__(self, radius=None, concurrency=None):
+        self.radius = int(
+            radius
+            if radius is not None
+            else os.getenv("FRAME_PREFETCH_RADIUS", DEFAULT_FRAME_PREFETCH_RADIUS)
+        )
+        self.concurrency = int(
+            concurrency
+            or os.getenv(
+                "FRAME_PREFETCH_CONCURRENCY", DEFAULT_FRAME_PREFETCH_CONCURRENCY
+            )
+        )
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._tasks = {}
+
+    def get_neighbour_indices(self, served_indices, num_of_files):
+        """Indices around the served ones, nearest first, without the served ones"""
+        neighbour_indices = []
+        for distance in range(1, self.radius + 1):
+            for index in served_indices:
+                for neighbour in (index + distance, index - distance):
+                    if (
+                        0 <= neighbour < num_of_files
+                        and neighbour not in served_indices
+                        and neighbour not in neighbour_indices
+                    ):
+                        neighbour_indices.append(neighbour)
+        return neighbour_indices
+
+    def schedule(self, session, served_indices):
+        """Start prefetching the neighbours of the served frames (event loop only)"""
+        neighbour_uris = [
+            session.all_files_uris[index]
+            for index in self.get_neighbour_indices(
+                served_indices, session.num_of_files
+            )
+        ]
+        wanted = {(session.dataset_key, uri) for uri in neighbour_uris}
+
+        # The user moved away from these frames
+        for key, task in list(self._tasks.items()):
+            if key not in wanted:
+                task.cancel()
+                del self._tasks[key]
+
+        for uri in neighbour_uris:
+            key = (session.dataset_key, uri)
+            if key in self._tasks or frame_cache.contains(
+                session.get_frame_cache_key(uri, revalidate=False)
+            ):
+                continue
+
+            task = asyncio.create_task(self._prefetch(session, uri))
+            self._tasks[key] = task
+            task.add_done_callback(lambda task, key=key: self._forget(key, task))
+
+    async def wait_for(self, session, image_uris):
+        """Wait for the in-flight prefetches of frames about to be served.
+
+        The frames are then read from the cache instead of being loaded twice.
+        """
+        tasks = [
+            self._tasks[(session.dataset_key, uri)]
+            for uri in image_uris
+            if (session.dataset_key, uri) in self._tasks
+        ]
+        if tasks:
+            # A later schedule() may cancel the prefetch, not this request
+            await asyncio.gather(
+                *[asyncio.shield(task) for task in tasks], return_exceptions=True
+            )
+
+    def _forget(self, key, task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+
+    async def _prefetch(self, session, image_uri):
+        async with self._semaphore:
+            if frame_cache.contains(
+                session.get_frame_cache_key(image_uri, revalidate=False)
+            ):
+                return
+            try:
+                await session.get_processed_frame_async(image_uri)
+            except Exception as e:
+                print(f"Error prefetching image {image_uri}: {str(e)}")
+
+
+frame_prefetcher = FramePrefetcher()
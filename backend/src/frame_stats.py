@@ -0,0 +1,300 @@
+import os
+
+import numpy as np
+from numba import njit
+from src.bounded_cache import BoundedLRUCache
+from src.preprocess_image import as_kernel_arrays, check_frame_shape, get_valid_pixels
+
+# Positive pixels are counted in log-spaced bins keyed by the top bits of their
+# float32 bit pattern (exponent and the first SKETCH_MANTISSA_BITS mantissa
+# bits), i.e. bins of relative width 2**-SKETCH_MANTISSA_BITS over the whole
+# float32 range, no value range has to be known before the pass
+SKETCH_MANTISSA_BITS = 10
+_SKETCH_SHIFT = 23 - SKETCH_MANTISSA_BITS
+# Bins up to the bit pattern of +inf (excluded)
+_SKETCH_TABLE_SIZE = 0x7F800000 >> _SKETCH_SHIFT
+
+# Number of bins of the intensity histogram returned per frame
+HISTOGRAM_BINS = 256
+
+# Stats are a few tens of kB per frame, many frames can be kept
+DEFAULT_FRAME_STATS_CACHE_SIZE = 4096
+
+_frame_stats = BoundedLRUCache(
+    int(os.getenv("FRAME_STATS_CACHE_SIZE", DEFAULT_FRAME_STATS_CACHE_SIZE))
+)
+
+
+@njit(cache=True, nogil=True)
+def _preprocess_stats_kernel(
+    image, valid_pixels, out, out_bits, bin_counts, bin_values
+):
+    # Same masking as the preprocessing kernel, and in the same pass the moments
+    # (shifted by the first value for a stable variance), the zero count and the
+    # sketch bin of every finite pixel. A bin holding two distinct values makes
+    # the sketch approximate.
+    count = 0
+    zero_count = 0
+    minimum = np.inf
+    maximum = -np.inf
+    min_positive = np.inf
+    shift = 0.0
+    total = 0.0
+    total_squares = 0.0
+    mixed = False
+    for i in range(image.size):
+        value = np.float32(image[i])
+        if not valid_pixels[i] or value < 0.0 or np.isnan(value):
+            out[i] = np.nan
+            continue
+        out[i] = value
+        if np.isinf(value):
+            continue
+
+        if count == 0:
+            shift = np.float64(value)
+        count += 1
+        delta = np.float64(value) - shift
+        total += delta
+        total_squares += delta * delta
+        if value < minimum:
+            minimum = value
+        if value > maximum:
+            maximum = value
+
+        if value == 0.0:
+            zero_count += 1
+            continue
+        if value < min_positive:
+            min_positive = value
+        sketch_bin = out_bits[i] >> _SKETCH_SHIFT
+        if bin_counts[sketch_bin] == 0:
+            bin_values[sketch_bin] = value
+        elif bin_values[sketch_bin] != value:
+            mixed = True
+        bin_counts[sketch_bin] += 1
+
+    return (
+        count,
+        zero_count,
+        minimum,
+        maximum,
+        min_positive,
+        shift,
+        total,
+        total_squares,
+        mixed,
+    )
+
+
+def _empty_stats():
+    nan = float("nan")
+    return {
+        "count": 0,
+        "min": nan,
+        "max": nan,
+        "mean": nan,
+        "std": nan,
+        "positive_count": 0,
+        "min_positive": nan,
+        "histogram_counts": np.zeros(HISTOGRAM_BINS, dtype=np.int64),
+        "histogram_edges": np.full(HISTOGRAM_BINS + 1, np.nan),
+        "sketch": None,
+    }
+
+
+def _bin_edge(bins):
+    return (
+        (bins.astype(np.uint32) << np.uint32(_SKETCH_SHIFT))
+        .view(np.float32)
+        .astype(np.float64)
+    )
+
+
+def _summarize(accumulators, bin_counts, bin_values):
+    (
+        count,
+        zero_count,
+        minimum,
+        maximum,
+        min_positive,
+        shift,
+        total,
+        total_squares,
+        mixed,
+    ) = accumulators
+    if not count:
+        return _empty_stats()
+
+    mean_delta = total / count
+    present = np.flatnonzero(bin_counts)
+    counts = bin_counts[present].astype(np.int64)
+
+    if mixed:
+        sketch = {
+            "discrete": False,
+            "lower": _bin_edge(present),
+            "upper": _bin_edge(present + 1),
+        }
+        # The histogram places every bin at its mid value, within the pixel range
+        sketch_values = np.clip(
+            (sketch["lower"] + sketch["upper"]) / 2, float(minimum), float(maximum)
+        )
+    else:
+        # A single value per bin, the counts are exact
+        sketch = {"discrete": True, "values": bin_values[present].astype(np.float64)}
+        sketch_values = sketch["values"]
+    sketch["counts"] = counts
+    sketch["zero_count"] = int(zero_count)
+
+    histogram_counts, histogram_edges = np.histogram(
+        np.append(sketch_values, 0.0),
+        bins=HISTOGRAM_BINS,
+        range=(float(minimum), float(maximum)),
+        weights=np.append(counts, zero_count),
+    )
+
+    positive_count = int(count - zero_count)
+    return {
+        "count": int(count),
+        "min": float(minimum),
+        "max": float(maximum),
+        "mean": shift + mean_delta,
+        "std": float(np.sqrt(max(total_squares / count - mean_delta**2, 0.0))),
+        "positive_count": positive_count,
+        "min_positive": float(min_positive) if positive_count else float("nan"),
+        "histogram_counts": histogram_counts.astype(np.int64),
+        "histogram_edges": histogram_edges,
+        "sketch": sketch,
+    }
+
+
+def get_processed_image_and_stats(image, mask_detector, out=None):
+    """get_processed_image that also returns the stats of the processed frame,
+    computed in the same pass over the pixels (see compute_frame_stats).
+    """
+    valid_pixels = get_valid_pixels(mask_detector)
+    check_frame_shape(image, valid_pixels)
+    return _process_with_stats(image, valid_pixels, out)
+
+
+def _process_with_stats(image, valid_pixels, out=None):
+    image_flat, out_flat, out = as_kernel_arrays(image, valid_pixels, out)
+    bin_counts = np.zeros(_SKETCH_TABLE_SIZE, dtype=np.int32)
+    bin_values = np.empty(_SKETCH_TABLE_SIZE, dtype=np.float32)
+    accumulators = _preprocess_stats_kernel(
+        image_flat.reshape(-1),
+        valid_pixels.reshape(-1),
+        out_flat.reshape(-1),
+        out_flat.reshape(-1).view(np.uint32),
+        bin_counts,
+        bin_values,
+    )
+    return out, _summarize(accumulators, bin_counts, bin_values)
+
+
+def compute_frame_stats(frame):
+    """Summarize the valid (finite, non-negative) pixels of a frame.
+
+    Returns a dict with the pixel count, min, max, mean, std, a histogram and a
+    sketch of the values: the count of every distinct value when the frame has
+    few enough of them (e.g. photon counting frames), otherwise counts in bins
+    of relative width 2**-SKETCH_MANTISSA_BITS.
+    """
+    _, stats = _process_with_stats(frame, np.ones(np.shape(frame), dtype=bool))
+    return stats
+
+
+def store_frame_stats(frame_key, stats):
+    """Keep the stats computed while loading the frame cached under frame_key"""
+    _frame_stats.put(frame_key, stats)
+
+
+def get_frame_stats(frame_key, load_frame):
+    """Return the stats of a frame, stored when the frame was loaded.
+
+    frame_key identifies the frame version (its frame cache key), so stats of an
+    edited file or of a previous mask are never served. On a miss the frame is
+    loaded with load_frame(), which stores its stats when it reads the frame, or
+    they are computed again from the returned frame.
+    """
+
+    def build():
+        frame = load_frame()
+        stats = _frame_stats.get(frame_key)
+        return compute_frame_stats(frame) if stats is None else stats
+
+    return _frame_stats.get_or_create(frame_key, build)
+
+
+def _discrete_percentiles(sketches, levels, positive):
+    # Exact order statistics of the merged value counts, interpolated between
+    # neighbours as np.percentile does
+    values = [sketch["values"] for sketch in sketches]
+    counts = [sketch["counts"] for sketch in sketches]
+    if not positive:
+        values.append([0.0])
+        counts.append([sum(sketch["zero_count"] for sketch in sketches)])
+    values, inverse = np.unique(np.concatenate(values), return_inverse=True)
+    counts = np.bincount(inverse, weights=np.concatenate(counts))
+    cumulative = np.cumsum(counts)
+    total = int(round(cumulative[-1]))
+
+    ranks = levels * (total - 1)
+    below = np.floor(ranks)
+    above = np.minimum(below + 1, total - 1)
+    lower = values[np.searchsorted(cumulative, below, side="right")]
+    upper = values[np.searchsorted(cumulative, above, side="right")]
+    return lower + (ranks - below) * (upper - lower)
+
+
+def _cdf_samples(sketch):
+    # (values, count of pixels <= value) of a piecewise linear CDF, positive
+    # pixels are spread uniformly over their bin
+    if sketch["discrete"]:
+        lower = upper = sketch["values"]
+    else:
+        lower, upper = sketch["lower"], sketch["upper"]
+    cumulative = np.cumsum(sketch["counts"])
+    values = np.column_stack([lower, upper]).ravel()
+    counts = np.column_stack([cumulative - sketch["counts"], cumulative]).ravel()
+    return values, counts
+
+
+def query_percentiles(frames_stats, percentiles, positive=False):
+    """Percentiles of the union of the pixels of several frames.
+
+    Frames with exact sketches give the same values as np.percentile over all
+    their pixels. Otherwise the CDF of the union is the sum of the per-frame
+    CDFs of the binned counts, accurate to a fraction of a bin.
+
+    Args:
+        frames_stats: List of dicts from compute_frame_stats
+        percentiles: Percentiles in [0, 100]
+        positive: Only consider the positive pixels (log-scale ranges)
+    """
+    count_key = "positive_count" if positive else "count"
+
+    frames_stats = [stats for stats in frames_stats if stats[count_key] > 0]
+    if not frames_stats:
+        return np.full(len(percentiles), np.nan)
+
+    levels = np.asarray(percentiles, dtype=np.float64) / 100.0
+    sketches = [stats["sketch"] for stats in frames_stats]
+    if all(sketch["discrete"] for sketch in sketches):
+        return _discrete_percentiles(sketches, levels, positive)
+
+    samples = [_cdf_samples(sketch) for sketch in sketches]
+    candidate_values = np.unique(np.concatenate([values for values, _ in samples]))
+    zero_count = 0 if positive else sum(sketch["zero_count"] for sketch in sketches)
+    if zero_count:
+        # Zeros are a point mass, below every positive bin
+        candidate_values = np.concatenate([[0.0], candidate_values])
+    cdf = np.full(candidate_values.shape, float(zero_count))
+    for values, counts in samples:
+        cdf += np.interp(candidate_values, values, counts, left=0.0, right=counts[-1])
+    cdf /= cdf[-1]
+
+    # Value ranges without pixels are flat in the CDF, keep their first value
+    cdf, first_index = np.unique(cdf, return_index=True)
+    return np.interp(levels, cdf, candidate_values[first_index])
@@ -0,0 +1,412 @@
+import asyncio
+import concurrent.futures
+import multiprocessing
+import os
+import threading
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+import numpy as np
+from src.frame_cache import frame_cache
+from src.get_single_image_array_and_name import (
+    get_single_image_array_and_name,
+    read_image_array,
+    read_image_array_async,
+)
+from src.overview_metrics import compute_overview_metrics
+from src.preprocess_image import (
+    frame_buffers,
+    get_processed_image,
+    get_processed_images,
+)
+from src.tiled_frames import get_frame_versions
+
+# "thread" or "process", can be overridden with the FRAME_WORKERS_BACKEND
+# environment variable. Frame decoding and masking are largely GIL-bound, the
+# process backend lets them use all the cores of the node.
+DEFAULT_FRAME_WORKERS_BACKEND = "thread"
+
+# Thread count of the thread backend (FRAME_WORKERS_MAX_WORKERS overrides it for
+# both backends, the process backend defaults to the number of cores)
+DEFAULT_THREAD_WORKERS = 16
+
+
+class SharedArray:
+    """NumPy array in shared memory, handed to worker processes by name.
+
+    Only the small descriptor (name, shape, dtype) is pickled, the workers map
+    the same memory instead of receiving a copy of the data.
+    """
+
+    def __init__(self, shape, dtype, name=None):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.owner = name is None
+
+        if self.owner:
+            size = max(int(np.prod(self.shape)) * self.dtype.itemsize, 1)
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = _attach_shared_memory(name)
+
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=self.shm.buf)
+
+    @classmethod
+    def from_array(cls, array):
+        shared = cls(array.shape, array.dtype)
+        shared.array[...] = array
+        return shared
+
+    @property
+    def descriptor(self):
+        return self.shm.name, self.shape, self.dtype.str
+
+    @classmethod
+    def attach(cls, descriptor):
+        name, shape, dtype = descriptor
+        return cls(shape, dtype, name=name)
+
+    def close(self):
+        # The array must not be used after this
+        self.array = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _attach_shared_memory(name):
+    try:
+        # Python >= 3.13: the creating process alone is responsible for unlinking
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+# State of a worker process, set once by the pool initializer
+_worker_state = {}
+
+
+def _init_worker(mask_descriptor, tiled_uri, data_local_path, DEV_MODE, api_key):
+    """Attach the shared detector mask once per worker process"""
+    mask = SharedArray.attach(mask_descriptor)
+    _worker_state.update(
+        mask=mask,
+        tiled_uri=tiled_uri,
+        data_local_path=data_local_path,
+        DEV_MODE=DEV_MODE,
+        api_key=api_key,
+    )
+
+
+def _worker_source():
+    # Arguments locating the frames, from the worker process state
+    return (
+        _worker_state["mask"].array,
+        _worker_state["tiled_uri"],
+        _worker_state["data_local_path"],
+        _worker_state["DEV_MODE"],
+        _worker_state["api_key"],
+    )
+
+
+def frame_metrics_task(
+    index, image_uri, roi_spec=None, source=None, node_fingerprint=None
+):
+    """Load a frame and return (index, metrics, name, success, frame version).
+
+    Metrics is the dict of compute_overview_metrics. Only the metrics travel
+    back to the parent process, not the frame. The frame version is the Tiled
+    version of the frame read (see TiledFrameVersions), None for local frames.
+    """
+    source = source or _worker_source()
+    try:
+        # The processed frame only lives until it is reduced, it is written to
+        # a pooled buffer instead of a new array
+        with frame_buffers.buffer(np.shape(source[0])) as buffer:
+            image_array, image_name = get_single_image_array_and_name(
+                image_uri, *source, out=buffer, node_fingerprint=node_fingerprint
+            )
+            metrics = compute_overview_metrics(image_array, source[0], roi_spec)
+        return index, metrics, image_name, True, _get_read_version(image_uri, source)
+    except Exception as e:
+        print(f"Error processing image {index}: {str(e)}")
+        return index, {}, f"Error: {image_uri}", False, None
+
+
+def _get_read_version(image_uri, source):
+    # Version recorded by the Tiled read of the frame
+    _, tiled_uri, _, DEV_MODE, _ = source
+    return None if DEV_MODE else get_frame_versions(tiled_uri).get(image_uri)
+
+
+async def frame_metrics_async(index, image_uri, session, executor, roi_spec=None):
+    """Awaitable frame_metrics_task for the thread backend.
+
+    Tiled frames are downloaded without blocking the event loop, local reads,
+    decoding and reductions run in the executor's threads. The pooled buffer is
+    only taken once the frame is downloaded, frames waiting for a connection do
+    not hold one.
+    """
+    mask_detector = session.mask_detector
+    loop = asyncio.get_running_loop()
+
+    def reduce_frame(image_array):
+        with frame_buffers.buffer(np.shape(mask_detector)) as buffer:
+            processed_image = get_processed_image(image_array, mask_detector, buffer)
+            return compute_overview_metrics(processed_image, mask_detector, roi_spec)
+
+    try:
+        if session.DEV_MODE:
+            image_array = await loop.run_in_executor(
+                executor,
+                read_image_array,
+                image_uri,
+                session.tiled_uri,
+                session.data_local_path,
+                session.DEV_MODE,
+            )
+        else:
+            image_array = await read_image_array_async(
+                image_uri,
+                session.tiled_uri,
+                session.data_local_path,
+                session.DEV_MODE,
+                api_key=session.tiled_api_key,
+                node_fingerprint=session.scan_fingerprints.get(image_uri),
+            )
+        metrics = await loop.run_in_executor(executor, reduce_frame, image_array)
+        frame_version = (
+            None
+            if session.DEV_MODE
+            else get_frame_versions(session.tiled_uri).get(image_uri)
+        )
+        return index, metrics, image_uri, True, frame_version
+    except Exception as e:
+        print(f"Error processing image {index}: {str(e)}")
+        return index, {}, f"Error: {image_uri}", False, None
+
+
+def load_frame_into_stack_task(
+    position, image_uri, stack, source=None, node_fingerprint=None
+):
+    """Read a raw frame into stack[position], NaN-filled if it cannot be loaded.
+
+    The stack is an array (thread backend) or the descriptor of a shared array
+    (process backend) the frame is written to directly. Frames are cast to the
+    stack's float32 but not masked, the whole stack is preprocessed at once.
+    """
+    shared_stack = None
+    if not isinstance(stack, np.ndarray):
+        shared_stack = SharedArray.attach(stack)
+        stack = shared_stack.array
+
+    try:
+        image_array = read_image_array(
+            image_uri, *(source or _worker_source())[1:], node_fingerprint
+        )
+        # Frames not matching the mask shape are rejected
+        if np.shape(image_array) != stack.shape[1:]:
+            raise ValueError(
+                f"Image shape {np.shape(image_array)} does not match the mask "
+                f"shape {stack.shape[1:]}"
+            )
+        stack[position] = image_array
+        return True
+    except Exception as e:
+        print(f"Error processing image {image_uri}: {str(e)}")
+        stack[position] = np.nan
+        return False
+    finally:
+        if shared_stack is not None:
+            shared_stack.close()
+
+
+class FrameWorkerPool:
+    """Long-lived pool loading and reducing the frames of a dataset session.
+
+    With the "process" backend the detector mask is placed in shared memory once
+    (instead of being pickled with every task) and loaded frames are written to
+    a shared stack instead of being pickled back.
+    """
+
+    def __init__(self, session, backend=None, max_workers=None):
+        self.session = session
+        self.backend = backend or os.getenv(
+            "FRAME_WORKERS_BACKEND", DEFAULT_FRAME_WORKERS_BACKEND
+        )
+        if self.backend not in ("thread", "process"):
+            raise ValueError(f"Unknown frame workers backend: {self.backend}")
+
+        max_workers = max_workers or os.getenv("FRAME_WORKERS_MAX_WORKERS")
+        self.shared_mask = None
+
+        # Requests using the pool, a replaced pool shuts down after the last one
+        self._users = 0
+        self._retired = False
+        self._users_lock = threading.Lock()
+
+        if self.backend == "process":
+            self.max_workers = int(max_workers or os.cpu_count() or 1)
+            self.shared_mask = SharedArray.from_array(np.asarray(session.mask_detector))
+            self.executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                # Forking a multi-threaded server is unsafe
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(
+                    self.shared_mask.descriptor,
+                    session.tiled_uri,
+                    session.data_local_path,
+                    session.DEV_MODE,
+                    session.tiled_api_key,
+                ),
+            )
+        else:
+            self.max_workers = int(max_workers or DEFAULT_THREAD_WORKERS)
+            self.executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_workers
+            )
+
+    @property
+    def _source(self):
+        # Thread workers share the session's mask, process workers attached it
+        # to the shared copy in their initializer
+        if self.backend == "process":
+            return None
+        return (
+            self.session.mask_detector,
+            self.session.tiled_uri,
+            self.session.data_local_path,
+            self.session.DEV_MODE,
+            self.session.tiled_api_key,
+        )
+
+    def submit_frame_metrics(self, index, image_uri, loop=None, roi_spec=None):
+        """Compute the overview metrics of a frame in the pool.
+
+        Returns an asyncio future when an event loop is given (with the thread
+        backend the frame is then read through the async data access layer), a
+        concurrent.futures future otherwise. Cancelling it skips the frame if it
+        has not started yet.
+        """
+        if loop is not None and self.backend == "thread":
+            return loop.create_task(
+                frame_metrics_async(
+                    index, image_uri, self.session, self.executor, roi_spec
+                )
+            )
+
+        task = (
+            frame_metrics_task,
+            index,
+            image_uri,
+            roi_spec,
+            self._source,
+            self.session.scan_fingerprints.get(image_uri),
+        )
+        if loop is not None:
+            return loop.run_in_executor(self.executor, *task)
+        return self.executor.submit(*task)
+
+    @contextmanager
+    def load_frames(self, images_uris):
+        """Load and preprocess frames concurrently into one (n, height, width) stack.
+
+        Frames have the shape of the detector mask. Frames that fail to load are
+        filled with NaN and reported in the success flags. With the process
+        backend the stack lives in shared memory released when the context exits.
+
+        Yields:
+            Tuple (stack, success)
+        """
+        shape = (len(images_uris),) + np.shape(self.session.mask_detector)
+
+        if self.backend == "process":
+            shared_stack = SharedArray(shape, np.float32)
+            stack, stack_argument = shared_stack.array, shared_stack.descriptor
+        else:
+            shared_stack = None
+            stack = stack_argument = np.empty(shape, dtype=np.float32)
+
+        try:
+            # Frames already in the frame cache are copied, the others loaded
+            # (without filling the cache with a whole series)
+            futures = {}
+            for position, uri in enumerate(images_uris):
+                cached_frame = frame_cache.get(self.session.get_frame_cache_key(uri))
+                if cached_frame is not None and cached_frame.shape == shape[1:]:
+                    stack[position] = cached_frame
+                    continue
+                futures[position] = self.executor.submit(
+                    load_frame_into_stack_task,
+                    position,
+                    uri,
+                    stack_argument,
+                    self._source,
+                    self.session.scan_fingerprints.get(uri),
+                )
+            success = [
+                futures[position].result() if position in futures else True
+                for position in range(len(images_uris))
+            ]
+
+            # One masking pass over the whole stack, cached frames are already
+            # processed and stay unchanged
+            get_processed_images(stack, self.session.mask_detector, out=stack)
+            yield stack, success
+        finally:
+            if shared_stack is not None:
+                shared_stack.close()
+
+    def acquire(self):
+        with self._users_lock:
+            self._users += 1
+
+    def release(self):
+        with self._users_lock:
+            self._users -= 1
+            shutdown = self._retired and not self._users
+        if shutdown:
+            self.shutdown()
+
+    def retire(self):
+        """Shut the pool down once the requests still using it are done"""
+        with self._users_lock:
+            self._retired = True
+            shutdown = not self._users
+        if shutdown:
+            self.shutdown()
+
+    def shutdown(self):
+        # Tasks already submitted still run, the workers exit after them
+        self.executor.shutdown(wait=False)
+        if self.shared_mask is not None:
+            self.shared_mask.close()
+            self.shared_mask = None
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+@contextmanager
+def frame_worker_pool(session):
+    """Use the worker pool of the session for the duration of a request.
+
+    The pool of an older session is replaced, it finishes the work of the
+    requests still using it and shuts down after the last one.
+    """
+    global _pool
+
+    with _pool_lock:
+        if _pool is None or _pool.session is not session:
+            if _pool is not None:
+                _pool.retire()
+            _pool = FrameWorkerPool(session)
+        pool = _pool
+        pool.acquire()
+
+    try:
+        yield pool
+    finally:
+        pool.release()
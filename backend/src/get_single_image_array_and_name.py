@@ -1,56 +1,60 @@
-# import asyncio
+import asyncio
 import os
-import urllib.parse as urlparse
-from functools import lru_cache
 
-import fabio
-import numpy as np
+from src.local_frames import read_local_frame
 from src.preprocess_image import get_processed_image
-from tiled.client import from_uri
-
-
-# Cache the Tiled client connection to avoid recreating it for each image
-@lru_cache(maxsize=4)  # Adjust maxsize based on your server memory
-def get_tiled_client(uri):
-    return from_uri(uri)
+from src.tiled_async import get_async_tiled_client
+from src.tiled_frames import get_tiled_dataset_client
 
 
 def get_single_image_array_and_name(
-    image_uri, mask_detector, tiled_uri, data_local_path, DEV_MODE
+    image_uri,
+    mask_detector,
+    tiled_uri,
+    data_local_path,
+    DEV_MODE,
+    api_key=None,
+    out=None,
+    node_fingerprint=None,
 ):
-    """Process a single image and return its array and name"""
+    """Process a single image and return its array and name.
+    The processed image is written to out (float32, mask shape) when given.
+    node_fingerprint is the fingerprint of the frame's Tiled node, used to check
+    the cached array structure.
+    """
 
-    if DEV_MODE:
-        # Load local image
-        image_path = os.path.join(data_local_path, image_uri)
-
-        # Use fabio to read .edf files
-        if image_uri.endswith(".edf"):
-            image_array = fabio.open(image_path).data  # Get image data from .edf
-        else:
-            image_array = np.load(
-                image_path, allow_pickle=True
-            )  # For other file types like .npy
-
-        processed_image = get_processed_image(
-            image_array,
-            mask_detector,
-        )
+    image_array = read_image_array(
+        image_uri, tiled_uri, data_local_path, DEV_MODE, api_key, node_fingerprint
+    )
+    processed_image = get_processed_image(image_array, mask_detector, out=out)
 
-        return processed_image, image_uri
+    return processed_image, image_uri
 
-    else:
-        # Load image from the tiled server
-        tiled_uri = tiled_uri if tiled_uri.endswith("/") else tiled_uri + "/"
-        file_uri = urlparse.urljoin(tiled_uri, image_uri)
-        # image_client = from_uri(file_uri)
 
-        image_client = get_tiled_client(file_uri)
-        image_array = image_client.read()  # Retrieve the NumPy array
+def read_image_array(
+    image_uri, tiled_uri, data_local_path, DEV_MODE, api_key=None, node_fingerprint=None
+):
+    """Read the raw (unprocessed) frame at image_uri"""
+    if DEV_MODE:
+        # .npy frames are memory-mapped, .edf frames decoded once into a
+        # memory-mappable cache
+        return read_local_frame(os.path.join(data_local_path, image_uri))
+
+    # Load image from the tiled server, through the dataset's pooled client
+    # (a single request to the array endpoint per frame)
+    return get_tiled_dataset_client(tiled_uri, api_key).read_frame(
+        image_uri, node_fingerprint
+    )
 
-        processed_image = get_processed_image(
-            image_array,
-            mask_detector,
-        )
 
-        return processed_image, image_uri
+async def read_image_array_async(
+    image_uri, tiled_uri, data_local_path, DEV_MODE, api_key=None, node_fingerprint=None
+):
+    """Read the raw (unprocessed) frame at image_uri without blocking the event loop"""
+    if DEV_MODE:
+        return await asyncio.to_thread(
+            read_local_frame, os.path.join(data_local_path, image_uri)
+        )
+    return await get_async_tiled_client(tiled_uri, api_key).read_frame(
+        image_uri, node_fingerprint
+    )
@@ -0,0 +1,304 @@
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import scipy.sparse
+from pyFAI.integrator.azimuthal import AzimuthalIntegrator
+from src.bounded_cache import BoundedLRUCache
+
+# Number of geometries (integrators, CSR engines, q/chi maps) kept in memory.
+# A CSR engine of a 4 Mpixel detector takes a few hundred MB, keep this small.
+DEFAULT_INTEGRATOR_CACHE_SIZE = 8
+
+number_of_integration_points = 500  # Number of points in output 1D pattern
+number_of_azimuthal_points = 360  # Number of chi bins of the 2D (cake) integration
+method = ("full", "csr", "cython")  # Integration method using CPU optimization
+# Alternative GPU-accelerated method (commented out):
+# method=("full", "csr", "opencl", (0,0))
+
+# Stacked multi-sector matrices and 2D (cake) matrices are kept apart from the
+# 1D engines, so sector and cake requests do not evict the engine of the main
+# profile. A cake matrix is about as large as a full 1D engine.
+DEFAULT_SECTOR_MATRIX_CACHE_SIZE = 4
+DEFAULT_CAKE_MATRIX_CACHE_SIZE = 2
+
+_cache_size = int(os.getenv("INTEGRATOR_CACHE_SIZE", DEFAULT_INTEGRATOR_CACHE_SIZE))
+
+_integrators = BoundedLRUCache(_cache_size)
+_engines = BoundedLRUCache(_cache_size)
+_maps = BoundedLRUCache(_cache_size)
+_sector_matrices = BoundedLRUCache(
+    int(os.getenv("SECTOR_MATRIX_CACHE_SIZE", DEFAULT_SECTOR_MATRIX_CACHE_SIZE))
+)
+_cake_matrices = BoundedLRUCache(
+    int(os.getenv("CAKE_MATRIX_CACHE_SIZE", DEFAULT_CAKE_MATRIX_CACHE_SIZE))
+)
+
+
+def get_geometry_key(calibration_params):
+    """Hashable key describing the experimental geometry"""
+    return (
+        float(calibration_params["sample_detector_distance"]),
+        float(calibration_params["beam_center_x"]),
+        float(calibration_params["beam_center_y"]),
+        float(calibration_params["pixel_size_x"]),
+        float(calibration_params["pixel_size_y"]),
+        float(calibration_params["wavelength"]),
+        float(calibration_params["tilt"]),
+        float(calibration_params["tilt_plan_rotation"]),
+    )
+
+
+def _as_range_key(range_tuple):
+    if range_tuple is None:
+        return None
+    return (float(range_tuple[0]), float(range_tuple[1]))
+
+
+def _create_azimuthal_integrator(calibration_params):
+    # Initialize the azimuthal integrator with our experimental geometry
+    ai = AzimuthalIntegrator()
+    ai.setFit2D(
+        directDist=calibration_params["sample_detector_distance"],
+        centerX=calibration_params["beam_center_x"],
+        centerY=calibration_params["beam_center_y"],
+        tilt=calibration_params["tilt"],
+        tiltPlanRotation=calibration_params["tilt_plan_rotation"],
+        pixelX=calibration_params["pixel_size_x"],
+        pixelY=calibration_params["pixel_size_y"],
+        wavelength=calibration_params["wavelength"],
+    )
+    return ai
+
+
+def _get_integrator_entry(calibration_params):
+    # (integrator, lock serializing the tables and maps built from it)
+    return _integrators.get_or_create(
+        get_geometry_key(calibration_params),
+        lambda: (_create_azimuthal_integrator(calibration_params), threading.RLock()),
+    )
+
+
+def get_azimuthal_integrator(calibration_params):
+    """Return a calibrated AzimuthalIntegrator, shared by all requests on this geometry"""
+    return _get_integrator_entry(calibration_params)[0]
+
+
+@contextmanager
+def _locked_integrator(calibration_params):
+    # pyFAI integrators are not thread-safe: integrations store their engine in
+    # ai.engines and the pixel maps in other shared caches, so every table or
+    # map built from the shared integrator of a geometry is built under its lock
+    ai, lock = _get_integrator_entry(calibration_params)
+    with lock:
+        yield ai
+
+
+def _get_engine_key(calibration_params, image_shape, azimuth_range, q_range, npt):
+    return (
+        get_geometry_key(calibration_params),
+        tuple(image_shape),
+        _as_range_key(azimuth_range),
+        _as_range_key(q_range),
+        int(npt),
+    )
+
+
+def _build_integration_engine(
+    calibration_params, image_shape, azimuth_range, q_range, npt
+):
+    with _locked_integrator(calibration_params) as ai:
+        # The lookup table only depends on the geometry, not on the pixel values
+        res = ai.integrate1d(
+            np.zeros(image_shape, dtype=np.float32),
+            npt,
+            method=method,
+            azimuth_range=azimuth_range,
+            radial_range=q_range,
+        )
+        return ai.engines[res.method].engine
+
+
+def _get_engine_matrix(engine):
+    # (CSR matrix sharing the engine buffers, q bin centers, empty value)
+    data, indices, indptr = engine.lut
+    matrix = scipy.sparse.csr_matrix(
+        (data, indices, indptr), shape=(engine.bins, engine.size), copy=False
+    )
+    return matrix, np.array(engine.bin_centers), engine.empty
+
+
+def get_integration_engine(
+    calibration_params,
+    image_shape,
+    azimuth_range=None,
+    q_range=None,
+    npt=number_of_integration_points,
+):
+    """Return a ready CSR integration engine for the geometry and integration ranges.
+
+    The engine holds the CSR lookup table, so calling ``engine.integrate_ng(image)``
+    on a cached engine skips the table construction entirely.
+    """
+    key = _get_engine_key(calibration_params, image_shape, azimuth_range, q_range, npt)
+    return _engines.get_or_create(
+        key,
+        lambda: _build_integration_engine(
+            calibration_params, image_shape, azimuth_range, q_range, npt
+        ),
+    )
+
+
+def get_integration_matrix(
+    calibration_params,
+    image_shape,
+    azimuth_range=None,
+    q_range=None,
+    npt=number_of_integration_points,
+):
+    """Return the CSR lookup table of the engine as a scipy sparse matrix.
+
+    The matrix has shape (npt, number of pixels) and shares its buffers with the
+    cached engine. Returns the matrix, the q bin centers and the engine's value
+    for empty bins.
+    """
+    key = (
+        "csr_matrix",
+        _get_engine_key(calibration_params, image_shape, azimuth_range, q_range, npt),
+    )
+
+    return _engines.get_or_create(
+        key,
+        lambda: _get_engine_matrix(
+            get_integration_engine(
+                calibration_params, image_shape, azimuth_range, q_range, npt
+            )
+        ),
+    )
+
+
+def get_multi_sector_matrix(
+    calibration_params, image_shape, sectors, npt=number_of_integration_points
+):
+    """Return the CSR lookup tables of several sectors stacked into one matrix.
+
+    sectors is a sequence of (azimuth_range, q_range) pairs. The matrix has shape
+    (len(sectors) * npt, number of pixels), so one sparse product integrates a
+    frame over every sector. Returns the matrix, the q bin centers of shape
+    (len(sectors), npt) and the value for empty bins. The per-sector engines are
+    only built for the stacking, they are not cached.
+    """
+    sectors = tuple(
+        (_as_range_key(azimuth_range), _as_range_key(q_range))
+        for azimuth_range, q_range in sectors
+    )
+    key = (
+        "multi_sector_csr_matrix",
+        get_geometry_key(calibration_params),
+        tuple(image_shape),
+        sectors,
+        int(npt),
+    )
+
+    def build_matrix():
+        matrices, q_bins = [], []
+        for azimuth_range, q_range in sectors:
+            matrix, q, empty = _get_engine_matrix(
+                _build_integration_engine(
+                    calibration_params, image_shape, azimuth_range, q_range, npt
+                )
+            )
+            matrices.append(matrix)
+            q_bins.append(q)
+        # vstack copies the tables, the sector engines can be freed
+        stacked = scipy.sparse.vstack(matrices, format="csr")
+        return stacked, np.stack(q_bins), empty
+
+    return _sector_matrices.get_or_create(key, build_matrix)
+
+
+def get_cake_matrix(
+    calibration_params,
+    image_shape,
+    npt_rad=number_of_integration_points,
+    npt_azim=number_of_azimuthal_points,
+):
+    """Return the CSR lookup table of the 2D (q, chi) integration as a sparse matrix.
+
+    Rows are the cake bins, radial-major (row = q bin * npt_azim + chi bin).
+    Returns the matrix, the q bin centers, the chi bin centers (degrees) and the
+    engine's value for empty bins.
+    """
+    key = (
+        "cake_csr_matrix",
+        get_geometry_key(calibration_params),
+        tuple(image_shape),
+        int(npt_rad),
+        int(npt_azim),
+    )
+
+    def build_matrix():
+        with _locked_integrator(calibration_params) as ai:
+            # The lookup table only depends on the geometry, not on the pixel values
+            res = ai.integrate2d_ng(
+                np.zeros(image_shape, dtype=np.float32),
+                npt_rad,
+                npt_azim,
+                method=method,
+            )
+            engine = ai.engines[res.method].engine
+        data, indices, indptr = engine.lut
+        matrix = scipy.sparse.csr_matrix(
+            (data, indices, indptr),
+            shape=(npt_rad * npt_azim, engine.size),
+            copy=False,
+        )
+        return matrix, np.array(res.radial), np.array(res.azimuthal), engine.empty
+
+    return _cake_matrices.get_or_create(key, build_matrix)
+
+
+def _read_only(array):
+    array.setflags(write=False)
+    return array
+
+
+def get_q_chi_arrays(calibration_params, image_shape):
+    """Return the (q, chi) value of every pixel, chi in radians"""
+    key = ("q_chi", get_geometry_key(calibration_params), tuple(image_shape))
+
+    def build_maps():
+        with _locked_integrator(calibration_params) as ai:
+            q_array = np.array(ai.qArray(image_shape))
+            chi_array = np.array(ai.chiArray(image_shape))
+        return _read_only(q_array), _read_only(chi_array)
+
+    return _maps.get_or_create(key, build_maps)
+
+
+def get_q_xy_arrays(calibration_params, image_shape, unit_qx, unit_qy):
+    """Return the (q_x, q_y) value of every pixel in the given units"""
+    key = (
+        "q_xy",
+        get_geometry_key(calibration_params),
+        tuple(image_shape),
+        unit_qx,
+        unit_qy,
+    )
+
+    def build_maps():
+        with _locked_integrator(calibration_params) as ai:
+            q_x = np.array(ai.array_from_unit(shape=image_shape, unit=unit_qx))
+            q_y = np.array(ai.array_from_unit(shape=image_shape, unit=unit_qy))
+        return _read_only(q_x), _read_only(q_y)
+
+    return _maps.get_or_create(key, build_maps)
+
+
+def clear_integrator_cache():
+    _integrators.clear()
+    _engines.clear()
+    _maps.clear()
+    _sector_matrices.clear()
+    _cake_matrices.clear()
@@ -0,0 +1,120 @@
+import numpy as np
+from scipy.ndimage import map_coordinates
+
+# Spacing in pixels between samples across the band of an inclined linecut
+INCLINED_WIDTH_STEP = 0.5
+
+
+def _band_limits(position, width, size):
+    """First and last (exclusive) pixel index of a band of width pixels"""
+    half_width = max(width, 0.0) / 2
+    start = max(int(np.floor(position - half_width)), 0)
+    stop = min(int(np.ceil(position + half_width)) + 1, size)
+    if start >= stop:
+        raise IndexError(f"Linecut position {position} outside of [0, {size})")
+    return start, stop
+
+
+def _nan_mean(values, axis):
+    """Mean over axis ignoring NaN pixels, NaN where no pixel is valid"""
+    valid = np.isfinite(values)
+    total = np.where(valid, values, 0.0).sum(axis=axis, dtype=np.float64)
+    count = valid.sum(axis=axis)
+
+    mean = np.full(total.shape, np.nan, dtype=np.float32)
+    np.divide(total, count, out=mean, where=count > 0, casting="unsafe")
+    return mean
+
+
+def horizontal_linecut(image, row, width=0.0):
+    """Intensity along x averaged over the rows of a band centered on row"""
+    start, stop = _band_limits(row, width, image.shape[0])
+    return _nan_mean(image[start:stop, :], axis=0)
+
+
+def vertical_linecut(image, column, width=0.0):
+    """Intensity along y averaged over the columns of a band centered on column"""
+    start, stop = _band_limits(column, width, image.shape[1])
+    return _nan_mean(image[:, start:stop], axis=1)
+
+
+def get_inclined_linecut_samples(image_shape, center_x, center_y, angle, width=0.0):
+    """Sample coordinates of an inclined linecut through (center_x, center_y).
+
+    The line is clipped to the image, angle is in degrees counter-clockwise from
+    the x axis (y points downward in image coordinates).
+
+    Returns:
+        Tuple (x, y, t) where x and y have shape (points, band samples) and t is
+        the signed distance in pixels of every point from the center
+    """
+    height, width_pixels = image_shape
+    angle_rad = np.radians(angle)
+    dir_x = np.cos(angle_rad)
+    dir_y = -np.sin(angle_rad)
+
+    # Parametric range [t_min, t_max] of the line inside the image
+    t_min, t_max = -np.inf, np.inf
+    for direction, center, size in (
+        (dir_x, center_x, width_pixels),
+        (dir_y, center_y, height),
+    ):
+        if abs(direction) < 1e-12:
+            if not 0 <= center <= size - 1:
+                raise IndexError("Linecut does not cross the image")
+            continue
+        t_low = -center / direction
+        t_high = (size - 1 - center) / direction
+        t_min = max(t_min, min(t_low, t_high))
+        t_max = min(t_max, max(t_low, t_high))
+
+    if t_min > t_max:
+        raise IndexError("Linecut does not cross the image")
+
+    num_points = max(int(np.ceil(t_max - t_min)), 1)
+    t = np.linspace(t_min, t_max, num_points, endpoint=False)
+
+    half_width = max(width, 0.0) / 2
+    offsets = np.arange(-half_width, half_width + 1e-9, INCLINED_WIDTH_STEP)
+
+    # Perpendicular direction of the band
+    x = center_x + t[:, None] * dir_x + offsets[None, :] * -dir_y
+    y = center_y + t[:, None] * dir_y + offsets[None, :] * dir_x
+    return x, y, t
+
+
+def sample_image(image, x, y):
+    """Bilinear interpolation of a NaN-masked image at (x, y), NaN-aware.
+
+    NaN pixels and samples outside of the image carry no weight.
+    """
+    valid = np.isfinite(image)
+    signal = np.where(valid, image, 0.0).astype(np.float32)
+    coordinates = np.stack([y.ravel(), x.ravel()])
+
+    sampled_signal = map_coordinates(
+        signal, coordinates, order=1, mode="constant", cval=0.0
+    )
+    sampled_weight = map_coordinates(
+        valid.astype(np.float32), coordinates, order=1, mode="constant", cval=0.0
+    )
+
+    values = np.full(sampled_signal.shape, np.nan, dtype=np.float32)
+    np.divide(sampled_signal, sampled_weight, out=values, where=sampled_weight > 0)
+    return values.reshape(x.shape), sampled_weight.reshape(x.shape)
+
+
+def inclined_linecut(image, x, y):
+    """Intensity along an inclined linecut averaged across its band.
+
+    Args:
+        image: Processed frame, masked pixels set to NaN
+        x, y: Sample coordinates from get_inclined_linecut_samples
+    """
+    values, weights = sample_image(image, x, y)
+    weighted = np.where(weights > 0, values * weights, 0.0).sum(axis=1)
+    total_weight = weights.sum(axis=1)
+
+    intensity = np.full(total_weight.shape, np.nan, dtype=np.float32)
+    np.divide(weighted, total_weight, out=intensity, where=total_weight > 0)
+    return intensity
@@ -0,0 +1,151 @@
+import os
+import threading
+import time
+
+import h5py
+import numpy as np
+from PIL import Image
+
+# Seconds between two checks of the data folder for new or removed frames, can
+# be overridden with the LOCAL_CATALOG_POLL_INTERVAL environment variable
+DEFAULT_LOCAL_CATALOG_POLL_INTERVAL = 2.0
+
+
+def load_mask_file(mask_path):
+    """Read a detector mask stored as .hdf, .tiff or .npy"""
+    if os.path.exists(mask_path):
+        # mask_detector = np.load(mask_path)
+        if mask_path.endswith(".hdf"):
+            with h5py.File(mask_path, "r") as f:
+                # Explore the file to see what datasets it contains
+                keys_list = list(f.keys())
+                # Assuming the mask data is stored under a dataset name 'mask'
+                mask_detector = f[keys_list[0]][:]
+        elif mask_path.endswith(".tiff"):
+            # Using PIL to open the tiff image
+            tiff_image = Image.open(mask_path)
+            mask_detector = np.array(tiff_image)
+        elif mask_path.endswith(".npy"):
+            mask_detector = np.load(mask_path)
+    else:
+        raise FileNotFoundError(f"Mask file not found at: {mask_path}")
+
+    return mask_detector
+
+
+class LocalCatalog:
+    """Incrementally maintained index of the frames of a local data folder.
+
+    The folder is only listed again (with os.scandir) when its modification time
+    changes, and checked at most every poll_interval seconds, so large folders
+    are not listed per request. Frames are sorted by name, giving a stable
+    ordering. The mask is decoded again only when its file changes.
+    """
+
+    def __init__(
+        self, data_local_path, data_files_type, mask_file_name, poll_interval=None
+    ):
+        self.data_local_path = data_local_path
+        self.data_files_type = data_files_type
+        self.mask_file_name = mask_file_name
+        self.poll_interval = float(
+            poll_interval
+            if poll_interval is not None
+            else os.getenv(
+                "LOCAL_CATALOG_POLL_INTERVAL", DEFAULT_LOCAL_CATALOG_POLL_INTERVAL
+            )
+        )
+
+        # Incremented whenever the frames or the mask change
+        self.version = 0
+
+        self.files_names = []
+        self._files_stats = {}
+        self._folder_mtime = None
+        self._last_poll = None
+
+        self._mask = None
+        self._mask_stat = None
+
+        self._lock = threading.RLock()
+
+    def _scan_folder(self):
+        files_stats = {}
+        with os.scandir(self.data_local_path) as entries:
+            for entry in entries:
+                if (
+                    entry.name.endswith(self.data_files_type)
+                    and entry.name != self.mask_file_name
+                    and entry.is_file()
+                ):
+                    stat = entry.stat()
+                    files_stats[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        return files_stats
+
+    def _refresh_mask(self):
+        mask_path = os.path.join(self.data_local_path, self.mask_file_name)
+        try:
+            stat = os.stat(mask_path)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Mask file not found at: {mask_path}")
+
+        mask_stat = (stat.st_mtime_ns, stat.st_size)
+        if mask_stat == self._mask_stat:
+            return False
+
+        self._mask = load_mask_file(mask_path)
+        self._mask_stat = mask_stat
+        return True
+
+    def refresh(self, force=False):
+        """Check the folder and mask for changes (rate-limited unless forced).
+
+        Returns:
+            True if the frames or the mask changed
+        """
+        with self._lock:
+            now = time.monotonic()
+            if (
+                not force
+                and self._last_poll is not None
+                and now - self._last_poll < self.poll_interval
+            ):
+                return False
+            self._last_poll = now
+
+            changed = self._refresh_mask()
+
+            # Adding, removing or renaming a file changes the folder mtime
+            folder_mtime = os.stat(self.data_local_path).st_mtime_ns
+            if folder_mtime != self._folder_mtime:
+                files_stats = self._scan_folder()
+                self._folder_mtime = folder_mtime
+                if files_stats.keys() != self._files_stats.keys():
+                    self.files_names = sorted(files_stats)
+                    changed = True
+                self._files_stats = files_stats
+
+            if changed:
+                self.version += 1
+            return changed
+
+    def get_files_names_and_mask(self):
+        """Current frame names (sorted), decoded mask and catalog version"""
+        with self._lock:
+            self.refresh(force=self._last_poll is None)
+            return list(self.files_names), self._mask, self.version
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_local_catalog(data_local_path, data_files_type, mask_file_name):
+    """Return the process-wide catalog of a local data folder"""
+    key = (os.path.abspath(data_local_path), data_files_type, mask_file_name)
+    with _catalogs_lock:
+        if key not in _catalogs:
+            _catalogs[key] = LocalCatalog(
+                data_local_path, data_files_type, mask_file_name
+            )
+        return _catalogs[key]
@@ -0,0 +1,72 @@
+import glob
+import hashlib
+import os
+import tempfile
+
+import fabio
+import numpy as np
+
+# Folder of the EDF frames transcoded to memory-mappable .npy files, can be
+# overridden with the LOCAL_FRAME_CACHE_DIR environment variable (set it empty
+# to decode the EDF files on every read instead)
+DEFAULT_LOCAL_FRAME_CACHE_DIR = "./local_frame_cache"
+
+
+def get_local_frame_cache_dir():
+    return os.getenv("LOCAL_FRAME_CACHE_DIR", DEFAULT_LOCAL_FRAME_CACHE_DIR)
+
+
+def _get_transcoded_path(cache_dir, image_path, stat):
+    # One file per source path, versioned by the source modification time and size
+    path_hash = hashlib.sha1(os.path.abspath(image_path).encode()).hexdigest()[:16]
+    prefix = os.path.join(cache_dir, f"{os.path.basename(image_path)}.{path_hash}")
+    return prefix, f"{prefix}.{stat.st_mtime_ns}.{stat.st_size}.npy"
+
+
+def _transcode_edf(image_path, transcoded_path, prefix):
+    """Decode an EDF frame once and store it as .npy next to the other versions"""
+    image_array = fabio.open(image_path).data
+
+    # Written to a temporary file first so readers never see a partial file
+    file_descriptor, temporary_path = tempfile.mkstemp(
+        dir=os.path.dirname(transcoded_path), suffix=".tmp"
+    )
+    try:
+        with os.fdopen(file_descriptor, "wb") as f:
+            np.save(f, np.ascontiguousarray(image_array), allow_pickle=False)
+        os.replace(temporary_path, transcoded_path)
+    except BaseException:
+        os.unlink(temporary_path)
+        raise
+
+    # Older versions of the same frame are not needed anymore
+    for stale_path in glob.glob(glob.escape(prefix) + ".*.npy"):
+        if stale_path != transcoded_path:
+            try:
+                os.unlink(stale_path)
+            except OSError:
+                pass
+
+
+def read_local_frame(image_path):
+    """Read a local frame as a read-only memory-mapped array.
+
+    .npy frames are mapped directly (pickles are refused). EDF frames are
+    decoded with fabio once and transcoded to a .npy file in the local frame
+    cache, later reads map that file, so only the touched pages are loaded.
+    """
+    if not image_path.endswith(".edf"):
+        return np.load(image_path, mmap_mode="r", allow_pickle=False)
+
+    cache_dir = get_local_frame_cache_dir()
+    if not cache_dir:
+        return fabio.open(image_path).data
+
+    os.makedirs(cache_dir, exist_ok=True)
+    prefix, transcoded_path = _get_transcoded_path(
+        cache_dir, image_path, os.stat(image_path)
+    )
+    if not os.path.exists(transcoded_path):
+        _transcode_edf(image_path, transcoded_path, prefix)
+
+    return np.load(transcoded_path, mmap_mode="r", allow_pickle=False)
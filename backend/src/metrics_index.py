@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+# On-disk index of per-frame overview metrics, can be overridden with the
+# METRICS_INDEX_PATH environment variable
+DEFAULT_METRICS_INDEX_PATH = "./metrics_index.sqlite"
+
+
+def get_mask_fingerprint(mask_detector):
+    """Short hash of the detector mask, metrics depend on the mask they were computed with"""
+    mask = np.ascontiguousarray(mask_detector)
+    digest = hashlib.sha1(mask.tobytes())
+    digest.update(str((mask.dtype.str, mask.shape)).encode())
+    return digest.hexdigest()[:16]
+
+
+def get_frame_fingerprint(
+    image_uri,
+    mask_fingerprint,
+    data_local_path,
+    DEV_MODE,
+    node_fingerprint=None,
+    frame_version=None,
+):
+    """Version of a frame's content, metrics are recomputed when it changes.
+
+    Local files are versioned by modification time and size. Frames served by
+    Tiled are versioned by their array ETag (frame_version, see
+    TiledFrameVersions) and the fingerprint of their node in the crawled
+    catalog (its structure).
+    """
+    if DEV_MODE:
+        stat = os.stat(os.path.join(data_local_path, image_uri))
+        return f"{mask_fingerprint}:{stat.st_mtime_ns}:{stat.st_size}"
+    return f"{mask_fingerprint}:{node_fingerprint}:{frame_version}"
+
+
+def get_fingerprint_frame_version(fingerprint, mask_fingerprint, node_fingerprint):
+    """frame_version of a Tiled frame fingerprint, None if the mask or node differ"""
+    prefix = f"{mask_fingerprint}:{node_fingerprint}:"
+    if fingerprint is None or not fingerprint.startswith(prefix):
+        return None
+    return fingerprint[len(prefix) :]
+
+
+class MetricsIndex:
+    """SQLite table of per-frame metrics keyed by dataset and frame URI"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+        with self._connect() as connection:
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS frame_metrics (
+                    dataset TEXT NOT NULL,
+                    frame_uri TEXT NOT NULL,
+                    fingerprint TEXT NOT NULL,
+                    metrics TEXT NOT NULL,
+                    PRIMARY KEY (dataset, frame_uri)
+                )
+                """
+            )
+
+    @contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            # Commits on success, rolls back on error
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def get_dataset_metrics(self, dataset):
+        """Return {frame_uri: (fingerprint, metrics)} for every indexed frame of the dataset"""
+        with self._lock, self._connect() as connection:
+            rows = connection.execute(
+                "SELECT frame_uri, fingerprint, metrics FROM frame_metrics WHERE dataset = ?",
+                (dataset,),
+            ).fetchall()
+
+        return {
+            frame_uri: (fingerprint, json.loads(metrics))
+            for frame_uri, fingerprint, metrics in rows
+        }
+
+    def put_metrics(self, dataset, entries):
+        """Store a list of (frame_uri, fingerprint, metrics) in one transaction"""
+        if not entries:
+            return
+
+        with self._lock, self._connect() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO frame_metrics VALUES (?, ?, ?, ?)",
+                [
+                    (dataset, frame_uri, fingerprint, json.dumps(metrics))
+                    for frame_uri, fingerprint, metrics in entries
+                ],
+            )
+
+
+_metrics_index = None
+_metrics_index_lock = threading.Lock()
+
+
+def get_metrics_index():
+    """Return the process-wide metrics index, creating the database on first use"""
+    global _metrics_index
+
+    with _metrics_index_lock:
+        if _metrics_index is None:
+            _metrics_index = MetricsIndex(
+                os.getenv("METRICS_INDEX_PATH", DEFAULT_METRICS_INDEX_PATH)
+            )
+        return _metrics_index
@@ -0,0 +1,167 @@
+import hashlib
+import json
+
+import numpy as np
+from numba import njit
+from src.bounded_cache import BoundedLRUCache
+from src.integrator_cache import get_q_chi_arrays
+from src.preprocess_image import get_valid_pixels
+
+# Series the raw data overview can show, computed together in one pass
+OVERVIEW_METRICS = (
+    "max_intensity",
+    "avg_intensity",
+    "min_intensity",
+    "sum_intensity",
+    "std_intensity",
+    "valid_pixels",
+    "roi_intensity",
+)
+
+# Series of the original overview, sent when no selection is given
+DEFAULT_OVERVIEW_METRICS = ("max_intensity", "avg_intensity")
+
+# Flat indices of the unmasked pixels, and ROI pixel maps, of the last few
+# masks and ROIs
+_valid_indices = BoundedLRUCache(4)
+_roi_pixels = BoundedLRUCache(16)
+
+_no_roi = np.zeros(0, dtype=np.bool_)
+
+
+@njit(cache=True, nogil=True)
+def _reduce_kernel(image, valid_indices, roi_pixels):
+    # One sweep over the unmasked pixels, NaNs (negative or bad pixels) skipped
+    count = 0
+    total = 0.0
+    total_squares = 0.0
+    minimum = np.inf
+    maximum = -np.inf
+    roi_total = 0.0
+    use_roi = roi_pixels.size > 0
+
+    for i in valid_indices:
+        value = np.float64(image[i])
+        if np.isnan(value):
+            continue
+        count += 1
+        total += value
+        total_squares += value * value
+        if value < minimum:
+            minimum = value
+        if value > maximum:
+            maximum = value
+        if use_roi and roi_pixels[i]:
+            roi_total += value
+
+    return count, total, total_squares, minimum, maximum, roi_total
+
+
+def get_valid_indices(mask_detector):
+    """Flat indices of the pixels not excluded by the detector mask"""
+    entry = _valid_indices.get(id(mask_detector))
+    # The mask is kept in the entry, so its id cannot be reused by another array
+    if entry is not None and entry[0] is mask_detector:
+        return entry[1]
+
+    valid_indices = np.flatnonzero(get_valid_pixels(mask_detector))
+    _valid_indices.put(id(mask_detector), (mask_detector, valid_indices))
+    return valid_indices
+
+
+def make_roi_spec(roi=None, q_band=None, calibration_params=None):
+    """Region whose integrated intensity is reported as roi_intensity.
+
+    Args:
+        roi: Pixel rectangle (x_min, x_max, y_min, y_max), or None
+        q_band: q range (q_min, q_max) in nm^-1, or None
+        calibration_params: Geometry used to compute q, required with q_band
+
+    Returns:
+        JSON-serializable spec (the intersection of both regions), or None when
+        no region is given
+    """
+    if roi is None and q_band is None:
+        return None
+    if roi is not None and len(roi) != 4:
+        raise ValueError("roi must be x_min,x_max,y_min,y_max")
+    if q_band is not None and len(q_band) != 2:
+        raise ValueError("q_band must be q_min,q_max")
+    if q_band is not None and calibration_params is None:
+        raise ValueError("q_band needs the calibration parameters")
+
+    return {
+        "roi": [float(value) for value in roi] if roi is not None else None,
+        "q_band": [float(value) for value in q_band] if q_band is not None else None,
+        "calibration": dict(calibration_params) if q_band is not None else None,
+    }
+
+
+def get_roi_key(roi_spec):
+    """Short stable key of a ROI spec (metrics index column name)"""
+    encoded = json.dumps(roi_spec, sort_keys=True).encode()
+    return hashlib.sha1(encoded).hexdigest()[:12]
+
+
+def get_roi_pixels(roi_spec, image_shape):
+    """Flat boolean map of the pixels of the ROI spec"""
+
+    def build_map():
+        roi_pixels = np.ones(image_shape, dtype=np.bool_)
+
+        if roi_spec["roi"] is not None:
+            x_min, x_max, y_min, y_max = roi_spec["roi"]
+            in_rectangle = np.zeros(image_shape, dtype=np.bool_)
+            in_rectangle[
+                max(int(round(y_min)), 0) : max(int(round(y_max)) + 1, 0),
+                max(int(round(x_min)), 0) : max(int(round(x_max)) + 1, 0),
+            ] = True
+            roi_pixels &= in_rectangle
+
+        if roi_spec["q_band"] is not None:
+            q_min, q_max = roi_spec["q_band"]
+            q_array, _ = get_q_chi_arrays(roi_spec["calibration"], image_shape)
+            roi_pixels &= (q_array >= q_min) & (q_array <= q_max)
+
+        roi_pixels = roi_pixels.reshape(-1)
+        roi_pixels.flags.writeable = False
+        return roi_pixels
+
+    return _roi_pixels.get_or_create(
+        (get_roi_key(roi_spec), tuple(image_shape)), build_map
+    )
+
+
+def compute_overview_metrics(image_array, mask_detector, roi_spec=None):
+    """Every overview metric of a processed frame, in a single pass.
+
+    Only the unmasked pixels are visited. roi_intensity (the summed intensity
+    of the ROI spec's pixels) is only included when a ROI spec is given.
+    """
+    image_array = np.ascontiguousarray(image_array)
+    roi_pixels = (
+        _no_roi if roi_spec is None else get_roi_pixels(roi_spec, image_array.shape)
+    )
+
+    count, total, total_squares, minimum, maximum, roi_total = _reduce_kernel(
+        image_array.reshape(-1), get_valid_indices(mask_detector), roi_pixels
+    )
+
+    if count:
+        mean = total / count
+        std = float(np.sqrt(max(total_squares / count - mean**2, 0.0)))
+    else:
+        minimum = maximum = mean = std = float("nan")
+
+    metrics = {
+        "max_intensity": float(maximum),
+        "avg_intensity": float(mean),
+        "min_intensity": float(minimum),
+        "sum_intensity": float(total),
+        "std_intensity": std,
+        "valid_pixels": int(count),
+    }
+    if roi_spec is not None:
+        metrics["roi_intensity"] = float(roi_total)
+
+    return metrics
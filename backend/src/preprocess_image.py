@@ -1,25 +1,142 @@
+import os
+import threading
+from contextlib import contextmanager
+
 import numpy as np
+from numba import njit
+from src.bounded_cache import BoundedLRUCache
+
+# Free float32 frame buffers kept per frame shape, can be overridden with the
+# FRAME_BUFFER_POOL_SIZE environment variable
+DEFAULT_FRAME_BUFFER_POOL_SIZE = 32
+
+# Valid-pixel maps of the last few masks (one per session in practice)
+_valid_pixels = BoundedLRUCache(4)
+
+
+@njit(cache=True, nogil=True)
+def _preprocess_kernel(images, valid_pixels, out):
+    # Single pass over a (frames, pixels) stack: cast, then NaN out negatives,
+    # NaNs and masked pixels. out may be images itself.
+    for frame in range(images.shape[0]):
+        for i in range(images.shape[1]):
+            value = np.float32(images[frame, i])
+            if not valid_pixels[i] or value < 0.0 or np.isnan(value):
+                out[frame, i] = np.nan
+            else:
+                out[frame, i] = value
+
+
+def get_valid_pixels(mask_detector):
+    """Boolean map of the usable detector pixels, computed once per mask.
+
+    Original mask_detector has: 1 = masked area (beam stop etc), 0 = unmasked
+    area. The map is True where the inverted mask (1 - mask) is non-zero.
+    """
+    entry = _valid_pixels.get(id(mask_detector))
+    # The mask is kept in the entry, so its id cannot be reused by another array
+    if entry is not None and entry[0] is mask_detector:
+        return entry[1]
+
+    mask = np.asarray(mask_detector)
+    if mask.dtype == bool:
+        mask = mask.astype(np.uint8)
+    valid_pixels = np.ascontiguousarray((1 - mask) != 0)
+    valid_pixels.flags.writeable = False
+
+    _valid_pixels.put(id(mask_detector), (mask_detector, valid_pixels))
+    return valid_pixels
+
+
+def as_kernel_arrays(images, valid_pixels, out=None):
+    """(frames, pixels) views of images and of the float32 output buffer for
+    the numba kernels, and the output buffer itself (allocated if None).
+    """
+    images = np.ascontiguousarray(images)
+    if not images.dtype.isnative:
+        # e.g. big-endian Tiled arrays, the kernels only take native types
+        images = images.astype(images.dtype.newbyteorder("="), copy=False)
+    if out is None:
+        out = np.empty(images.shape, dtype=np.float32)
+    elif out.shape != images.shape or out.dtype != np.float32:
+        raise ValueError(
+            f"Output buffer must be float32 of shape {images.shape}, "
+            f"got {out.dtype} {out.shape}"
+        )
 
+    # The kernels write through the views, out must not be a copy
+    out_flat = out.reshape(-1, valid_pixels.size)
+    if not np.shares_memory(out_flat, out):
+        raise ValueError("Output buffer must be C-contiguous")
 
-def get_processed_image(image, mask_detector):
+    return images.reshape(-1, valid_pixels.size), out_flat, out
+
+
+def _apply_kernel(images, valid_pixels, out):
+    images_flat, out_flat, out = as_kernel_arrays(images, valid_pixels, out)
+    _preprocess_kernel(images_flat, valid_pixels.reshape(-1), out_flat)
+    return out
+
+
+def check_frame_shape(image, valid_pixels):
+    if np.shape(image) != valid_pixels.shape:
+        raise ValueError(
+            f"Image shape {np.shape(image)} does not match the mask shape "
+            f"{valid_pixels.shape}"
+        )
+
+
+def get_processed_image(image, mask_detector, out=None):
     """Process the image using the detector mask.
     Original mask_detector has: 1 = masked area (beam stop etc), 0 = unmasked area
-    We invert it so that: 0 = masked area, 1 = unmasked area
+    Pixels that are masked, negative or NaN are set to NaN in a float32 copy of
+    the image, written to out when given (e.g. a buffer from frame_buffers).
     """
-    # Convert image to float32 first
-    processed_image = image.copy().astype(np.float32)
+    valid_pixels = get_valid_pixels(mask_detector)
+    check_frame_shape(image, valid_pixels)
+    return _apply_kernel(image, valid_pixels, out)
+
+
+def get_processed_images(images, mask_detector, out=None):
+    """Batched get_processed_image for a stack of shape (n, height, width).
+
+    out may be images itself (float32), the stack is then processed in place.
+    """
+    valid_pixels = get_valid_pixels(mask_detector)
+    if np.shape(images)[1:] != valid_pixels.shape:
+        raise ValueError(
+            f"Frames shape {np.shape(images)[1:]} does not match the mask shape "
+            f"{valid_pixels.shape}"
+        )
+    return _apply_kernel(images, valid_pixels, out)
+
+
+class FrameBufferPool:
+    """Reusable float32 frame buffers, for frames that are reduced and dropped"""
+
+    def __init__(self, max_buffers_per_shape):
+        self.max_buffers_per_shape = max_buffers_per_shape
+        self._free = {}
+        self._lock = threading.Lock()
 
-    # Invert the mask first (1 - mask)
-    inverted_mask = 1 - mask_detector
+    @contextmanager
+    def buffer(self, shape):
+        """Yield a float32 buffer of the given shape, returned to the pool on exit"""
+        shape = tuple(shape)
+        with self._lock:
+            free = self._free.setdefault(shape, [])
+            buffer = free.pop() if free else None
+        if buffer is None:
+            buffer = np.empty(shape, dtype=np.float32)
 
-    # Create combined mask (True where we want to mask)
-    mask_neg = np.array(processed_image < 0.0)
-    mask_nan = np.isnan(processed_image)
-    mask = (
-        mask_nan | mask_neg | (inverted_mask == 0)
-    )  # Now looking for nans, negatives, and zeros in inverted mask
+        try:
+            yield buffer
+        finally:
+            with self._lock:
+                if len(self._free[shape]) < self.max_buffers_per_shape:
+                    self._free[shape].append(buffer)
 
-    # Apply mask by setting masked values to NaN
-    processed_image[mask] = np.nan  # 0
 
-    return processed_image
+frame_buffers = FrameBufferPool(
+    int(os.getenv("FRAME_BUFFER_POOL_SIZE", DEFAULT_FRAME_BUFFER_POOL_SIZE))
+)
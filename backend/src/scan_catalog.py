@@ -0,0 +1,118 @@
+import base64
+import bisect
+import sys
+
+import numpy as np
+from src.bounded_cache import BoundedLRUCache
+
+# Scans returned per page of /api/scans by default, and at most
+DEFAULT_SCANS_PAGE_LIMIT = 100
+MAX_SCANS_PAGE_LIMIT = 1000
+
+# Filtered index arrays kept per catalog (one per prefix/substring pair)
+_FILTER_CACHE_SIZE = 32
+
+
+class InvalidCursorError(ValueError):
+    """A pagination cursor that does not point to a scan of the catalog"""
+
+
+def encode_cursor(name):
+    return base64.urlsafe_b64encode(name.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        return base64.urlsafe_b64decode(cursor.encode()).decode()
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursorError(f"Invalid cursor: {cursor}")
+
+
+class ScanCatalog:
+    """Indexed, searchable view of the scan names of a dataset.
+
+    Scans keep the dataset ordering (their frame index). A dict gives the name to
+    index mapping in O(1), and a sorted copy of the names answers prefix
+    queries with a binary search. Filtered index arrays are cached, so paging
+    through a filter does not filter again.
+
+    Cursors hold the name of the last scan of a page, pages stay consistent
+    when scans are added before or after that one.
+    """
+
+    def __init__(self, names):
+        self.names = list(names)
+
+        self._name_to_index = {}
+        for index, name in enumerate(self.names):
+            self._name_to_index.setdefault(name, index)
+
+        order = sorted(range(len(self.names)), key=self.names.__getitem__)
+        self._sorted_names = [self.names[index] for index in order]
+        self._sorted_indices = np.asarray(order, dtype=np.int64)
+
+        self._filters = BoundedLRUCache(_FILTER_CACHE_SIZE)
+
+    def __len__(self):
+        return len(self.names)
+
+    def index_of(self, name):
+        """Index of a scan, None if unknown"""
+        return self._name_to_index.get(name)
+
+    def name_of(self, index):
+        """Name of the scan at index, None if out of range"""
+        return self.names[index] if 0 <= index < len(self.names) else None
+
+    def _prefix_indices(self, prefix):
+        # Names starting with prefix are contiguous in the sorted names, they sort
+        # before the prefix with its last character incremented
+        start = bisect.bisect_left(self._sorted_names, prefix)
+        if ord(prefix[-1]) < sys.maxunicode:
+            stop = bisect.bisect_left(
+                self._sorted_names, prefix[:-1] + chr(ord(prefix[-1]) + 1), lo=start
+            )
+        else:
+            stop = len(self._sorted_names)
+        return np.sort(self._sorted_indices[start:stop])
+
+    def filter_indices(self, prefix=None, contains=None):
+        """Sorted indices of the scans matching a prefix and/or substring"""
+
+        def build():
+            if prefix:
+                indices = self._prefix_indices(prefix)
+            else:
+                indices = np.arange(len(self.names), dtype=np.int64)
+            if contains:
+                indices = indices[
+                    [contains in self.names[index] for index in indices.tolist()]
+                ]
+            indices.flags.writeable = False
+            return indices
+
+        return self._filters.get_or_create((prefix or "", contains or ""), build)
+
+    def page(
+        self, cursor=None, limit=DEFAULT_SCANS_PAGE_LIMIT, prefix=None, contains=None
+    ):
+        """One page of the matching scans.
+
+        Returns:
+            (indices of the page, cursor of the next page or None, total matches)
+        """
+        indices = self.filter_indices(prefix, contains)
+
+        start = 0
+        if cursor:
+            last_index = self.index_of(decode_cursor(cursor))
+            if last_index is None:
+                raise InvalidCursorError(f"Invalid cursor: {cursor}")
+            start = int(np.searchsorted(indices, last_index, side="right"))
+
+        page_indices = indices[start : start + limit].tolist()
+        next_cursor = None
+        if start + limit < len(indices) and page_indices:
+            next_cursor = encode_cursor(self.names[page_indices[-1]])
+
+        return page_indices, next_cursor, len(indices)
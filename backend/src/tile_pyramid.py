@@ -0,0 +1,94 @@
+import os
+
+import numpy as np
+from src.bounded_cache import BoundedLRUCache
+
+# Size in pixels of the square tiles served to the browser
+DEFAULT_TILE_SIZE = 256
+
+# Number of frame pyramids kept in memory, a pyramid takes ~1/3 of its frame
+# (the full resolution level is the processed frame of the frame cache)
+DEFAULT_TILE_PYRAMID_CACHE_SIZE = 8
+
+_pyramids = BoundedLRUCache(
+    int(os.getenv("TILE_PYRAMID_CACHE_SIZE", DEFAULT_TILE_PYRAMID_CACHE_SIZE))
+)
+
+
+def nan_mean_pool(image):
+    """Downsample an image by 2 in both directions with a NaN-aware 2x2 mean.
+
+    NaN (masked) pixels are ignored, a block with only NaN pixels stays NaN.
+    Odd dimensions are padded with NaN so edge pixels are kept.
+    """
+    height, width = image.shape
+    padded = np.full((height + height % 2, width + width % 2), np.nan, dtype=np.float32)
+    padded[:height, :width] = image
+
+    blocks = padded.reshape(padded.shape[0] // 2, 2, padded.shape[1] // 2, 2)
+    valid = np.isfinite(blocks)
+
+    block_sum = np.where(valid, blocks, np.float32(0.0)).sum(axis=(1, 3))
+    block_count = valid.sum(axis=(1, 3))
+
+    pooled = np.full(block_sum.shape, np.nan, dtype=np.float32)
+    np.divide(block_sum, block_count, out=pooled, where=block_count > 0)
+    return pooled
+
+
+def build_tile_pyramid(frame, tile_size=DEFAULT_TILE_SIZE):
+    """Return the list of pyramid levels of a processed frame.
+
+    Level 0 is the full resolution frame, level n is downsampled by 2**n. Levels
+    are added until the whole frame fits in a single tile.
+    """
+    levels = [np.asarray(frame, dtype=np.float32)]
+    while max(levels[-1].shape) > tile_size:
+        levels.append(nan_mean_pool(levels[-1]))
+
+    for level in levels[1:]:
+        level.setflags(write=False)
+    return levels
+
+
+def get_tile_pyramid(frame_key, load_frame, tile_size=DEFAULT_TILE_SIZE):
+    """Return the pyramid of the frame returned by load_frame().
+
+    Level 0 is that frame (the processed frame cached within the frame cache
+    budget), only the downsampled levels are cached here. frame_key identifies
+    the frame version (its frame cache key), so pyramids of an edited file or of
+    a previous mask are never served.
+    """
+    frame = np.asarray(load_frame(), dtype=np.float32)
+    downsampled_levels = _pyramids.get_or_create(
+        (frame_key, tile_size),
+        lambda: build_tile_pyramid(frame, tile_size)[1:],
+    )
+    return [frame, *downsampled_levels]
+
+
+def get_pyramid_description(levels, tile_size=DEFAULT_TILE_SIZE):
+    """Shape, downsampling factor and tile grid of every pyramid level"""
+    return [
+        {
+            "level": index,
+            "factor": 2**index,
+            "shape": list(level.shape),
+            "tiles_x": -(-level.shape[1] // tile_size),
+            "tiles_y": -(-level.shape[0] // tile_size),
+        }
+        for index, level in enumerate(levels)
+    ]
+
+
+def get_tile(levels, level, x, y, tile_size=DEFAULT_TILE_SIZE):
+    """Return tile (x, y) of a pyramid level, edge tiles may be smaller"""
+    if not 0 <= level < len(levels):
+        raise IndexError(f"Level {level} out of range [0, {len(levels) - 1}]")
+
+    image = levels[level]
+    row_start, col_start = y * tile_size, x * tile_size
+    if not (0 <= row_start < image.shape[0] and 0 <= col_start < image.shape[1]):
+        raise IndexError(f"Tile ({x}, {y}) out of range for level {level}")
+
+    return image[row_start : row_start + tile_size, col_start : col_start + tile_size]
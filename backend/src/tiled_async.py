@@ -0,0 +1,89 @@
+import asyncio
+import os
+
+import httpx
+from src.tiled_frames import (
+    TiledFrameStructures,
+    get_frame_versions,
+    get_http_client_options,
+)
+
+# Requests in flight at once per dataset, can be overridden with the
+# TILED_MAX_CONCURRENCY environment variable
+DEFAULT_TILED_MAX_CONCURRENCY = 16
+
+
+class AsyncTiledClient:
+    """Asyncio access to the frames of one Tiled dataset.
+
+    Requests go through one pooled httpx.AsyncClient (keep-alive connections),
+    a semaphore bounds how many are in flight so a long overview cannot flood
+    the server or starve the other requests. Frames are resolved by key and
+    read from the array endpoint like in TiledDatasetClient.
+    """
+
+    def __init__(self, tiled_uri, api_key=None, max_concurrency=None):
+        max_concurrency = int(
+            max_concurrency
+            or os.getenv("TILED_MAX_CONCURRENCY", DEFAULT_TILED_MAX_CONCURRENCY)
+        )
+
+        self.frames = TiledFrameStructures(tiled_uri)
+        self.versions = get_frame_versions(tiled_uri)
+        self.http_client = httpx.AsyncClient(**get_http_client_options(api_key))
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _get(self, uri, **kwargs):
+        async with self._semaphore:
+            response = await self.http_client.get(uri, **kwargs)
+        response.raise_for_status()
+        return response
+
+    async def get_metadata(self, key):
+        """Attributes (structure, specs, metadata) of the child node at key"""
+        response = await self._get(self.frames.get_child_metadata_uri(key))
+        return response.json()["data"]["attributes"]
+
+    async def read_frame(self, key, fingerprint=None):
+        """Read the full array of the child node at key (see TiledDatasetClient)"""
+        response = await self._get(
+            self.frames.get_child_array_uri(key),
+            headers={"Accept": "application/octet-stream"},
+        )
+        self.versions.set(key, response.headers.get("ETag"))
+
+        image_array = self.frames.decode(
+            response.content, self.frames.get_cached_structure(key, fingerprint)
+        )
+        if image_array is None:
+            structure = (await self.get_metadata(key))["structure"]
+            self.frames.set_structure(key, structure)
+            image_array = self.frames.decode(response.content, structure)
+            if image_array is None:
+                raise ValueError(f"Frame {key} does not match its array structure")
+
+        return image_array
+
+    async def aclose(self):
+        await self.http_client.aclose()
+
+
+# Clients are bound to the event loop they were created in
+_clients = {}
+
+
+def get_async_tiled_client(tiled_uri, api_key=None):
+    """Return the shared async client of a Tiled dataset for the running event loop"""
+    loop = asyncio.get_running_loop()
+    client_loop, client = _clients.get((tiled_uri, api_key), (None, None))
+    if client is None or client_loop is not loop:
+        client = AsyncTiledClient(tiled_uri, api_key=api_key)
+        _clients[(tiled_uri, api_key)] = (loop, client)
+    return client
+
+
+async def close_async_tiled_clients():
+    """Close the connections of every async Tiled client (application shutdown)"""
+    while _clients:
+        _, (_, client) = _clients.popitem()
+        await client.aclose()
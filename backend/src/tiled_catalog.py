@@ -0,0 +1,281 @@
+import asyncio
+import json
+import os
+import threading
+import urllib.parse as urlparse
+
+import httpx
+from src.tiled_frames import (
+    get_endpoint_uri,
+    get_http_client_options,
+    get_structure_fingerprint,
+)
+
+# Containers listed at once while crawling, can be overridden with the
+# TILED_CRAWL_CONCURRENCY environment variable
+DEFAULT_TILED_CRAWL_CONCURRENCY = 8
+
+# Entries requested per page of a container listing
+TILED_PAGE_LIMIT = 300
+
+# On-disk copy of the crawled listings, so a restart only refreshes them. Can be
+# overridden with the TILED_CATALOG_CACHE_PATH environment variable (set it
+# empty to keep the listings in memory only).
+DEFAULT_TILED_CATALOG_CACHE_PATH = "./tiled_catalog_cache.json"
+
+# Bumped when the listings layout changes, older cached listings are crawled again
+TILED_CATALOG_CACHE_FORMAT = 3
+
+# Containers whose children are all scans (one per detector)
+DETECTOR_KEYS = ("lmbdp03", "embl_2m")
+
+# Specs of the nodes holding readable scans
+SCAN_SPECS = ("edf", "gb")
+
+
+def is_scan(specs):
+    return any(spec in SCAN_SPECS for spec in specs)
+
+
+def is_leaf_container(path):
+    """Whether the children of the container at path are never listed themselves.
+
+    Those are the containers under a top-level node (detector containers and
+    scan folders), they hold most of the catalog entries.
+    """
+    return path.count("/") == 1
+
+
+def get_scan_fingerprints(listings):
+    """Scan paths (relative to the base URI) from the crawled container listings.
+
+    Follows the layout of the catalog: top-level nodes that are not containers
+    are scans, and in top-level containers every child of a detector container
+    is a scan, as are the children with an edf or gb spec and their own children.
+
+    Returns:
+        {scan path: node fingerprint} in catalog order
+    """
+    scan_fingerprints = {}
+
+    for key, structure_family, _, fingerprint in listings.get("", []):
+        if structure_family != "container":
+            scan_fingerprints[key] = fingerprint
+            continue
+
+        for child_key, child_family, child_specs, child_fingerprint in listings.get(
+            key, []
+        ):
+            child_path = f"{key}/{child_key}"
+            if child_key in DETECTOR_KEYS:
+                scan_fingerprints.update(
+                    (f"{child_path}/{entry[0]}", entry[3])
+                    for entry in listings.get(child_path, [])
+                )
+                continue
+
+            # A readable scan container, its children are the frames
+            if is_scan(child_specs):
+                scan_fingerprints[child_path] = child_fingerprint
+                if child_family == "container":
+                    scan_fingerprints.update(
+                        (f"{child_path}/{entry[0]}", entry[3])
+                        for entry in listings.get(child_path, [])
+                    )
+
+    return scan_fingerprints
+
+
+def _get_fingerprint(attributes):
+    # Version of a node: the number of children of a container, a hash of the
+    # structure (shape, dtype, chunks) of other nodes, None when the server does
+    # not say
+    structure = attributes.get("structure")
+    if not isinstance(structure, dict):
+        return None
+    if attributes.get("structure_family") == "container":
+        return structure.get("count")
+    return get_structure_fingerprint(structure)
+
+
+class TiledCatalogCrawler:
+    """Concurrent breadth-first crawl of the scans of a Tiled catalog.
+
+    Each level of the tree is listed concurrently (bounded by a semaphore) with
+    the paginated search endpoint, which returns the specs of every child with
+    the listing instead of one request per child. A refresh requests every
+    page of the previous crawl with its ETag (a hash of the page content), the
+    server confirms unchanged pages with a 304 without body and only changed
+    pages are listed again.
+    """
+
+    def __init__(self, tiled_uri, api_key=None, max_concurrency=None):
+        self.metadata_uri = tiled_uri if tiled_uri.endswith("/") else tiled_uri + "/"
+        self.search_uri = get_endpoint_uri(self.metadata_uri, "search")
+        self.api_key = api_key
+        self.max_concurrency = int(
+            max_concurrency
+            or os.getenv("TILED_CRAWL_CONCURRENCY", DEFAULT_TILED_CRAWL_CONCURRENCY)
+        )
+
+    async def _list_container(self, http_client, semaphore, path, previous=None):
+        """Listing of path: children [key, structure_family, specs, fingerprint]
+        and the pages they were listed in, reusing the unchanged pages of the
+        previous listing"""
+        uri = self.search_uri + urlparse.quote(path, safe="/")
+        previous_pages = previous["pages"] if previous else []
+
+        children, pages = [], []
+        while True:
+            previous_page = (
+                previous_pages[len(pages)] if len(pages) < len(previous_pages) else None
+            )
+            headers = {}
+            if previous_page is not None and previous_page["etag"]:
+                headers["If-None-Match"] = previous_page["etag"]
+            params = {
+                "page[offset]": len(children),
+                "page[limit]": TILED_PAGE_LIMIT,
+                "fields": ["structure_family", "specs", "structure"],
+            }
+
+            async with semaphore:
+                response = await http_client.get(uri, params=params, headers=headers)
+
+            if response.status_code == 304:
+                start = previous_page["offset"]
+                entries = previous["children"][start : start + previous_page["size"]]
+                has_next = previous_page["has_next"]
+            else:
+                response.raise_for_status()
+                page = response.json()
+                entries = [
+                    [
+                        entry["id"],
+                        entry["attributes"].get("structure_family"),
+                        [
+                            spec["name"]
+                            for spec in entry["attributes"].get("specs") or []
+                        ],
+                        _get_fingerprint(entry["attributes"]),
+                    ]
+                    for entry in page["data"]
+                ]
+                has_next = bool((page.get("links") or {}).get("next"))
+
+            pages.append(
+                {
+                    "offset": len(children),
+                    "size": len(entries),
+                    "has_next": has_next,
+                    "etag": (
+                        previous_page["etag"]
+                        if response.status_code == 304
+                        else response.headers.get("ETag")
+                    ),
+                }
+            )
+            children.extend(entries)
+            if not has_next or not entries:
+                break
+
+        return {"children": children, "pages": pages}
+
+    async def crawl(self, previous_listings=None):
+        """Return the listings {container path: listing} of the catalog"""
+        previous_listings = previous_listings or {}
+        listings = {}
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async with httpx.AsyncClient(
+            **get_http_client_options(self.api_key)
+        ) as http_client:
+            # One level of the tree at a time, every container of a level at once
+            level = [""]
+            while level:
+                results = await asyncio.gather(
+                    *[
+                        self._list_container(
+                            http_client, semaphore, path, previous_listings.get(path)
+                        )
+                        for path in level
+                    ]
+                )
+
+                next_level = []
+                for path, listing in zip(level, results):
+                    listings[path] = listing
+                    if path and is_leaf_container(path):
+                        continue
+                    for key, structure_family, _, _ in listing["children"]:
+                        if structure_family == "container":
+                            next_level.append(f"{path}/{key}" if path else key)
+                level = next_level
+
+        return listings
+
+
+_listings = {}
+_listings_lock = threading.Lock()
+
+
+def _get_cache_path():
+    return os.getenv("TILED_CATALOG_CACHE_PATH", DEFAULT_TILED_CATALOG_CACHE_PATH)
+
+
+def _load_cached_listings(tiled_uri):
+    cache_path = _get_cache_path()
+    if not cache_path or not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path) as f:
+            cached = json.load(f).get(tiled_uri)
+    except (OSError, ValueError):
+        return None
+    if (
+        not isinstance(cached, dict)
+        or cached.get("format") != TILED_CATALOG_CACHE_FORMAT
+    ):
+        return None
+    return cached["listings"]
+
+
+def _save_cached_listings(tiled_uri, listings):
+    cache_path = _get_cache_path()
+    if not cache_path:
+        return
+    try:
+        with open(cache_path) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        cached = {}
+    cached[tiled_uri] = {"format": TILED_CATALOG_CACHE_FORMAT, "listings": listings}
+
+    # Replaced atomically, a crash never leaves a truncated cache
+    temporary_path = f"{cache_path}.tmp"
+    with open(temporary_path, "w") as f:
+        json.dump(cached, f)
+    os.replace(temporary_path, cache_path)
+
+
+def crawl_scan_fingerprints(tiled_uri, api_key=None):
+    """{scan path: fingerprint} of the catalog at tiled_uri, refreshed from the last crawl.
+
+    Listings are cached per base URI (in memory and on disk), only the pages
+    the server reports changed are listed again. Must not be called from a
+    running event loop.
+    """
+    with _listings_lock:
+        previous_listings = _listings.get(tiled_uri)
+        if previous_listings is None:
+            previous_listings = _load_cached_listings(tiled_uri)
+
+        crawler = TiledCatalogCrawler(tiled_uri, api_key=api_key)
+        listings = asyncio.run(crawler.crawl(previous_listings))
+
+        _listings[tiled_uri] = listings
+        _save_cached_listings(tiled_uri, listings)
+
+    return get_scan_fingerprints(
+        {path: listing["children"] for path, listing in listings.items()}
+    )
@@ -0,0 +1,253 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import urllib.parse as urlparse
+from functools import lru_cache
+
+import httpx
+import numpy as np
+
+# Connections kept open to the Tiled server per dataset. Can be overridden with
+# the TILED_MAX_CONNECTIONS environment variable.
+DEFAULT_TILED_MAX_CONNECTIONS = 32
+
+# Seconds before a Tiled request is abandoned (TILED_TIMEOUT)
+DEFAULT_TILED_TIMEOUT = 60.0
+
+# Seconds a frame version checked with the server is trusted before it is
+# checked again (TILED_FRAME_VERSION_MAX_AGE)
+DEFAULT_TILED_FRAME_VERSION_MAX_AGE = 5.0
+
+# Byte order characters of the Tiled data_type endianness
+_byte_orders = {"little": "<", "big": ">", "not_applicable": "|"}
+
+
+def get_endpoint_uri(metadata_uri, endpoint):
+    """Another endpoint (e.g. "array/full") of the node at a metadata URI"""
+    if "/api/v1/metadata/" not in metadata_uri:
+        raise ValueError(f"Not a Tiled metadata URI: {metadata_uri}")
+    return metadata_uri.replace("/api/v1/metadata/", f"/api/v1/{endpoint}/", 1)
+
+
+def get_array_uri(metadata_uri):
+    """Array data endpoint of the node at a metadata URI (.../api/v1/metadata/...)"""
+    return get_endpoint_uri(metadata_uri, "array/full")
+
+
+def get_array_dtype(structure):
+    """NumPy dtype of a Tiled array structure"""
+    data_type = structure["data_type"]
+    return np.dtype(
+        f"{_byte_orders[data_type['endianness']]}"
+        f"{data_type['kind']}{data_type['itemsize']}"
+    )
+
+
+def get_structure_fingerprint(structure):
+    """Short hash of a Tiled structure (shape, data type, chunks)"""
+    digest = hashlib.sha1(json.dumps(structure, sort_keys=True).encode())
+    return digest.hexdigest()[:16]
+
+
+def get_http_client_options(api_key=None):
+    """Keyword arguments of the pooled, authenticated httpx clients"""
+    max_connections = int(
+        os.getenv("TILED_MAX_CONNECTIONS", DEFAULT_TILED_MAX_CONNECTIONS)
+    )
+    return {
+        "headers": {"Authorization": f"Apikey {api_key}"} if api_key else {},
+        "limits": httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+        ),
+        "timeout": float(os.getenv("TILED_TIMEOUT", DEFAULT_TILED_TIMEOUT)),
+        "follow_redirects": True,
+    }
+
+
+class TiledFrameStructures:
+    """Frame URIs and array structures of one Tiled dataset.
+
+    Frames of a scan share their shape and data type, so the structure is
+    fetched once per scan (parent node) and frames are read with a single
+    request to the array endpoint. The cached structure is only used for a frame
+    whose node fingerprint (from the catalog crawl) matches it, or whose size
+    matches it when the fingerprint is unknown. Other frames have their own
+    metadata fetched instead.
+    """
+
+    def __init__(self, tiled_uri):
+        self.metadata_uri = tiled_uri if tiled_uri.endswith("/") else tiled_uri + "/"
+        self.array_uri = get_array_uri(self.metadata_uri)
+        self._structures = {}
+        self._lock = threading.Lock()
+
+    def get_child_metadata_uri(self, key):
+        return self.metadata_uri + urlparse.quote(key.strip("/"), safe="/")
+
+    def get_child_array_uri(self, key):
+        return self.array_uri + urlparse.quote(key.strip("/"), safe="/")
+
+    @staticmethod
+    def _get_parent(key):
+        return key.strip("/").rpartition("/")[0]
+
+    def get_cached_structure(self, key, fingerprint=None):
+        """Cached structure of the scan of key, None if it is not the node's"""
+        with self._lock:
+            structure, structure_fingerprint = self._structures.get(
+                self._get_parent(key), (None, None)
+            )
+        if fingerprint is not None and fingerprint != structure_fingerprint:
+            return None
+        return structure
+
+    def set_structure(self, key, structure):
+        fingerprint = get_structure_fingerprint(structure)
+        with self._lock:
+            self._structures[self._get_parent(key)] = (structure, fingerprint)
+
+    @staticmethod
+    def decode(content, structure):
+        """Array of the raw bytes of a frame, None if they do not fit the structure"""
+        if structure is None:
+            return None
+        dtype = get_array_dtype(structure)
+        if len(content) != int(np.prod(structure["shape"])) * dtype.itemsize:
+            return None
+        return np.frombuffer(content, dtype=dtype).reshape(structure["shape"])
+
+
+class TiledFrameVersions:
+    """Content versions (array ETags) of the frames of one Tiled dataset.
+
+    Tiled derives the ETag of an array from its content (for HDF5 data, the
+    file path and modification time), so a frame rewritten in place gets a new
+    version even when its structure does not change. Versions are recorded by
+    every frame read, and checked again with a conditional request (a 304
+    without body when unchanged) once older than the max age. "" is the version
+    of frames the server sends no ETag for.
+    """
+
+    def __init__(self):
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, max_age=None):
+        """Recorded version of the frame at key, None if unknown or older than max_age"""
+        with self._lock:
+            version, checked_at = self._versions.get(key.strip("/"), (None, None))
+        if version is None or (
+            max_age is not None and time.monotonic() - checked_at > max_age
+        ):
+            return None
+        return version
+
+    def set(self, key, version):
+        with self._lock:
+            self._versions[key.strip("/")] = (version or "", time.monotonic())
+
+
+@lru_cache(maxsize=8)
+def get_frame_versions(tiled_uri):
+    """Versions of the frames of a Tiled dataset, shared by its sync and async clients"""
+    return TiledFrameVersions()
+
+
+def get_frame_version_max_age():
+    return float(
+        os.getenv("TILED_FRAME_VERSION_MAX_AGE", DEFAULT_TILED_FRAME_VERSION_MAX_AGE)
+    )
+
+
+class TiledDatasetClient:
+    """Pooled, authenticated access to the frames of one Tiled dataset.
+
+    One keep-alive httpx client is shared by every frame read (thread-safe).
+    Frames are resolved by key relative to the dataset URI, instead of building
+    a new Tiled client per frame URI.
+    """
+
+    def __init__(self, tiled_uri, api_key=None):
+        self.frames = TiledFrameStructures(tiled_uri)
+        self.versions = get_frame_versions(tiled_uri)
+        self.http_client = httpx.Client(**get_http_client_options(api_key))
+
+    def _get(self, uri, **kwargs):
+        response = self.http_client.get(uri, **kwargs)
+        response.raise_for_status()
+        return response
+
+    def get_metadata(self, key):
+        """Attributes (structure, specs, metadata) of the child node at key"""
+        response = self._get(self.frames.get_child_metadata_uri(key))
+        return response.json()["data"]["attributes"]
+
+    def read_frame(self, key, fingerprint=None):
+        """Read the full array of the child node at key.
+
+        fingerprint is the node fingerprint from the catalog crawl, frames whose
+        node has another structure than the cached one fetch their own.
+        """
+        response = self._get(
+            self.frames.get_child_array_uri(key),
+            headers={"Accept": "application/octet-stream"},
+        )
+        self.versions.set(key, response.headers.get("ETag"))
+
+        image_array = self.frames.decode(
+            response.content, self.frames.get_cached_structure(key, fingerprint)
+        )
+        if image_array is None:
+            structure = self.get_metadata(key)["structure"]
+            self.frames.set_structure(key, structure)
+            image_array = self.frames.decode(response.content, structure)
+            if image_array is None:
+                raise ValueError(f"Frame {key} does not match its array structure")
+
+        return image_array
+
+    def get_frame_version(self, key, known_version=None, revalidate=True):
+        """Current version of the frame at key, None if it is not known.
+
+        The recorded version is returned as is when it was checked recently (or
+        revalidate is False), and checked again with a conditional request
+        otherwise. known_version (e.g. stored with an overview metrics entry) is
+        checked when no version is recorded. Frames never read and without
+        known version are not requested, their version is None.
+        """
+        max_age = get_frame_version_max_age() if revalidate else None
+        version = self.versions.get(key, max_age)
+        if version is not None:
+            return version
+
+        known_version = self.versions.get(key) or known_version
+        if known_version is None:
+            return None
+
+        headers = {"Accept": "application/octet-stream"}
+        if known_version:
+            headers["If-None-Match"] = known_version
+        # Only the headers are read, a changed frame is downloaded when it is
+        # read
+        with self.http_client.stream(
+            "GET", self.frames.get_child_array_uri(key), headers=headers
+        ) as response:
+            if response.status_code == 304:
+                version = known_version
+            else:
+                response.raise_for_status()
+                version = response.headers.get("ETag")
+        self.versions.set(key, version)
+        return version
+
+    def close(self):
+        self.http_client.close()
+
+
+@lru_cache(maxsize=8)
+def get_tiled_dataset_client(tiled_uri, api_key=None):
+    """Return the shared client of a Tiled dataset (one per URI and API key)"""
+    return TiledDatasetClient(tiled_uri, api_key=api_key)
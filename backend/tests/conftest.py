@@ -0,0 +1,203 @@
+import hashlib
+import json
+import os
+import sys
+
+import httpx
+import msgpack
+import numpy as np
+import pytest
+
+# Modules are imported as in the app (from src.x import y), from the backend folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def calibration_params():
+    # Small detector with the beam center inside it, full azimuth coverage
+    return {
+        "sample_detector_distance": 274.83,
+        "beam_center_x": 40.0,
+        "beam_center_y": 30.0,
+        "pixel_size_x": 172.0,
+        "pixel_size_y": 172.0,
+        "wavelength": 1.2398,
+        "tilt": 0.0,
+        "tilt_plan_rotation": 0.0,
+    }
+
+
+@pytest.fixture
+def frames():
+    # Radially decaying frames with noise and masked (NaN) pixels
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:64, 0:96]
+    radius = np.hypot(x - 40.0, y - 30.0)
+    frames = []
+    for scale in (1.0, 3.0):
+        frame = scale * 1000.0 / (1.0 + radius) + rng.normal(0.0, 1.0, radius.shape)
+        frame[rng.random(radius.shape) < 0.02] = np.nan
+        frames.append(frame.astype(np.float32))
+    return np.stack(frames)
+
+
+class FakeTiledServer:
+    """Minimal Tiled server (search, metadata and array endpoints) for httpx.
+
+    Nodes are {path: array or None (container)}. Listings and arrays carry an
+    ETag and answer a matching If-None-Match with a 304, like Tiled.
+    """
+
+    base_uri = "http://tiled/api/v1/metadata/raw/"
+
+    def __init__(self, nodes, page_limit=2):
+        self.nodes = dict(nodes)
+        self.page_limit = page_limit
+        self.requests = []
+
+    def transport(self):
+        return httpx.MockTransport(self.handle)
+
+    def _children(self, path):
+        prefix = f"{path}/" if path else ""
+        return sorted(
+            {
+                key[len(prefix) :].split("/")[0]
+                for key in self.nodes
+                if key.startswith(prefix) and key != path
+            }
+        )
+
+    def _attributes(self, path):
+        array = self.nodes.get(path)
+        if array is None:
+            return {
+                "structure_family": "container",
+                "specs": [],
+                "structure": {"count": len(self._children(path))},
+            }
+        return {
+            "structure_family": "array",
+            "specs": [{"name": "edf", "version": None}],
+            "structure": {
+                "shape": list(array.shape),
+                "chunks": [[size] for size in array.shape],
+                "data_type": {
+                    "endianness": "little",
+                    "kind": array.dtype.kind,
+                    "itemsize": array.dtype.itemsize,
+                },
+            },
+        }
+
+    def _respond(self, request, content, etag):
+        # Requests are recorded as (path, If-None-Match, status)
+        if_none_match = request.headers.get("If-None-Match")
+        status = 304 if etag is not None and if_none_match == etag else 200
+        self.requests.append((request.url.path, if_none_match, status))
+        headers = {"ETag": etag} if etag is not None else {}
+        if status == 304:
+            return httpx.Response(304, headers=headers)
+        return httpx.Response(200, content=content, headers=headers)
+
+    def handle(self, request):
+        _, _, endpoint = request.url.path.partition("/api/v1/")
+        endpoint, _, path = endpoint.partition("/raw")
+        path = path.strip("/")
+
+        if endpoint == "search":
+            offset = int(request.url.params["page[offset]"])
+            keys = self._children(path)
+            page = keys[offset : offset + self.page_limit]
+            has_next = offset + self.page_limit < len(keys)
+            body = json.dumps(
+                {
+                    "data": [
+                        {
+                            "id": key,
+                            "attributes": self._attributes(
+                                f"{path}/{key}" if path else key
+                            ),
+                        }
+                        for key in page
+                    ],
+                    "links": {"next": "next" if has_next else None},
+                    "meta": {"count": len(keys)},
+                }
+            ).encode()
+            return self._respond(request, body, hashlib.md5(body).hexdigest())
+
+        if endpoint == "metadata":
+            body = json.dumps({"data": {"attributes": self._attributes(path)}})
+            return self._respond(request, body.encode(), None)
+
+        if endpoint == "array/full":
+            content = np.ascontiguousarray(self.nodes[path]).tobytes()
+            return self._respond(request, content, hashlib.md5(content).hexdigest())
+
+        return httpx.Response(404)
+
+
+@pytest.fixture
+def tiled_server():
+    # Scans of a detector container, plus one top-level scan
+    rng = np.random.default_rng(2)
+    nodes = {
+        f"exp1/lmbdp03/frame_{i}": rng.random((8, 12)).astype(np.float32)
+        for i in range(5)
+    }
+    nodes["top_frame"] = rng.random((8, 12)).astype(np.float32)
+    return FakeTiledServer(nodes)
+
+
+@pytest.fixture
+def dev_frames():
+    # Frames of the local dataset served by the client fixture, the detector
+    # matches calibration_params
+    y, x = np.mgrid[0:64, 0:96]
+    radius = np.hypot(x - 40.0, y - 30.0)
+    return np.stack(
+        [(scale * 1000.0 / (1.0 + radius)).astype(np.float32) for scale in (1, 2, 3, 4)]
+    )
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch, dev_frames):
+    """TestClient of the app on a local dataset (DEV mode) of .npy frames"""
+    import src.dataset_session as dataset_session
+    import src.metrics_index as metrics_index
+    from fastapi.testclient import TestClient
+
+    data_path = tmp_path / "data"
+    data_path.mkdir()
+    for index, frame in enumerate(dev_frames):
+        np.save(data_path / f"scan_{index:04d}.npy", frame)
+    mask = np.zeros(dev_frames.shape[1:], dtype=np.uint8)
+    mask[:2, :] = 1
+    np.save(data_path / "mask.npy", mask)
+
+    monkeypatch.setattr(dataset_session, "DEV_MODE", True)
+    monkeypatch.setattr(dataset_session, "data_local_path", str(data_path))
+    monkeypatch.setattr(dataset_session, "data_files_type", ".npy")
+    monkeypatch.setattr(dataset_session, "local_mask_file_name", "mask.npy")
+    monkeypatch.setattr(
+        metrics_index,
+        "_metrics_index",
+        metrics_index.MetricsIndex(str(tmp_path / "metrics_index.sqlite")),
+    )
+    monkeypatch.setenv("TILED_URI_IMAGES", "http://tiled/api/v1/metadata/raw/")
+    monkeypatch.setenv("TILED_URI_MASK", "http://tiled/api/v1/metadata/raw/mask")
+    monkeypatch.setenv("TILED_API_KEY_IMAGES", "key")
+
+    import main
+
+    dataset_session.invalidate_dataset_session()
+    with TestClient(main.app) as test_client:
+        yield test_client
+    dataset_session.invalidate_dataset_session()
+
+
+def unpack(response):
+    """Body of a msgpack response"""
+    assert response.status_code == 200, response.text
+    return msgpack.unpackb(response.content, raw=False)
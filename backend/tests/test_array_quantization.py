@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from src.array_quantization import dequantize_array, quantize_arrays
+
+
+@pytest.mark.parametrize("dtype", ["uint8", "uint16"])
+@pytest.mark.parametrize("scaling", ["linear", "log"])
+def test_round_trip_within_half_a_level(frames, dtype, scaling):
+    encoded = quantize_arrays(frames, dtype=dtype, scaling=scaling)
+
+    for frame, encoded_frame in zip(frames, encoded):
+        values = dequantize_array(encoded_frame)
+        scaled = frame
+        if scaling == "log":
+            min_positive = frame[frame > 0].min()
+            scaled = np.where(
+                frame > 0,
+                np.log10(np.where(frame > 0, frame, 1)),
+                np.where(frame < 0, np.log10(min_positive), 0),
+            )
+
+        np.testing.assert_array_equal(np.isnan(values), np.isnan(frame))
+        valid = ~np.isnan(frame)
+        scale = encoded_frame["quantization"]["scale"]
+        error = np.abs(values[valid] - scaled[valid])
+        assert error.max() <= scale / 2 * (1 + 1e-3) + 1e-6
+
+
+def test_frames_share_scale_and_offset(frames):
+    encoded = quantize_arrays(frames, dtype="uint8")
+
+    quantizations = [encoded_frame["quantization"] for encoded_frame in encoded]
+    assert len({(q["scale"], q["offset"]) for q in quantizations}) == 1
+    # The brighter frame reaches the top level, the offset is the overall minimum
+    assert dequantize_array(encoded[1])[~np.isnan(frames[1])].max() == pytest.approx(
+        np.nanmax(frames), rel=1e-3
+    )
+
+
+def test_float16_keeps_relative_precision(frames):
+    (encoded,) = quantize_arrays(frames[:1], dtype="float16")
+
+    values = dequantize_array(encoded)
+    valid = ~np.isnan(frames[0])
+    np.testing.assert_allclose(values[valid], frames[0][valid], rtol=1e-3, atol=1e-3)
+
+
+def test_unknown_dtype_is_rejected(frames):
+    with pytest.raises(ValueError):
+        quantize_arrays(frames, dtype="int32")
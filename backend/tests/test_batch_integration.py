@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+from src.batch_integration import integrate_frames_batch
+from src.integrator_cache import get_integration_engine, get_integration_matrix
+
+NPT = 100
+
+
+@pytest.mark.parametrize(
+    "azimuth_range, q_range", [(None, None), ((0.0, 90.0), None), (None, (0.5, 3.0))]
+)
+def test_batch_matches_engine(calibration_params, frames, azimuth_range, q_range):
+    shape = frames.shape[1:]
+    engine = get_integration_engine(
+        calibration_params, shape, azimuth_range, q_range, npt=NPT
+    )
+    matrix, q, empty = get_integration_matrix(
+        calibration_params, shape, azimuth_range, q_range, npt=NPT
+    )
+
+    intensities = integrate_frames_batch(matrix, frames, empty)
+
+    assert intensities.shape == (len(frames), NPT)
+    for frame, intensity in zip(frames, intensities):
+        result = engine.integrate_ng(frame)
+        np.testing.assert_allclose(q, result.position)
+        np.testing.assert_allclose(intensity, result.intensity, rtol=1e-5, atol=1e-4)
@@ -0,0 +1,74 @@
+import threading
+
+from src.bounded_cache import BoundedLRUCache
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = BoundedLRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+
+def test_concurrent_misses_of_a_key_build_once():
+    cache = BoundedLRUCache(4)
+    builds = []
+    building = threading.Event()
+    release = threading.Event()
+
+    def factory():
+        builds.append(1)
+        building.set()
+        release.wait(5)
+        return "value"
+
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(cache.get_or_create("k", factory))
+        )
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    building.wait(5)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert builds == [1]
+    assert results == ["value"] * 4
+
+
+def test_builds_of_other_keys_are_not_serialized():
+    cache = BoundedLRUCache(4)
+    release = threading.Event()
+
+    def slow_factory():
+        release.wait(5)
+        return "slow"
+
+    slow = threading.Thread(target=lambda: cache.get_or_create("slow", slow_factory))
+    slow.start()
+    try:
+        # Built while the slow build is still running
+        assert cache.get_or_create("fast", lambda: "fast") == "fast"
+        assert cache.get("slow") is None
+    finally:
+        release.set()
+        slow.join(5)
+    assert cache.get("slow") == "slow"
+
+
+def test_factories_may_build_other_entries():
+    cache = BoundedLRUCache(4)
+
+    def outer():
+        return cache.get_or_create("inner", lambda: 1) + 1
+
+    assert cache.get_or_create("outer", outer) == 2
+    assert cache.get("inner") == 1
@@ -0,0 +1,100 @@
+from urllib.parse import urlencode
+
+import numpy as np
+import pytest
+from conftest import unpack
+from src.array_codec import decode_array
+from src.cake_integration import get_frame_cake
+from src.frame_prefetch import frame_prefetcher
+from src.integrator_cache import get_integration_engine, number_of_integration_points
+
+NPT = 100
+
+
+def _relative_error(cake_intensity, intensity):
+    valid = intensity != 0
+    return np.abs(cake_intensity[valid] / intensity[valid] - 1)
+
+
+@pytest.mark.parametrize(
+    "azimuth_range, q_range",
+    [(None, (0.2, 4.0)), ((0.0, 90.0), (0.5, 3.0)), ((10.5, 47.3), (0.5, 3.0))],
+)
+def test_cake_slice_matches_integration(
+    calibration_params, frames, azimuth_range, q_range
+):
+    frame = frames[0]
+    engine = get_integration_engine(
+        calibration_params, frame.shape, azimuth_range, q_range, npt=NPT
+    )
+    result = engine.integrate_ng(frame)
+
+    cake = get_frame_cake(("test", azimuth_range, q_range), frame, calibration_params)
+    q, intensity = cake.slice(azimuth_range, q_range, npt=NPT)
+
+    assert len(q) == NPT
+    np.testing.assert_allclose(q, result.position, rtol=1e-4)
+    # Cake bins cut by the range edges are assumed uniform, see FrameCake
+    assert np.median(_relative_error(intensity, result.intensity)) < 0.01
+
+
+def test_cake_slice_of_flat_frame_is_flat(calibration_params):
+    frame = np.full((64, 96), 5.0, dtype=np.float32)
+    cake = get_frame_cake(("test", "flat"), frame, calibration_params)
+
+    _, intensity = cake.slice((10.5, 47.3), (0.5, 3.0), npt=NPT)
+
+    filled = intensity != cake.empty
+    assert filled.any()
+    np.testing.assert_allclose(intensity[filled], 5.0, rtol=1e-5)
+
+
+def test_cake_slice_rejects_inverted_ranges(calibration_params, frames):
+    cake = get_frame_cake(("test", "ranges"), frames[0], calibration_params)
+    with pytest.raises(ValueError):
+        cake.slice((90.0, 0.0))
+    with pytest.raises(ValueError):
+        cake.slice(None, (3.0, 0.5))
+
+
+def test_cake_route(client, dev_frames, calibration_params, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("prefetch scheduled")
+
+    # Slider requests only load the displayed frames
+    monkeypatch.setattr(frame_prefetcher, "schedule", fail)
+    query = urlencode(
+        {
+            **calibration_params,
+            "azimuth_range_deg": "10.5,47.3",
+            "q_range": "0.5,3.0",
+            "include_maps": "true",
+        }
+    )
+    data = unpack(client.get(f"/api/azimuthal-integrator/cake?{query}"))
+
+    frame = dev_frames[0].copy()
+    frame[:2] = np.nan
+    cake = get_frame_cake(("expected",), frame, calibration_params)
+    q, intensity = cake.slice(
+        (10.5, 47.3), (0.5, 3.0), npt=number_of_integration_points
+    )
+    np.testing.assert_allclose(decode_array(data["q_1"]), q, rtol=1e-6)
+    np.testing.assert_allclose(decode_array(data["intensity_1"]), intensity, rtol=1e-5)
+
+    q_array = decode_array(data["q_array_filtered_1"])
+    assert q_array.shape == frame.shape
+    assert np.isnan(q_array).any() and not np.isnan(q_array).all()
+
+
+def test_cake_route_rejects_invalid_ranges(client, calibration_params):
+    query = urlencode(calibration_params)
+    for ranges in ("azimuth_range_deg=90,0", "q_range=3,0.5", "q_range=a"):
+        response = client.get(f"/api/azimuthal-integrator/cake?{query}&{ranges}")
+        assert response.status_code == 400
+    assert (
+        client.get(
+            f"/api/azimuthal-integrator/cake?{query}&left_image_index=9"
+        ).status_code
+        == 404
+    )
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+from conftest import unpack
+from src.array_codec import decode_array
+from src.comparison_arrays import compute_comparison, get_frames_range
+
+
+def test_comparisons_skip_nan_pixels(frames):
+    image_1, image_2 = frames
+    image_2 = image_2.copy()
+    image_2[0, :3] = 0.0
+
+    difference, (low, high) = compute_comparison(image_1, image_2, "difference")
+    expected = image_1 - image_2
+    np.testing.assert_array_equal(difference, expected)
+    assert (low, high) == (np.nanmin(expected), np.nanmax(expected))
+
+    # Pixels divided by 0 keep the value of the first frame
+    ratio, _ = compute_comparison(image_1, image_2, "ratio")
+    expected = np.where(
+        image_2 == 0, image_1, image_1 / np.where(image_2 == 0, 1, image_2)
+    )
+    np.testing.assert_allclose(ratio, expected, rtol=1e-6)
+
+
+def test_invalid_comparisons_are_rejected(frames):
+    with pytest.raises(ValueError):
+        compute_comparison(frames[0], frames[1], "sum")
+    with pytest.raises(ValueError):
+        compute_comparison(frames[0], frames[1][:, 1:], "difference")
+
+
+def test_frames_without_pixels_have_an_empty_range():
+    empty = np.full((4, 4), np.nan, dtype=np.float32)
+    assert get_frames_range(empty, empty) == (0.0, 0.0)
+    assert compute_comparison(empty, empty)[1] == (0.0, 0.0)
+
+
+@pytest.mark.parametrize("comparison, factor", [("difference", 2.0), ("ratio", 3.0)])
+def test_scatter_subplot_route_returns_the_comparison(
+    client, dev_frames, comparison, factor
+):
+    data = unpack(
+        client.get(
+            "/api/scatter-subplot",
+            params={"left_image_index": 2, "comparison": comparison},
+        )
+    )
+
+    # DEV mode compares with the first frame, masked rows are NaN
+    comparison_array = decode_array(data["comparison_array"])
+    assert data["comparison"] == comparison
+    assert np.isnan(comparison_array[:2]).all()
+    expected = dev_frames[0][2:] * factor if comparison == "difference" else factor
+    np.testing.assert_allclose(comparison_array[2:], expected, rtol=1e-5)
+    assert data["comparison_range"] == pytest.approx(
+        [np.nanmin(comparison_array), np.nanmax(comparison_array)]
+    )
+
+
+def test_scatter_subplot_route_rejects_unknown_comparisons(client):
+    response = client.get("/api/scatter-subplot", params={"comparison": "sum"})
+    assert response.status_code == 400
@@ -0,0 +1,129 @@
+import os
+
+import httpx
+import numpy as np
+import pytest
+import src.dataset_session as dataset_session
+import src.get_single_image_array_and_name as single_image
+from src.dataset_session import DatasetSession
+from src.tiled_frames import TiledDatasetClient, get_frame_versions
+
+SCAN = "scan_0001.npy"
+
+
+@pytest.fixture
+def data_path(tmp_path, frames):
+    np.save(tmp_path / SCAN, frames[0])
+    return tmp_path
+
+
+@pytest.fixture
+def mask(frames):
+    return np.zeros(frames.shape[1:], dtype=np.uint8)
+
+
+def _local_session(data_path, mask):
+    return DatasetSession([SCAN], mask, None, str(data_path), DEV_MODE=True)
+
+
+def _touch(path):
+    # A later modification time, as when the file is rewritten
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_frame_key_changes_with_the_file(data_path, mask):
+    session = _local_session(data_path, mask)
+    key = session.get_frame_cache_key(SCAN)
+
+    assert session.get_frame_cache_key(SCAN) == key
+    _touch(data_path / SCAN)
+    assert session.get_frame_cache_key(SCAN) != key
+
+
+def test_frame_key_changes_with_the_mask(data_path, mask):
+    key = _local_session(data_path, mask).get_frame_cache_key(SCAN)
+
+    new_mask = mask.copy()
+    new_mask[0, 0] = 1
+    assert _local_session(data_path, new_mask).get_frame_cache_key(SCAN) != key
+
+
+def test_missing_file_has_no_key(data_path, mask):
+    session = _local_session(data_path, mask)
+    os.remove(data_path / SCAN)
+
+    assert session.get_frame_cache_key(SCAN)[2] is None
+
+
+@pytest.fixture
+def tiled_session(tiled_server, monkeypatch):
+    get_frame_versions.cache_clear()
+    client = TiledDatasetClient(tiled_server.base_uri)
+    client.http_client = httpx.Client(transport=tiled_server.transport())
+    for module in (dataset_session, single_image):
+        monkeypatch.setattr(
+            module, "get_tiled_dataset_client", lambda *args, **kwargs: client
+        )
+
+    uris = [key for key in tiled_server.nodes if key.startswith("exp1")]
+    return DatasetSession(
+        uris,
+        np.zeros((8, 12), dtype=np.uint8),
+        tiled_server.base_uri,
+        None,
+        DEV_MODE=False,
+        scan_fingerprints={uri: "node" for uri in uris},
+    )
+
+
+def test_tiled_frame_key_follows_its_content(tiled_session, tiled_server, monkeypatch):
+    uri = tiled_session.all_files_uris[0]
+
+    # Unknown until read, nothing is cached under an unknown version
+    assert tiled_session.get_frame_cache_key(uri)[2] is None
+    key = tiled_session.get_loaded_frame_cache_key(uri)
+    assert key[2] is not None
+    frame = tiled_session.get_processed_frame(uri)
+
+    # Rewritten in place, seen once the version is checked again
+    tiled_server.nodes[uri] = tiled_server.nodes[uri] + 1
+    assert tiled_session.get_frame_cache_key(uri) == key
+    monkeypatch.setenv("TILED_FRAME_VERSION_MAX_AGE", "0")
+    assert tiled_session.get_frame_cache_key(uri) != key
+    np.testing.assert_allclose(tiled_session.get_processed_frame(uri), frame + 1)
+
+
+def test_tiled_fingerprint_from_a_previous_run(tiled_session, tiled_server):
+    uri = tiled_session.all_files_uris[0]
+    fingerprint = tiled_session.get_loaded_frame_cache_key(uri)[2]
+    get_frame_versions.cache_clear()
+    client = dataset_session.get_tiled_dataset_client()
+    client.versions = get_frame_versions(tiled_server.base_uri)
+
+    # A fresh process confirms the stored fingerprint with a 304
+    tiled_server.requests.clear()
+    assert tiled_session.get_frame_fingerprint(uri, fingerprint) == fingerprint
+    assert [status for _, _, status in tiled_server.requests] == [304]
+
+
+@pytest.mark.parametrize(
+    "path",
+    [
+        "/api/frame-stats?frames=0",
+        "/api/tiles/0",
+        "/api/tiles/0/0/0/0",
+        "/api/linecuts/horizontal?linecut=10&width=1",
+        "/api/azimuthal-integrator/cake",
+        "/api/azimuthal-integrator/series",
+        "/api/raw-data-overview",
+        "/api/scans",
+    ],
+)
+def test_routes_report_configuration_errors(client, monkeypatch, path):
+    monkeypatch.delenv("TILED_URI_IMAGES")
+    dataset_session.invalidate_dataset_session()
+
+    response = client.get(path)
+    assert response.status_code == 500
+    assert response.json()["detail"] == "Environment variables not set correctly"
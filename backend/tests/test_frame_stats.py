@@ -0,0 +1,126 @@
+import numpy as np
+import pytest
+from conftest import unpack
+from src.array_codec import decode_array
+from src.frame_stats import (
+    SKETCH_MANTISSA_BITS,
+    compute_frame_stats,
+    get_frame_stats,
+    get_processed_image_and_stats,
+    query_percentiles,
+)
+from src.preprocess_image import get_processed_image
+
+PERCENTILES = [0, 0.5, 1, 5, 25, 50, 75, 95, 99, 99.5, 100]
+
+
+@pytest.fixture
+def integer_frames():
+    # Photon counting frames: mostly small counts, a few hot pixels
+    rng = np.random.default_rng(1)
+    frames = [rng.poisson(lam, size=(64, 96)).astype(np.int32) for lam in (0.5, 3, 20)]
+    frames[2][0, :5] = 1_000_000
+    return frames
+
+
+def test_integer_percentiles_match_numpy(integer_frames):
+    stats = [compute_frame_stats(frame) for frame in integer_frames]
+
+    np.testing.assert_allclose(
+        query_percentiles(stats, PERCENTILES),
+        np.percentile(np.concatenate([f.ravel() for f in integer_frames]), PERCENTILES),
+    )
+
+
+def test_integer_positive_percentiles_match_numpy(integer_frames):
+    stats = [compute_frame_stats(frame) for frame in integer_frames]
+    pixels = np.concatenate([f.ravel() for f in integer_frames])
+
+    np.testing.assert_allclose(
+        query_percentiles(stats, PERCENTILES, positive=True),
+        np.percentile(pixels[pixels > 0], PERCENTILES),
+    )
+
+
+def test_float_percentiles_close_to_numpy(frames):
+    stats = [compute_frame_stats(frame) for frame in frames]
+    pixels = frames[~np.isnan(frames)]
+
+    # Within a sketch bin of the exact values
+    np.testing.assert_allclose(
+        query_percentiles(stats, PERCENTILES),
+        np.percentile(pixels, PERCENTILES),
+        rtol=2.0**-SKETCH_MANTISSA_BITS,
+    )
+
+
+def test_stats_are_computed_in_the_preprocessing_pass(frames):
+    image = frames[0].copy()
+    image[:4, :4] = -1
+    mask = np.zeros(image.shape, dtype=np.uint8)
+    mask[10:20, 30:40] = 1
+
+    processed, stats = get_processed_image_and_stats(image, mask)
+    np.testing.assert_array_equal(processed, get_processed_image(image, mask))
+
+    pixels = processed[~np.isnan(processed)].astype(np.float64)
+    assert stats["count"] == pixels.size
+    assert stats["min"] == pixels.min() and stats["max"] == pixels.max()
+    assert stats["min_positive"] == pixels[pixels > 0].min()
+    np.testing.assert_allclose(stats["mean"], pixels.mean())
+    np.testing.assert_allclose(stats["std"], pixels.std())
+    assert stats["histogram_counts"].sum() == pixels.size
+
+
+def test_frames_without_pixels_give_nan():
+    stats = compute_frame_stats(np.full((4, 4), np.nan, dtype=np.float32))
+
+    assert np.isnan(query_percentiles([stats], [1, 99])).all()
+
+
+def test_stats_are_cached_per_frame_version(frames):
+    loads = []
+
+    def load_frame(version):
+        loads.append(version)
+        return frames[version]
+
+    stats = get_frame_stats(("dataset", "scan", "v0"), lambda: load_frame(0))
+    assert get_frame_stats(("dataset", "scan", "v0"), lambda: load_frame(0)) is stats
+
+    new_stats = get_frame_stats(("dataset", "scan", "v1"), lambda: load_frame(1))
+    assert loads == [0, 1]
+    assert new_stats["max"] != stats["max"]
+
+
+def test_frame_stats_route(client, dev_frames):
+    data = unpack(
+        client.get(
+            "/api/frame-stats",
+            params={"frames": "0,3", "percentiles": "0,50,100", "log_scale": True},
+        )
+    )
+
+    # Rows 0-1 are masked by the dataset mask
+    pixels = dev_frames[[0, 3], 2:].ravel()
+    assert data["count"] == pixels.size
+    assert data["min"] == pytest.approx(pixels.min())
+    assert data["max"] == pytest.approx(pixels.max())
+    np.testing.assert_allclose(
+        decode_array(data["values"]),
+        np.percentile(pixels, [0, 50, 100]),
+        rtol=2.0**-SKETCH_MANTISSA_BITS,
+    )
+    np.testing.assert_allclose(
+        decode_array(data["log_values"])[[0, 2]],
+        np.log10([pixels.min(), pixels.max()]),
+        atol=np.log10(1 + 2.0**-SKETCH_MANTISSA_BITS),
+    )
+    assert len(data["per_frame"]) == 2
+
+
+def test_frame_stats_route_rejects_invalid_requests(client):
+    assert client.get("/api/frame-stats", params={"frames": ""}).status_code == 400
+    response = client.get("/api/frame-stats", params={"percentiles": "101"})
+    assert response.status_code == 400
+    assert client.get("/api/frame-stats", params={"frames": "4"}).status_code == 404
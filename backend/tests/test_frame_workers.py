@@ -0,0 +1,127 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+import numpy as np
+import pytest
+import src.frame_workers as frame_workers
+from conftest import unpack
+from src.array_codec import decode_array
+from src.batch_integration import integrate_frames_batch
+from src.dataset_session import DatasetSession
+from src.frame_workers import FrameWorkerPool, frame_worker_pool
+from src.integrator_cache import get_integration_matrix
+
+
+@pytest.fixture
+def session(tmp_path, dev_frames):
+    uris = []
+    for index, frame in enumerate(dev_frames):
+        uris.append(f"scan_{index:04d}.npy")
+        np.save(tmp_path / uris[-1], frame)
+    mask = np.zeros(dev_frames.shape[1:], dtype=np.uint8)
+    return DatasetSession(uris, mask, None, str(tmp_path), DEV_MODE=True)
+
+
+def test_replaced_pool_finishes_the_work_in_flight(session, monkeypatch):
+    monkeypatch.setattr(frame_workers, "_pool", None)
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_task():
+        started.set()
+        release.wait(5)
+        return "done"
+
+    with frame_worker_pool(session) as old_pool:
+        future = old_pool.executor.submit(slow_task)
+        queued = old_pool.executor.submit(lambda: "queued")
+        started.wait(5)
+
+        # A new session replaces the pool while this request still uses it
+        new_session = DatasetSession(
+            session.all_files_uris,
+            session.mask_detector,
+            None,
+            session.data_local_path,
+            DEV_MODE=True,
+        )
+        with frame_worker_pool(new_session) as new_pool:
+            assert new_pool is not old_pool
+        release.set()
+
+        assert future.result(5) == "done"
+        assert queued.result(5) == "queued"
+        # Still usable until the request ends
+        assert old_pool.executor.submit(lambda: 1).result(5) == 1
+
+    with pytest.raises(RuntimeError):
+        old_pool.executor.submit(lambda: 1)
+    frame_workers._pool.shutdown()
+
+
+def test_async_metrics_run_in_the_pool(session, monkeypatch):
+    pool = FrameWorkerPool(session, backend="thread", max_workers=1)
+    pool.executor = ThreadPoolExecutor(1, thread_name_prefix="frame-worker")
+    threads = []
+    compute = frame_workers.compute_overview_metrics
+
+    def recording_compute(*args, **kwargs):
+        threads.append(threading.current_thread().name)
+        return compute(*args, **kwargs)
+
+    monkeypatch.setattr(frame_workers, "compute_overview_metrics", recording_compute)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        return await asyncio.gather(
+            *[
+                pool.submit_frame_metrics(index, uri, loop)
+                for index, uri in enumerate(session.all_files_uris)
+            ]
+        )
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        pool.shutdown()
+
+    assert all(result[3] for result in results)
+    assert len(threads) == len(session.all_files_uris)
+    assert all(name.startswith("frame-worker") for name in threads)
+
+
+def test_load_frames_stacks_processed_frames(session, dev_frames):
+    pool = FrameWorkerPool(session, backend="thread", max_workers=2)
+    uris = session.all_files_uris + ["missing.npy"]
+    try:
+        with pool.load_frames(uris) as (stack, success):
+            np.testing.assert_array_equal(stack[:-1], dev_frames)
+            assert np.isnan(stack[-1]).all()
+            assert success == [True] * len(dev_frames) + [False]
+    finally:
+        pool.shutdown()
+
+
+def test_series_route(client, dev_frames, calibration_params):
+    query = urlencode({**calibration_params, "start_index": 1, "batch_size": 2})
+    data = unpack(client.get(f"/api/azimuthal-integrator/series?{query}"))
+
+    frames = dev_frames[1:].copy()
+    frames[:, :2] = np.nan
+    matrix, q, empty = get_integration_matrix(calibration_params, frames.shape[1:])
+    np.testing.assert_allclose(
+        decode_array(data["intensities"]),
+        integrate_frames_batch(matrix, frames, empty),
+        rtol=1e-5,
+        atol=1e-4,
+    )
+    np.testing.assert_allclose(decode_array(data["q"]), q, rtol=1e-6)
+    assert data["image_names"] == [f"scan_{index:04d}.npy" for index in (1, 2, 3)]
+    assert data["success"] == [True] * 3
+
+
+def test_series_route_rejects_empty_ranges(client, calibration_params):
+    query = urlencode({**calibration_params, "start_index": 3, "end_index": 3})
+    assert client.get(f"/api/azimuthal-integrator/series?{query}").status_code == 400
@@ -0,0 +1,107 @@
+import threading
+from urllib.parse import urlencode
+
+import numpy as np
+from conftest import unpack
+from src.array_codec import decode_array
+from src.batch_integration import integrate_frames_batch
+from src.integrator_cache import (
+    clear_integrator_cache,
+    get_integration_matrix,
+    get_multi_sector_matrix,
+    get_q_chi_arrays,
+    number_of_integration_points,
+)
+
+SHAPE = (64, 96)
+NPT = 100
+AZIMUTH_RANGES = [(-180.0, -90.0), (-90.0, 0.0), (0.0, 90.0), (90.0, 180.0)]
+
+
+def _build_concurrently(builds):
+    results = [None] * len(builds)
+    barrier = threading.Barrier(len(builds))
+
+    def run(index, build):
+        barrier.wait(5)
+        results[index] = build()
+
+    threads = [
+        threading.Thread(target=run, args=(index, build))
+        for index, build in enumerate(builds)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(60)
+    return results
+
+
+def test_concurrent_builds_on_a_shared_integrator(calibration_params):
+    # Engines, sector stacks and maps of one geometry share its integrator
+    builds = [
+        lambda azimuth_range=azimuth_range: get_integration_matrix(
+            calibration_params, SHAPE, azimuth_range, npt=NPT
+        )[0]
+        for azimuth_range in AZIMUTH_RANGES
+    ]
+    builds.append(
+        lambda: get_multi_sector_matrix(
+            calibration_params, SHAPE, [(AZIMUTH_RANGES[0], None)], npt=NPT
+        )[0]
+    )
+    builds.append(lambda: get_q_chi_arrays(calibration_params, SHAPE)[0])
+
+    clear_integrator_cache()
+    concurrent = _build_concurrently(builds)
+    clear_integrator_cache()
+    serial = [build() for build in builds]
+
+    for concurrent_result, serial_result in zip(concurrent, serial):
+        if hasattr(serial_result, "toarray"):
+            concurrent_result = concurrent_result.toarray()
+            serial_result = serial_result.toarray()
+        np.testing.assert_array_equal(concurrent_result, serial_result)
+
+
+def test_sectors_route(client, dev_frames, calibration_params):
+    sectors = [((0.0, 90.0), None), ((-90.0, 0.0), (0.5, 3.0))]
+    query = urlencode(
+        {
+            **calibration_params,
+            "sectors": ";".join(
+                ",".join(map(str, azimuth_range + (q_range or ())))
+                for azimuth_range, q_range in sectors
+            ),
+            "include_maps": "true",
+        }
+    )
+    data = unpack(client.get(f"/api/azimuthal-integrator/sectors?{query}"))
+
+    frame = dev_frames[0].copy()
+    frame[:2] = np.nan
+    intensity = decode_array(data["intensity_1"])
+    assert intensity.shape == (len(sectors), number_of_integration_points)
+    for sector_intensity, (azimuth_range, q_range) in zip(intensity, sectors):
+        matrix, _, empty = get_integration_matrix(
+            calibration_params, SHAPE, azimuth_range, q_range
+        )
+        np.testing.assert_allclose(
+            sector_intensity,
+            integrate_frames_batch(matrix, frame[None], empty)[0],
+            rtol=1e-5,
+            atol=1e-4,
+        )
+
+    sector_masks = np.unpackbits(decode_array(data["sector_masks"]), axis=1)
+    assert sector_masks.shape[0] == len(sectors)
+    assert sector_masks[:, : frame.size].any(axis=1).all()
+
+
+def test_sectors_route_rejects_invalid_sectors(client, calibration_params):
+    query = urlencode(calibration_params)
+    for sectors in ("", "0,90,1", "a,b", ";".join(["0,90"] * 33)):
+        response = client.get(
+            f"/api/azimuthal-integrator/sectors?{query}&sectors={sectors}"
+        )
+        assert response.status_code == 400
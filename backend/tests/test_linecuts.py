@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+from conftest import unpack
+from src.array_codec import decode_array
+from src.linecuts import (
+    get_inclined_linecut_samples,
+    horizontal_linecut,
+    inclined_linecut,
+    vertical_linecut,
+)
+
+
+@pytest.fixture
+def image():
+    image = np.arange(6 * 8, dtype=np.float32).reshape(6, 8)
+    image[2, 3] = np.nan
+    return image
+
+
+def test_band_means_ignore_nan_pixels(image):
+    np.testing.assert_array_equal(horizontal_linecut(image, 1), image[1])
+    np.testing.assert_allclose(
+        horizontal_linecut(image, 2, width=2), np.nanmean(image[1:4], axis=0)
+    )
+    np.testing.assert_allclose(
+        vertical_linecut(image, 3, width=2), np.nanmean(image[:, 2:5], axis=1)
+    )
+
+
+def test_fully_masked_band_is_nan(image):
+    image[:, 5] = np.nan
+    assert np.isnan(vertical_linecut(image, 5)).all()
+
+
+def test_band_outside_the_image_is_rejected(image):
+    with pytest.raises(IndexError):
+        horizontal_linecut(image, 10)
+    with pytest.raises(IndexError):
+        vertical_linecut(image, -3)
+
+
+def test_horizontal_inclined_linecut_matches_the_row(image):
+    x, y, t = get_inclined_linecut_samples(image.shape, 4.0, 1.0, 0.0)
+    intensity = inclined_linecut(image, x, y)
+
+    on_pixels = np.isclose(x[:, 0], np.round(x[:, 0]))
+    columns = np.round(x[on_pixels, 0]).astype(int)
+    np.testing.assert_allclose(intensity[on_pixels], image[1, columns], rtol=1e-6)
+    assert t[np.argmin(np.abs(x[:, 0] - 4.0))] == pytest.approx(0.0)
+
+
+def test_line_missing_the_image_is_rejected(image):
+    with pytest.raises(IndexError):
+        get_inclined_linecut_samples(image.shape, 4.0, 50.0, 0.0)
+
+
+def test_horizontal_linecut_route(client, dev_frames, calibration_params):
+    params = {"row": 30, "left_image_index": 2, "q_axis": True, **calibration_params}
+    data = unpack(client.get("/api/linecuts/horizontal", params=params))
+
+    # DEV mode shows the first frame on the right
+    np.testing.assert_allclose(decode_array(data["intensity_1"]), dev_frames[2][30])
+    np.testing.assert_allclose(decode_array(data["intensity_2"]), dev_frames[0][30])
+    np.testing.assert_array_equal(decode_array(data["pixel_positions"]), np.arange(96))
+    q = decode_array(data["q"])
+    assert q.shape == (96,)
+    assert abs(np.argmin(np.abs(q)) - 40) <= 1
+
+
+def test_vertical_linecut_route_masks_pixels(client, dev_frames):
+    data = unpack(
+        client.get("/api/linecuts/vertical", params={"column": 40, "width": 2})
+    )
+
+    intensity = decode_array(data["intensity_1"])
+    assert np.isnan(intensity[:2]).all()
+    np.testing.assert_allclose(
+        intensity[2:], dev_frames[0][2:, 39:42].mean(axis=1), rtol=1e-6
+    )
+
+
+def test_inclined_linecut_route_defaults_to_the_beam_center(
+    client, dev_frames, calibration_params
+):
+    params = {"angle": 90, "q_axis": True, **calibration_params}
+    data = unpack(client.get("/api/linecuts/inclined", params=params))
+
+    x, y = decode_array(data["x"]), decode_array(data["y"])
+    np.testing.assert_allclose(x, 40.0, atol=1e-4)
+    center = np.argmin(np.abs(decode_array(data["pixel_positions"])))
+    assert y[center] == pytest.approx(30.0)
+    assert decode_array(data["intensity_1"])[center] == pytest.approx(
+        dev_frames[0][30, 40]
+    )
+    assert decode_array(data["q"]).shape == x.shape
+
+
+def test_linecut_routes_reject_invalid_requests(client):
+    assert client.get("/api/linecuts/horizontal", params={"row": 64}).status_code == 400
+    response = client.get(
+        "/api/linecuts/vertical", params={"column": 1, "left_image_index": 10}
+    )
+    assert response.status_code == 404
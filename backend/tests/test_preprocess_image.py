@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+from src.preprocess_image import get_processed_image, get_processed_images
+
+
+@pytest.fixture
+def mask():
+    mask = np.zeros((64, 96), dtype=np.uint8)
+    mask[:8, :8] = 1
+    return mask
+
+
+def _expected(image, mask):
+    expected = image.astype(np.float32)
+    expected[(mask == 1) | (expected < 0)] = np.nan
+    return expected
+
+
+@pytest.mark.parametrize("dtype", ["<f4", ">f4", "<u2", ">u2", ">i4", "<f8"])
+def test_any_byte_order_and_type(mask, dtype):
+    rng = np.random.default_rng(0)
+    image = rng.integers(-5, 1000, size=mask.shape)
+    if np.dtype(dtype).kind == "u":
+        image = np.abs(image)
+    image = image.astype(dtype)
+
+    np.testing.assert_array_equal(
+        get_processed_image(image, mask), _expected(image, mask)
+    )
+
+
+def test_nan_pixels_stay_nan(mask, frames):
+    processed = get_processed_image(frames[0], mask)
+
+    assert np.isnan(processed[np.isnan(frames[0])]).all()
+
+
+def test_batched_matches_single(mask, frames):
+    batched = get_processed_images(frames.astype(">f4"), mask)
+
+    for frame, processed in zip(frames, batched):
+        np.testing.assert_array_equal(processed, get_processed_image(frame, mask))
+
+
+def test_batched_in_place(mask, frames):
+    expected = get_processed_images(frames, mask)
+
+    stack = frames.copy()
+    assert get_processed_images(stack, mask, out=stack) is stack
+    np.testing.assert_array_equal(stack, expected)
+
+
+def test_shape_mismatch_is_rejected(mask, frames):
+    with pytest.raises(ValueError):
+        get_processed_image(frames[0][:, :10], mask)
+    with pytest.raises(ValueError):
+        get_processed_images(frames[:, :, :10], mask)
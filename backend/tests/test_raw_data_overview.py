@@ -0,0 +1,134 @@
+import asyncio
+import threading
+from contextlib import aclosing
+
+import msgpack
+import numpy as np
+import src.dataset_session as dataset_session
+from conftest import unpack
+from routers.raw_data_overview import iterate_overview_metrics
+from src.array_codec import decode_array
+from src.dataset_session import DatasetSession
+from src.frame_workers import FrameWorkerPool
+from src.metrics_index import MetricsIndex
+
+METRICS = "max_intensity,avg_intensity,valid_pixels,roi_intensity"
+
+
+def _processed(dev_frames):
+    frames = dev_frames.copy()
+    # Rows masked in the client fixture's mask
+    frames[:, :2] = np.nan
+    return frames
+
+
+def test_overview_route(client, dev_frames):
+    data = unpack(client.get(f"/api/raw-data-overview?metrics={METRICS}&roi=0,10,5,15"))
+
+    frames = _processed(dev_frames)
+    np.testing.assert_allclose(
+        decode_array(data["max_intensities"]), np.nanmax(frames, axis=(1, 2))
+    )
+    np.testing.assert_allclose(
+        decode_array(data["avg_intensities"]),
+        np.nanmean(frames, axis=(1, 2)),
+        rtol=1e-6,
+    )
+    np.testing.assert_array_equal(
+        decode_array(data["series"]["valid_pixels"]), np.full(4, 62 * 96)
+    )
+    np.testing.assert_allclose(
+        decode_array(data["series"]["roi_intensity"]),
+        frames[:, 5:16, 0:11].sum(axis=(1, 2)),
+        rtol=1e-5,
+    )
+    assert data["image_names"] == [f"scan_{index:04d}.npy" for index in range(4)]
+
+
+def test_overview_route_reuses_the_metrics_index(client, monkeypatch):
+    first = unpack(client.get("/api/raw-data-overview"))
+
+    def fail(*args, **kwargs):
+        raise AssertionError("frame loaded again")
+
+    monkeypatch.setattr(FrameWorkerPool, "submit_frame_metrics", fail)
+    second = unpack(client.get("/api/raw-data-overview"))
+    assert second["max_intensities"] == first["max_intensities"]
+
+
+def test_overview_route_rejects_invalid_selections(client):
+    assert client.get("/api/raw-data-overview?metrics=unknown").status_code == 400
+    assert client.get("/api/raw-data-overview?metrics=roi_intensity").status_code == 400
+
+
+def test_blocking_calls_run_off_the_event_loop(tmp_path, dev_frames, monkeypatch):
+    uris = []
+    for index, frame in enumerate(dev_frames):
+        uris.append(f"scan_{index:04d}.npy")
+        np.save(tmp_path / uris[-1], frame)
+    session = DatasetSession(
+        uris, np.zeros(dev_frames.shape[1:], np.uint8), None, str(tmp_path), True
+    )
+    metrics_index = MetricsIndex(str(tmp_path / "metrics_index.sqlite"))
+    monkeypatch.setattr(
+        "routers.raw_data_overview.get_metrics_index", lambda: metrics_index
+    )
+
+    threads = []
+    for owner, name in (
+        (MetricsIndex, "get_dataset_metrics"),
+        (MetricsIndex, "put_metrics"),
+        (DatasetSession, "get_frame_fingerprint"),
+    ):
+        method = getattr(owner, name)
+
+        def recorded(*args, method=method, **kwargs):
+            threads.append(threading.get_ident())
+            return method(*args, **kwargs)
+
+        monkeypatch.setattr(owner, name, recorded)
+
+    async def run():
+        async with aclosing(iterate_overview_metrics(session)) as results:
+            return [result async for result in results]
+
+    results = asyncio.run(run())
+
+    assert sorted(result[0] for result in results) == list(range(len(uris)))
+    assert threads and threading.get_ident() not in threads
+
+
+def test_overview_websocket(client, dev_frames):
+    with client.websocket_connect("/ws/raw-data-overview") as websocket:
+        websocket.send_json({"action": "start", "metrics": ["unknown"]})
+        error = msgpack.unpackb(websocket.receive_bytes())
+        assert error["type"] == "error"
+
+        websocket.send_json(
+            {"action": "start", "batch_size": 3, "metrics": ["min_intensity"]}
+        )
+        messages = []
+        while not messages or messages[-1]["type"] != "complete":
+            messages.append(msgpack.unpackb(websocket.receive_bytes()))
+
+    assert messages[0] == {"type": "start", "num_of_files": 4}
+    batches = [message for message in messages if message["type"] == "batch"]
+    indices = np.concatenate([decode_array(batch["indices"]) for batch in batches])
+    minima = np.concatenate(
+        [decode_array(batch["series"]["min_intensity"]) for batch in batches]
+    )
+    assert sorted(indices) == [0, 1, 2, 3]
+    np.testing.assert_allclose(
+        minima, np.nanmin(_processed(dev_frames), axis=(1, 2))[indices]
+    )
+    assert messages[-1]["progress"] == 100
+
+
+def test_overview_websocket_reports_configuration_errors(client, monkeypatch):
+    monkeypatch.delenv("TILED_URI_IMAGES")
+    dataset_session.invalidate_dataset_session()
+
+    with client.websocket_connect("/ws/raw-data-overview") as websocket:
+        websocket.send_json({"action": "start"})
+        error = msgpack.unpackb(websocket.receive_bytes())
+    assert error["type"] == "error"
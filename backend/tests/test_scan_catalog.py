@@ -0,0 +1,83 @@
+import pytest
+from src.scan_catalog import InvalidCursorError, ScanCatalog, encode_cursor
+
+NAMES = ["b_002", "a_001", "b_010", "ab_003", "c_001", "b_002"]
+
+
+@pytest.fixture
+def catalog():
+    return ScanCatalog(NAMES)
+
+
+def test_pages_follow_the_dataset_order(catalog):
+    pages = []
+    cursor = None
+    while True:
+        indices, cursor, total = catalog.page(cursor=cursor, limit=4)
+        pages.append(indices)
+        assert total == len(NAMES)
+        if cursor is None:
+            break
+    assert pages == [[0, 1, 2, 3], [4, 5]]
+
+
+def test_filters_by_prefix_and_substring(catalog):
+    assert catalog.filter_indices(prefix="a").tolist() == [1, 3]
+    assert catalog.filter_indices(prefix="b_").tolist() == [0, 2, 5]
+    assert catalog.filter_indices(contains="10").tolist() == [2]
+    assert catalog.filter_indices(prefix="b", contains="002").tolist() == [0, 5]
+    assert catalog.filter_indices(prefix="z").tolist() == []
+
+
+def test_filtered_pages(catalog):
+    indices, cursor, total = catalog.page(limit=1, prefix="b_")
+    assert (indices, total) == ([0], 3)
+    indices, cursor, _ = catalog.page(cursor=cursor, limit=2, prefix="b_")
+    assert (indices, cursor) == ([2, 5], None)
+
+
+def test_lookups(catalog):
+    # Duplicate names map to their first scan
+    assert catalog.index_of("b_002") == 0
+    assert catalog.index_of("missing") is None
+    assert catalog.name_of(4) == "c_001"
+    assert catalog.name_of(len(NAMES)) is None
+    assert catalog.name_of(-1) is None
+
+
+def test_invalid_cursors(catalog):
+    with pytest.raises(InvalidCursorError):
+        catalog.page(cursor="not base64!")
+    with pytest.raises(InvalidCursorError):
+        catalog.page(cursor=encode_cursor("missing"))
+
+
+def test_scans_route_pages_through_the_dataset(client):
+    first = client.get("/api/scans", params={"limit": 3}).json()
+    assert [scan["index"] for scan in first["scans"]] == [0, 1, 2]
+    assert first["total"] == first["num_of_files"] == 4
+
+    second = client.get(
+        "/api/scans", params={"limit": 3, "cursor": first["next_cursor"]}
+    ).json()
+    assert [scan["index"] for scan in second["scans"]] == [3]
+    assert second["next_cursor"] is None
+
+    filtered = client.get("/api/scans", params={"contains": "0002"}).json()
+    assert [scan["index"] for scan in filtered["scans"]] == [2]
+    assert filtered["scans"][0]["name"].endswith("scan_0002.npy")
+
+
+def test_scans_route_rejects_invalid_requests(client):
+    assert client.get("/api/scans", params={"cursor": "x"}).status_code == 400
+    assert client.get("/api/scans", params={"limit": 0}).status_code == 422
+
+
+def test_scan_lookup_route(client):
+    name = client.get("/api/scans/lookup", params={"index": 1}).json()["name"]
+    assert client.get("/api/scans/lookup", params={"name": name}).json() == {
+        "index": 1,
+        "name": name,
+    }
+    assert client.get("/api/scans/lookup", params={"index": 9}).status_code == 404
+    assert client.get("/api/scans/lookup").status_code == 400
@@ -0,0 +1,66 @@
+import numpy as np
+from conftest import unpack
+from src.array_codec import decode_array
+from src.tile_pyramid import (
+    build_tile_pyramid,
+    get_tile,
+    get_tile_pyramid,
+    nan_mean_pool,
+)
+
+
+def test_nan_mean_pool_ignores_masked_pixels():
+    image = np.array(
+        [[1, 3, np.nan, np.nan], [5, np.nan, np.nan, np.nan], [1, 1, 2, 2]],
+        dtype=np.float32,
+    )
+
+    pooled = nan_mean_pool(image)
+
+    # The odd last row is padded with NaN
+    np.testing.assert_array_equal(pooled, [[3, np.nan], [1, 2]])
+
+
+def test_levels_halve_until_a_single_tile(frames):
+    levels = build_tile_pyramid(frames[0], tile_size=16)
+
+    assert [level.shape for level in levels] == [(64, 96), (32, 48), (16, 24), (8, 12)]
+    assert get_tile(levels, 1, 2, 1, tile_size=16).shape == (16, 16)
+    assert get_tile(levels, 2, 1, 0, tile_size=16).shape == (16, 8)
+
+
+def test_full_resolution_level_is_the_loaded_frame(frames):
+    loads = []
+
+    def load_frame():
+        loads.append(1)
+        return frames[0]
+
+    levels = get_tile_pyramid(("dataset", "scan", "v0"), load_frame, 16)
+    again = get_tile_pyramid(("dataset", "scan", "v0"), load_frame, 16)
+
+    # Level 0 is not copied into the pyramid cache, downsampled levels are reused
+    assert np.shares_memory(levels[0], frames[0])
+    assert all(level is cached for level, cached in zip(levels[1:], again[1:]))
+
+    new_levels = get_tile_pyramid(("dataset", "scan", "v1"), lambda: frames[1], 16)
+    assert not np.array_equal(new_levels[1], levels[1], equal_nan=True)
+
+
+def test_tiles_route(client, dev_frames):
+    description = unpack(client.get("/api/tiles/1"))
+    assert description["image_name"] == "scan_0001.npy"
+    assert description["levels"][0]["shape"] == [64, 96]
+
+    tile = unpack(client.get("/api/tiles/1/0/0/0"))
+    expected = dev_frames[1].copy()
+    # Rows masked in the fixture's mask
+    expected[:2] = np.nan
+    np.testing.assert_array_equal(decode_array(tile["tile"]), expected)
+    assert tile["origin"] == [0, 0]
+
+
+def test_tiles_route_rejects_missing_tiles(client):
+    assert client.get("/api/tiles/9").status_code == 404
+    assert client.get("/api/tiles/0/5/0/0").status_code == 404
+    assert client.get("/api/tiles/0/0/3/0").status_code == 404
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+import src.tiled_catalog as tiled_catalog
+from src.tiled_catalog import crawl_scan_fingerprints
+
+
+@pytest.fixture
+def crawl(tiled_server, monkeypatch, tmp_path):
+    options = tiled_catalog.get_http_client_options
+    monkeypatch.setattr(
+        tiled_catalog,
+        "get_http_client_options",
+        lambda api_key=None: dict(options(api_key), transport=tiled_server.transport()),
+    )
+    monkeypatch.setenv("TILED_CATALOG_CACHE_PATH", str(tmp_path / "catalog.json"))
+    monkeypatch.setattr(tiled_catalog, "_listings", {})
+    return lambda: crawl_scan_fingerprints(tiled_server.base_uri)
+
+
+def _search_requests(tiled_server):
+    return [request for request in tiled_server.requests if "/search/" in request[0]]
+
+
+def test_crawl_finds_the_scans(crawl):
+    scan_fingerprints = crawl()
+
+    assert list(scan_fingerprints) == [
+        "exp1/lmbdp03/frame_0",
+        "exp1/lmbdp03/frame_1",
+        "exp1/lmbdp03/frame_2",
+        "exp1/lmbdp03/frame_3",
+        "exp1/lmbdp03/frame_4",
+        "top_frame",
+    ]
+    assert len(set(scan_fingerprints.values())) == 1
+
+
+def test_refresh_revalidates_every_page(crawl, tiled_server):
+    first = crawl()
+    pages = len(_search_requests(tiled_server))
+    tiled_server.requests.clear()
+
+    assert crawl() == first
+    # Every page is requested with its ETag, and confirmed unchanged
+    requests = _search_requests(tiled_server)
+    assert len(requests) == pages
+    assert all(status == 304 for _, _, status in requests)
+
+
+def test_changed_leaf_is_listed_again(crawl, tiled_server):
+    crawl()
+
+    # Same children count, another structure for the last frame
+    tiled_server.nodes["exp1/lmbdp03/frame_4"] = np.zeros((8, 12), dtype=np.int32)
+    tiled_server.requests.clear()
+    scan_fingerprints = crawl()
+
+    # Only the page of the changed frame is listed again
+    statuses = [status for _, _, status in _search_requests(tiled_server)]
+    assert statuses.count(200) == 1
+    assert (
+        scan_fingerprints["exp1/lmbdp03/frame_4"]
+        != scan_fingerprints["exp1/lmbdp03/frame_0"]
+    )
+
+
+def test_listings_are_reloaded_from_disk(crawl, tiled_server, monkeypatch):
+    first = crawl()
+    monkeypatch.setattr(tiled_catalog, "_listings", {})
+    tiled_server.requests.clear()
+
+    assert crawl() == first
+    assert all(status == 304 for _, _, status in _search_requests(tiled_server))
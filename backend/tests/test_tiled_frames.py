@@ -0,0 +1,141 @@
+import httpx
+import numpy as np
+import pytest
+from src.tiled_frames import (
+    TiledDatasetClient,
+    TiledFrameStructures,
+    get_frame_versions,
+    get_structure_fingerprint,
+)
+
+FRAME = "exp1/lmbdp03/frame_0"
+
+
+@pytest.fixture
+def client(tiled_server):
+    get_frame_versions.cache_clear()
+    client = TiledDatasetClient(tiled_server.base_uri)
+    client.http_client = httpx.Client(transport=tiled_server.transport())
+    return client
+
+
+def _array_requests(tiled_server):
+    return [request for request in tiled_server.requests if "/array/" in request[0]]
+
+
+def test_read_records_the_version(client, tiled_server):
+    assert client.get_frame_version(FRAME) is None
+
+    np.testing.assert_array_equal(client.read_frame(FRAME), tiled_server.nodes[FRAME])
+
+    version = client.get_frame_version(FRAME)
+    assert version
+    # Recently checked, no request
+    assert len(_array_requests(tiled_server)) == 1
+
+
+def test_old_versions_are_revalidated(client, tiled_server, monkeypatch):
+    client.read_frame(FRAME)
+    version = client.get_frame_version(FRAME)
+    monkeypatch.setenv("TILED_FRAME_VERSION_MAX_AGE", "0")
+
+    assert client.get_frame_version(FRAME) == version
+    assert _array_requests(tiled_server)[-1][1:] == (version, 304)
+
+    # Rewritten in place: same structure, new content
+    tiled_server.nodes[FRAME] = tiled_server.nodes[FRAME] + 1
+    new_version = client.get_frame_version(FRAME)
+    assert new_version != version
+    assert client.get_frame_version(FRAME, revalidate=False) == new_version
+
+
+def test_known_version_is_checked(client, tiled_server):
+    version = client.get_frame_version(FRAME, known_version="stale")
+
+    assert version and version != "stale"
+    assert _array_requests(tiled_server)[-1][1:] == ("stale", 200)
+    # Recorded, not requested again
+    assert client.get_frame_version(FRAME, known_version="stale") == version
+    assert len(_array_requests(tiled_server)) == 1
+
+
+def _metadata_requests(tiled_server):
+    return [request for request in tiled_server.requests if "/metadata/" in request[0]]
+
+
+def _node_fingerprint(array):
+    return get_structure_fingerprint(
+        {
+            "shape": list(array.shape),
+            "chunks": [[size] for size in array.shape],
+            "data_type": {
+                "endianness": "little",
+                "kind": array.dtype.kind,
+                "itemsize": array.dtype.itemsize,
+            },
+        }
+    )
+
+
+def test_frames_of_a_scan_share_one_structure_request(client, tiled_server):
+    for index in range(3):
+        key = f"exp1/lmbdp03/frame_{index}"
+        np.testing.assert_array_equal(
+            client.read_frame(key, _node_fingerprint(tiled_server.nodes[key])),
+            tiled_server.nodes[key],
+        )
+
+    assert len(_metadata_requests(tiled_server)) == 1
+    assert len(_array_requests(tiled_server)) == 3
+
+
+def test_frames_with_another_structure_fetch_their_own(client, tiled_server):
+    # Same byte count as the other frames of the scan, another data type
+    other = "exp1/lmbdp03/frame_1"
+    tiled_server.nodes[other] = np.arange(96, dtype=np.int32).reshape(8, 12)
+
+    client.read_frame(FRAME, _node_fingerprint(tiled_server.nodes[FRAME]))
+    image = client.read_frame(other, _node_fingerprint(tiled_server.nodes[other]))
+
+    assert image.dtype == np.int32
+    np.testing.assert_array_equal(image, tiled_server.nodes[other])
+    assert len(_metadata_requests(tiled_server)) == 2
+
+
+def test_cached_structure_requires_the_node_fingerprint():
+    structures = TiledFrameStructures("http://tiled/api/v1/metadata/raw")
+    structure = {
+        "shape": [64, 96],
+        "chunks": [[64], [96]],
+        "data_type": {"endianness": "little", "kind": "f", "itemsize": 4},
+    }
+    structures.set_structure("scan/frame_0", structure)
+    fingerprint = get_structure_fingerprint(structure)
+
+    assert structures.get_cached_structure("scan/frame_1", fingerprint) == structure
+    assert structures.get_cached_structure("scan/frame_1", "other") is None
+    # Same byte count, another data type: not decoded with the cached structure
+    int_structure = dict(
+        structure, data_type={"endianness": "little", "kind": "i", "itemsize": 4}
+    )
+    assert (
+        structures.get_cached_structure(
+            "scan/frame_1", get_structure_fingerprint(int_structure)
+        )
+        is None
+    )
+
+
+def test_decode_follows_the_structure_byte_order():
+    structure = {
+        "shape": [2, 3],
+        "chunks": [[2], [3]],
+        "data_type": {"endianness": "big", "kind": "u", "itemsize": 2},
+    }
+    array = np.arange(6, dtype=">u2").reshape(2, 3)
+
+    np.testing.assert_array_equal(
+        TiledFrameStructures.decode(array.tobytes(), structure), array
+    )
+    # Truncated content does not fit the structure
+    assert TiledFrameStructures.decode(array.tobytes()[:-2], structure) is None
@@ -1,6 +1,5 @@
 import React, { useEffect, useState, useRef, useMemo, useCallback } from "react";
 import Plot from "react-plotly.js";
-import { decode } from "@msgpack/msgpack";
 import {
   ResolutionDataType,
   InclinedLinecut,
@@ -12,22 +11,26 @@ import {
 } from "../types";
 import { downsampleArray } from "../utils/downsampleArray";
 import { handleRelayout } from '../utils/handleRelayout';
-import { extractBinary, reconstructFloat32Array } from '../utils/dataProcessingScatterSubplot';
+import { ARRAY_ENCODING_HEADERS, decodeMsgpackResponse, decodeNdarray2D } from '../utils/decodeNdarray';
 import { generateHorizontalLinecutOverlay } from "../utils/generateHorizontalLinecutOverlay";
 import { generateVerticalLinecutOverlay } from "../utils/generateVerticalLinecutOverlay";
 import { generateInclinedLinecutOverlay } from "../utils/generateInclinedLinecutOverlay";
 import { generateAzimuthalOverlay } from "../utils/generateAzimuthalOverlay";
 import { getArrayMinMax } from "../utils/getArrayMinAndMax";
 // import { calculateMinMax } from "../utils/transformationUtils";
-import { calculateDifferenceArray } from "../utils/calculateDifferenceArray";
 import { Select } from '@mantine/core';
 
 import AzimuthalLoadingSpinner from "./AzimuthalLoadingSpinner";
-import { calculateDivisionArray } from "../utils/calculateDivisionArray";
 
 // Add a type for operation
 type OperationType = 'subtract' | 'divide';
 
+// Comparison computed by /api/scatter-subplot for each operation
+const COMPARISONS: Record<OperationType, string> = {
+  subtract: 'difference',
+  divide: 'ratio',
+};
+
 interface ScatterSubplotProps {
   setImageHeight: (height: number) => void;
   setImageWidth: (width: number) => void;
@@ -126,14 +129,8 @@ const ScatterSubplot: React.FC<ScatterSubplotProps> = React.memo(({
   // Add state for the operation type
   const [operationType, setOperationType] = useState<OperationType>('subtract');
 
-  // Calculate the result based on the operation type
-  const calculateResult = useCallback((array1: number[][], array2: number[][]) => {
-    if (operationType === 'subtract') {
-      return calculateDifferenceArray(array1, array2);
-    } else {
-      return calculateDivisionArray(array1, array2);
-    }
-  }, [operationType]);
+  // Full resolution [min, max] of the comparison array, sent by the server
+  const [comparisonRange, setComparisonRange] = useState<[number, number]>([0, 0]);
 
 
 
@@ -164,12 +161,12 @@ const ScatterSubplot: React.FC<ScatterSubplotProps> = React.memo(({
       normalizationMode,
     );
 
-    // Then calculate difference using transformed data
+    // The comparison of the frames comes from the server, the display
+    // transformations only apply to the frames themselves
     return {
       array1: transformedArray1,
       array2: transformedArray2,
-      diff: calculateResult(transformedArray1, transformedArray2)
-      // diff: calculateDifferenceArray(transformedArray1, transformedArray2)
+      diff: currentData.diff
     };
   }, [
     resolutionData,
@@ -180,7 +177,6 @@ const ScatterSubplot: React.FC<ScatterSubplotProps> = React.memo(({
     normalization,
     normalizationMode,
     mainTransformDataFunction,
-    calculateResult
   ]);
 
   // Transform the full resolution data for linecut calculations
@@ -221,11 +217,7 @@ const ScatterSubplot: React.FC<ScatterSubplotProps> = React.memo(({
     const [minValue1, maxValue1] = getArrayMinMax(dataForScaling.array1);
     const [minValue2, maxValue2] = getArrayMinMax(dataForScaling.array2);
 
-    // Calculate diff or use existing diff value
-    const diffData = transformedPlotData ? transformedPlotData.diff
-      : calculateResult(dataForScaling.array1, dataForScaling.array2);
-      // : calculateDifferenceArray(dataForScaling.array1, dataForScaling.array2);
-    const [minValueDiff, maxValueDiff] = getArrayMinMax(diffData);
+    const [minValueDiff, maxValueDiff] = comparisonRange;
 
     // Rest of your code...
     const globalMinValue = Math.min(minValue1, minValue2);
@@ -242,7 +234,7 @@ const ScatterSubplot: React.FC<ScatterSubplotProps> = React.memo(({
   }, [
     transformedPlotData,
     transformedLineData,
-    calculateResult,
+    comparisonRange,
   ]);
 
 
@@ -449,17 +441,17 @@ const ScatterSubplot: React.FC<ScatterSubplotProps> = React.memo(({
     const url = new URL("/api/scatter-subplot", window.location.origin);
     url.searchParams.append("left_image_index", leftImageIndex.toString());
     url.searchParams.append("right_image_index", rightImageIndex.toString());
+    url.searchParams.append("comparison", COMPARISONS[operationType]);
 
-    fetch(url.toString())
-      .then(response => response.arrayBuffer())
-      .then(buffer => {
-        const decoded = decode(new Uint8Array(buffer)) as any;
+    fetch(url.toString(), { headers: ARRAY_ENCODING_HEADERS })
+      .then(response => decodeMsgpackResponse(response))
+      .then(rawData => {
+        const decoded = rawData as any;
 
         // Reconstruct full resolution data
-        const fullArray1 = reconstructFloat32Array(extractBinary(decoded.array_1), decoded.metadata.shape_1);
-        const fullArray2 = reconstructFloat32Array(extractBinary(decoded.array_2), decoded.metadata.shape_2);
-        const fullDiff = calculateDifferenceArray(fullArray1, fullArray2);
-        // const fullDiff = calculateResult(fullArray1, fullArray2);
+        const fullArray1 = decodeNdarray2D(decoded.array_1);
+        const fullArray2 = decodeNdarray2D(decoded.array_2);
+        const fullDiff = decodeNdarray2D(decoded.comparison_array);
 
         // Determine factors based on image width
         const lowFactor = fullArray1[0].length > 2000 || fullArray1.length > 2000 ? 8 : 4;
@@ -467,7 +459,8 @@ const ScatterSubplot: React.FC<ScatterSubplotProps> = React.memo(({
 
         const [minValue1, maxValue1] = getArrayMinMax(fullArray1);
         const [minValue2, maxValue2] = getArrayMinMax(fullArray2);
-        const [minValueDiff, maxValueDiff] = getArrayMinMax(fullDiff);
+        const [minValueDiff, maxValueDiff] = decoded.comparison_range as [number, number];
+        setComparisonRange([minValueDiff, maxValueDiff]);
 
         // Set dimensions and full resolution data for linecuts
         setImageHeight(fullArray1.length);
@@ -551,7 +544,7 @@ const ScatterSubplot: React.FC<ScatterSubplotProps> = React.memo(({
     setImageData1,
     setImageData2,
     setIsLoadingImages,
-    // calculateResult,
+    operationType,
   ]);
 
 
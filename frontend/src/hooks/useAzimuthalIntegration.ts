@@ -1,21 +1,27 @@
 import { useState, useCallback, useRef, useEffect } from 'react';
 import { debounce } from 'lodash';
-import { decode } from "@msgpack/msgpack";
 import { AzimuthalData, AzimuthalIntegration, CalibrationParams } from '../types';
 import { leftImageColorPalette, rightImageColorPalette } from '../utils/constants';
+import { ARRAY_ENCODING_HEADERS, EncodedNdarray, decodeMsgpackResponse, decodeNdarray, decodeNdarray1D, decodeNdarray2D, isEncodedNdarray } from '../utils/decodeNdarray';
 
 /**
- * Response type for azimuthal integration data
- * This contains the core integration results
+ * Sector profiles decoded from /api/azimuthal-integrator/sectors
+ * One entry per requested sector, in the same order
  */
-interface AzimuthalIntegratorResponse {
-    q_max: number;         // Maximum q-value
-    q_1: number[];         // q-values for first integration
-    q_2: number[];         // q-values for second integration
-    intensity_1: number[]; // Intensity values for first integration
-    intensity_2: number[]; // Intensity values for second integration
-    q_array_filtered_1: number[][]; // 2D array of filtered q-values for visualization (img 1)
-    q_array_filtered_2: number[][]; // 2D array of filtered q-values for visualization (img 2)
+interface SectorProfile {
+    q: number[];           // q-values of the sector profile
+    intensity1: number[];  // Intensity values for the first image
+    intensity2: number[];  // Intensity values for the second image
+    qArray: number[][];    // q map restricted to the sector's pixels (NaN elsewhere)
+}
+
+/**
+ * A sector to integrate, as sent to the sectors endpoint
+ */
+interface SectorRequest {
+    id: number;
+    azimuthRange: [number, number];
+    qRange: [number, number] | null;
 }
 
 /**
@@ -34,21 +40,49 @@ interface CachedMatrixData {
 }
 
 /**
- * Type guard to validate azimuthal integration response
- * Ensures the response has the expected structure
+ * Type guard to validate the sectors response
+ * Ensures every array needed to rebuild the sector profiles is present
+ */
+function isSectorsResponse(value: Record<string, unknown>): boolean {
+    return (
+        typeof value.q_max === 'number' &&
+        isEncodedNdarray(value.q) &&
+        isEncodedNdarray(value.intensity_1) &&
+        isEncodedNdarray(value.intensity_2) &&
+        isEncodedNdarray(value.q_array) &&
+        isEncodedNdarray(value.sector_masks)
+    );
+}
+
+/**
+ * Type guard to validate the cake response
+ * Ensures the profiles of both images and the filtered q map are present
  */
-function isAzimuthalIntegratorResponse(value: unknown): value is AzimuthalIntegratorResponse {
-    const response = value as AzimuthalIntegratorResponse;
+function isCakeResponse(value: Record<string, unknown>): boolean {
     return (
-        typeof response === 'object' &&
-        response !== null &&
-        typeof response.q_max === 'number' &&
-        Array.isArray(response.q_1) &&
-        Array.isArray(response.q_2) &&
-        Array.isArray(response.intensity_1) &&
-        Array.isArray(response.intensity_2) &&
-        Array.isArray(response.q_array_filtered_1) &&
-        Array.isArray(response.q_array_filtered_2)
+        typeof value.q_max === 'number' &&
+        isEncodedNdarray(value.q_1) &&
+        isEncodedNdarray(value.intensity_1) &&
+        isEncodedNdarray(value.intensity_2) &&
+        isEncodedNdarray(value.q_array_filtered_1)
+    );
+}
+
+/**
+ * Restricts the q map to the pixels of one sector
+ * Mask bits are packed big-endian (numpy.packbits), one per pixel
+ */
+function maskQArray(
+    qArray: ArrayLike<number>,
+    packedMask: ArrayLike<number>,
+    rows: number,
+    cols: number
+): number[][] {
+    return Array.from({ length: rows }, (_, row) =>
+        Array.from({ length: cols }, (_, col) => {
+            const pixel = row * cols + col;
+            return (packedMask[pixel >> 3] >> (7 - (pixel & 7))) & 1 ? qArray[pixel] : NaN;
+        })
     );
 }
 
@@ -76,6 +110,10 @@ export default function useAzimuthalIntegration(calibrationParams: CalibrationPa
 
     const [isProcessing, setIsProcessing] = useState<boolean>(false);
 
+    // Incremented by every profile request, previews older than the latest
+    // request are dropped
+    const requestSequenceRef = useRef<number>(0);
+
 
     // ======== UTILITY FUNCTIONS ========
 
@@ -143,6 +181,131 @@ export default function useAzimuthalIntegration(calibrationParams: CalibrationPa
         });
     }, []);
 
+    /**
+     * Fetches the profiles of several sectors in one request
+     * The server integrates every sector of both images with a single sparse product
+     */
+    const fetchSectorsData = useCallback(async (
+        sectors: SectorRequest[]
+    ): Promise<{ qMax: number, profiles: SectorProfile[] }> => {
+        // Create a URL for the multi-sector endpoint
+        const url = new URL('/api/azimuthal-integrator/sectors', window.location.origin);
+
+        // Add all calibration parameters to the URL
+        Object.entries(calibrationParams).forEach(([key, value]) => {
+            url.searchParams.set(key, value.toString());
+        });
+
+        // Profiles span the full q range, the q range only filters the displayed q map
+        url.searchParams.set(
+            'sectors',
+            sectors.map(sector => `${sector.azimuthRange[0]},${sector.azimuthRange[1]}`).join(';')
+        );
+        url.searchParams.set('include_maps', 'true');
+
+        const response = await fetch(url.toString(), { headers: ARRAY_ENCODING_HEADERS });
+
+        // Check for HTTP errors
+        if (!response.ok) {
+            throw new Error(`Failed to fetch azimuthal integration data: ${await response.text()}`);
+        }
+
+        // Decode the binary msgpack response, arrays are sent as binary buffers
+        const rawData = await decodeMsgpackResponse(response);
+        if (!isSectorsResponse(rawData)) {
+            throw new Error('Invalid azimuthal integrator response format from server');
+        }
+
+        // (sectors, npt) profiles, one q map and one packed pixel mask per sector
+        const q = decodeNdarray2D(rawData.q as EncodedNdarray);
+        const intensity1 = decodeNdarray2D(rawData.intensity_1 as EncodedNdarray);
+        const intensity2 = decodeNdarray2D(rawData.intensity_2 as EncodedNdarray);
+        const encodedQArray = rawData.q_array as EncodedNdarray;
+        const [rows, cols] = encodedQArray.shape;
+        const qArray = decodeNdarray(encodedQArray);
+        const encodedMasks = rawData.sector_masks as EncodedNdarray;
+        const masks = decodeNdarray(encodedMasks);
+        const bytesPerSector = encodedMasks.shape[1];
+
+        return {
+            qMax: rawData.q_max as number,
+            profiles: sectors.map((_, index) => ({
+                q: q[index],
+                intensity1: intensity1[index],
+                intensity2: intensity2[index],
+                qArray: maskQArray(
+                    qArray,
+                    masks.subarray(index * bytesPerSector, (index + 1) * bytesPerSector),
+                    rows,
+                    cols
+                )
+            }))
+        };
+    }, [calibrationParams]);
+
+    /**
+     * Fetches the profile of one azimuth range sliced from the server's cached cake
+     * Fast enough for slider drags (the frames are not integrated again), but
+     * approximate: the exact sector profile is fetched once the slider settles
+     */
+    const fetchCakeData = useCallback(async (
+        azimuthRange: [number, number]
+    ): Promise<SectorProfile> => {
+        const url = new URL('/api/azimuthal-integrator/cake', window.location.origin);
+
+        Object.entries(calibrationParams).forEach(([key, value]) => {
+            url.searchParams.set(key, value.toString());
+        });
+        url.searchParams.set('azimuth_range_deg', `${azimuthRange[0]},${azimuthRange[1]}`);
+        url.searchParams.set('include_maps', 'true');
+
+        const response = await fetch(url.toString(), { headers: ARRAY_ENCODING_HEADERS });
+
+        if (!response.ok) {
+            throw new Error(`Failed to fetch azimuthal integration data: ${await response.text()}`);
+        }
+
+        const rawData = await decodeMsgpackResponse(response);
+        if (!isCakeResponse(rawData)) {
+            throw new Error('Invalid azimuthal integrator response format from server');
+        }
+
+        // Both images share the detector geometry, hence the q bins and q map
+        return {
+            q: decodeNdarray1D(rawData.q_1 as EncodedNdarray),
+            intensity1: decodeNdarray1D(rawData.intensity_1 as EncodedNdarray),
+            intensity2: decodeNdarray1D(rawData.intensity_2 as EncodedNdarray),
+            qArray: decodeNdarray2D(rawData.q_array_filtered_1 as EncodedNdarray)
+        };
+    }, [calibrationParams]);
+
+    /**
+     * Shows the cake profile of an azimuth range while its slider moves
+     */
+    const previewAzimuthalData = useCallback(async (
+        id: number,
+        qRange: [number, number] | null,
+        azimuthRange: [number, number]
+    ) => {
+        const sequence = ++requestSequenceRef.current;
+        try {
+            const profile = await fetchCakeData(azimuthRange);
+            // A later preview or exact profile was requested meanwhile
+            if (sequence !== requestSequenceRef.current) return;
+
+            updateIntegrationData(id, {
+                q1: profile.q,
+                q2: profile.q,
+                intensity1: profile.intensity1,
+                intensity2: profile.intensity2,
+                qArray1: filterByQRange(profile.qArray, qRange),
+                qArray2: filterByQRange(profile.qArray, qRange)
+            });
+        } catch (error) {
+            console.error('Error in azimuthal integration preview:', error);
+        }
+    }, [fetchCakeData, filterByQRange, updateIntegrationData]);
+
     /**
      * Main data fetching function
      * Fetches azimuthal integration data
@@ -155,6 +318,8 @@ export default function useAzimuthalIntegration(calibrationParams: CalibrationPa
 
         // Set loading state
         setIsProcessing(true);
+        // Previews still in flight are outdated by this profile
+        requestSequenceRef.current++;
 
         // Generate a unique key for caching based on current parameters
         const currentCacheKey = createCacheKey(calibrationParams, azimuthRange);
@@ -168,59 +333,37 @@ export default function useAzimuthalIntegration(calibrationParams: CalibrationPa
             console.log('Need to fetch new data:', needsNewData);
 
             if (needsNewData) {
-                // Create a URL for the azimuthal integrator endpoint
-                const url = new URL('/api/azimuthal-integrator', window.location.origin);
-
-                // Add all calibration parameters to the URL
-                Object.entries(calibrationParams).forEach(([key, value]) => {
-                    url.searchParams.set(key, value.toString());
-                });
-
-                // Add azimuth range to the parameters
-                url.searchParams.set('azimuth_range_deg', `${azimuthRange[0]},${azimuthRange[1]}`);
-
-                // Fetch azimuthal integration data
-                const response = await fetch(url.toString());
-
-                // Check for HTTP errors
-                if (!response.ok) {
-                    throw new Error(`Failed to fetch azimuthal integration data: ${await response.text()}`);
-                }
-
-                // Decode the binary msgpack response
-                const decodedData = decode(new Uint8Array(await response.arrayBuffer()));
-
-                // Validate the response format
-                if (!isAzimuthalIntegratorResponse(decodedData)) {
-                    throw new Error('Invalid azimuthal integrator response format from server');
-                }
+                const { qMax, profiles: [profile] } = await fetchSectorsData([
+                    { id, azimuthRange, qRange }
+                ]);
 
                 // Store fetched data in cache
                 setCachedMatrixData({
-                    qArray1: decodedData.q_array_filtered_1,
-                    qArray2: decodedData.q_array_filtered_2,
+                    qArray1: profile.qArray,
+                    qArray2: profile.qArray,
                     calibrationHash: currentCacheKey,
                     azimuthRange,
-                    intensityData1: decodedData.intensity_1,
-                    intensityData2: decodedData.intensity_2,
-                    qValues1: decodedData.q_1,
-                    qValues2: decodedData.q_2
+                    intensityData1: profile.intensity1,
+                    intensityData2: profile.intensity2,
+                    qValues1: profile.q,
+                    qValues2: profile.q
                 });
 
                 // Update max Q value if needed (first fetch only)
                 if (maxQValue === 2) {
-                    setMaxQValue(decodedData.q_max);
-                    setGlobalQRange([0, decodedData.q_max]);
+                    setMaxQValue(qMax);
+                    setGlobalQRange([0, qMax]);
                 }
 
                 // Update integration data with filtered values
+                // (both images share the detector geometry, hence the q map)
                 updateIntegrationData(id, {
-                    q1: decodedData.q_1,
-                    q2: decodedData.q_2,
-                    intensity1: decodedData.intensity_1,
-                    intensity2: decodedData.intensity_2,
-                    qArray1: filterByQRange(decodedData.q_array_filtered_1, qRange),
-                    qArray2: filterByQRange(decodedData.q_array_filtered_2, qRange)
+                    q1: profile.q,
+                    q2: profile.q,
+                    intensity1: profile.intensity1,
+                    intensity2: profile.intensity2,
+                    qArray1: filterByQRange(profile.qArray, qRange),
+                    qArray2: filterByQRange(profile.qArray, qRange)
                 });
             } else {
                 // Use cached data if available
@@ -244,11 +387,50 @@ export default function useAzimuthalIntegration(calibrationParams: CalibrationPa
         calibrationParams,
         cachedMatrixData,
         createCacheKey,
+        fetchSectorsData,
         filterByQRange,
         maxQValue,
         updateIntegrationData
     ]);
 
+    /**
+     * Refreshes every sector when the calibration changes
+     * All sectors are integrated in a single request instead of one per sector
+     */
+    const previousCalibrationRef = useRef(calibrationParams);
+    useEffect(() => {
+        if (previousCalibrationRef.current === calibrationParams) return;
+        previousCalibrationRef.current = calibrationParams;
+
+        // Cached q maps belong to the previous geometry
+        setCachedMatrixData(null);
+        if (azimuthalIntegrations.length === 0) return;
+
+        const sectors = azimuthalIntegrations.map(integration => ({
+            id: integration.id,
+            azimuthRange: integration.azimuthRange,
+            qRange: integration.qRange
+        }));
+
+        setIsProcessing(true);
+        fetchSectorsData(sectors)
+            .then(({ profiles }) => {
+                profiles.forEach((profile, index) => {
+                    const { id, qRange } = sectors[index];
+                    updateIntegrationData(id, {
+                        q1: profile.q,
+                        q2: profile.q,
+                        intensity1: profile.intensity1,
+                        intensity2: profile.intensity2,
+                        qArray1: filterByQRange(profile.qArray, qRange),
+                        qArray2: filterByQRange(profile.qArray, qRange)
+                    });
+                });
+            })
+            .catch(error => console.error('Error in azimuthal integration:', error))
+            .finally(() => setIsProcessing(false));
+    }, [calibrationParams, azimuthalIntegrations, fetchSectorsData, filterByQRange, updateIntegrationData]);
+
     // ======== DEBOUNCED FUNCTIONS ========
 
     /**
@@ -275,6 +457,22 @@ export default function useAzimuthalIntegration(calibrationParams: CalibrationPa
         }, 100) // 100ms debounce time
     ).current;
 
+    /**
+     * Debounced cake preview of an azimuth range
+     * Keeps the profile following the slider between exact integrations
+     */
+    const debouncedAzimuthPreview = useRef(
+        debounce((params: {
+            id: number,
+            qRange: [number, number] | null,
+            azimuthRange: [number, number],
+            previewAzimuthalData: typeof previewAzimuthalData
+        }) => {
+            const { id, qRange, azimuthRange, previewAzimuthalData } = params;
+            previewAzimuthalData(id, qRange, azimuthRange);
+        }, 100) // 100ms debounce time, answered from the cached cake
+    ).current;
+
     /**
      * Debounced version of azimuth range update
      * Prevents excessive API calls during slider movement
@@ -305,9 +503,10 @@ export default function useAzimuthalIntegration(calibrationParams: CalibrationPa
     useEffect(() => {
         return () => {
             debouncedQRangeUpdate.cancel();
+            debouncedAzimuthPreview.cancel();
             debouncedAzimuthRangeUpdate.cancel();
         };
-    }, [debouncedQRangeUpdate, debouncedAzimuthRangeUpdate]);
+    }, [debouncedQRangeUpdate, debouncedAzimuthPreview, debouncedAzimuthRangeUpdate]);
 
     // ======== INTEGRATION MANAGEMENT FUNCTIONS ========
 
@@ -359,6 +558,13 @@ export default function useAzimuthalIntegration(calibrationParams: CalibrationPa
     const updateAzimuthalRange = useCallback((id: number, azimuthRange: [number, number]) => {
         const currentIntegration = azimuthalIntegrations.find(i => i.id === id);
         if (currentIntegration) {
+            // Approximate profile right away, exact one once the slider settles
+            debouncedAzimuthPreview({
+                id,
+                qRange: currentIntegration.qRange,
+                azimuthRange,
+                previewAzimuthalData
+            });
             debouncedAzimuthRangeUpdate({
                 id,
                 qRange: currentIntegration.qRange,
@@ -368,7 +574,13 @@ export default function useAzimuthalIntegration(calibrationParams: CalibrationPa
                 fetchAzimuthalData
             });
         }
-    }, [azimuthalIntegrations, fetchAzimuthalData, debouncedAzimuthRangeUpdate]);
+    }, [
+        azimuthalIntegrations,
+        fetchAzimuthalData,
+        previewAzimuthalData,
+        debouncedAzimuthPreview,
+        debouncedAzimuthRangeUpdate
+    ]);
 
     /**
      * Updates the color of an integration line
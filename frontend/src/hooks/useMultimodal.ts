@@ -1,6 +1,7 @@
 // import { useState, useCallback, useEffect } from 'react';
 // import { decode } from "@msgpack/msgpack";
 // import { CalibrationParams } from '../types';
+import { ARRAY_ENCODING_HEADERS, decodeMsgpackResponse, decodeNdarray2D, isEncodedNdarray } from '../utils/decodeNdarray';
 
 // // Define the response interface for q-vectors
 // interface QVectorsResponse {
@@ -135,7 +136,6 @@
 
 
 import { useState, useCallback, useEffect } from 'react';
-import { decode } from "@msgpack/msgpack";
 import { CalibrationParams } from '../types';
 
 // Define the response interface for q-matrices
@@ -200,15 +200,19 @@ export default function useMultimodal() {
       });
 
       // Fetch the data
-      const response = await fetch(url.toString());
+      const response = await fetch(url.toString(), { headers: ARRAY_ENCODING_HEADERS });
 
       // Check for HTTP errors
       if (!response.ok) {
         throw new Error(`Failed to fetch q-matrices: ${await response.text()}`);
       }
 
-      // Decode the msgpack response
-      const decodedData = decode(new Uint8Array(await response.arrayBuffer()));
+      // Decode the msgpack response, q-matrices are sent as binary float32 arrays
+      const rawData = await decodeMsgpackResponse(response);
+      const decodedData = {
+        q_x: isEncodedNdarray(rawData.q_x) ? decodeNdarray2D(rawData.q_x) : rawData.q_x,
+        q_y: isEncodedNdarray(rawData.q_y) ? decodeNdarray2D(rawData.q_y) : rawData.q_y,
+      };
 
       // Validate the response format using the type guard
       if (!isQMatricesResponse(decodedData)) {
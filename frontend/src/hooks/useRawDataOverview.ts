@@ -1,6 +1,6 @@
 import { useState, useCallback, useEffect, useRef } from 'react';
 import { notifications } from '@mantine/notifications';
-import { decode } from "@msgpack/msgpack";
+import { ARRAY_ENCODING_HEADERS, decodeMsgpackResponse, decodeNdarray1D, isEncodedNdarray } from '../utils/decodeNdarray';
 import { DisplayOption } from '../components/RawDataOverviewAccordion';
 
 interface RawDataOverview {
@@ -133,25 +133,30 @@ export default function useRawDataOverview() {
             });
 
             // Keep the /api prefix to match your backend structure
-            const response = await fetch('/api/raw-data-overview');
+            const response = await fetch('/api/raw-data-overview', { headers: ARRAY_ENCODING_HEADERS });
 
             if (!response.ok) {
                 throw new Error(`Failed to fetch spectrum data: ${response.statusText}`);
             }
 
             // Assuming the response is in MessagePack format
-            const buffer = await response.arrayBuffer();
-            const decoded = decode(new Uint8Array(buffer)) as any;
+            const decoded = await decodeMsgpackResponse(response) as any;
+
+            // Intensities are sent as binary float64 arrays
+            const maxIntensities = isEncodedNdarray(decoded.max_intensities)
+                ? decodeNdarray1D(decoded.max_intensities) : decoded.max_intensities;
+            const avgIntensities = isEncodedNdarray(decoded.avg_intensities)
+                ? decodeNdarray1D(decoded.avg_intensities) : decoded.avg_intensities;
 
             // Set number of files
-            if (decoded.max_intensities) {
-                setNumOfFiles(decoded.max_intensities.length);
+            if (maxIntensities) {
+                setNumOfFiles(maxIntensities.length);
             }
 
             // Update spectrum data
             setSpectrumData({
-                max_intensities: decoded.max_intensities || [],
-                avg_intensities: decoded.avg_intensities || [],
+                max_intensities: maxIntensities || [],
+                avg_intensities: avgIntensities || [],
                 image_names: decoded.image_names || []
             });
 
@@ -0,0 +1,207 @@
+import { ExtData, decode } from "@msgpack/msgpack";
+import { extractBinary } from "./dataProcessingScatterSubplot";
+
+/**
+ * Array encoded by the backend codec (backend/src/array_codec.py):
+ * raw little-endian buffer plus the dtype and shape needed to rebuild it
+ */
+export interface EncodedNdarray {
+  dtype: string;        // NumPy dtype string, e.g. "<f4"
+  shape: number[];      // Array shape, e.g. [height, width]
+  data: Uint8Array | ExtData;
+  codec?: string;       // Compression codec of data, absent for raw buffers
+  shuffle?: boolean;    // Compressed bytes grouped by byte position within items
+}
+
+/**
+ * Request header listing the codecs the backend may compress large arrays with
+ * (backend/src/array_compression.py). Browsers only decompress deflate natively.
+ */
+export const ARRAY_ENCODING_HEADERS = { "X-Array-Encoding": "deflate" };
+
+type NumericTypedArray =
+  | Float32Array
+  | Float64Array
+  | Uint8Array
+  | Uint16Array
+  | Uint32Array
+  | Int8Array
+  | Int16Array
+  | Int32Array;
+
+type TypedArrayConstructor = {
+  new (buffer: ArrayBuffer, byteOffset: number, length: number): NumericTypedArray;
+  BYTES_PER_ELEMENT: number;
+};
+
+const TYPED_ARRAY_CONSTRUCTORS: Record<string, TypedArrayConstructor> = {
+  "<f4": Float32Array,
+  "<f8": Float64Array,
+  "|u1": Uint8Array,
+  "|i1": Int8Array,
+  "<u2": Uint16Array,
+  "<i2": Int16Array,
+  "<u4": Uint32Array,
+  "<i4": Int32Array,
+};
+
+export function isEncodedNdarray(value: unknown): value is EncodedNdarray {
+  const encoded = value as EncodedNdarray;
+  return (
+    typeof encoded === "object" &&
+    encoded !== null &&
+    typeof encoded.dtype === "string" &&
+    Array.isArray(encoded.shape) &&
+    encoded.data !== undefined
+  );
+}
+
+const ITEM_SIZES: Record<string, number> = {
+  ...Object.fromEntries(
+    Object.entries(TYPED_ARRAY_CONSTRUCTORS).map(([dtype, TypedArray]) => [dtype, TypedArray.BYTES_PER_ELEMENT])
+  ),
+  "<f2": 2,
+};
+
+/**
+ * Zlib-wrapped deflate data, as written by Python's zlib.compress
+ */
+async function inflate(bytes: Uint8Array): Promise<Uint8Array> {
+  const stream = new Blob([bytes as BlobPart]).stream().pipeThrough(new DecompressionStream("deflate"));
+  return new Uint8Array(await new Response(stream).arrayBuffer());
+}
+
+/**
+ * Undo the byte shuffle of the backend: bytes are grouped by their position
+ * within each item, [all first bytes, all second bytes, ...]
+ */
+function unshuffleBytes(bytes: Uint8Array, itemSize: number): Uint8Array {
+  const numItems = bytes.length / itemSize;
+  const result = new Uint8Array(bytes.length);
+  for (let byte = 0; byte < itemSize; byte++) {
+    const plane = bytes.subarray(byte * numItems, (byte + 1) * numItems);
+    for (let i = 0; i < numItems; i++) {
+      result[i * itemSize + byte] = plane[i];
+    }
+  }
+  return result;
+}
+
+/**
+ * Raw buffer of a compressed array
+ */
+async function inflateNdarray(encoded: EncodedNdarray): Promise<EncodedNdarray> {
+  if (encoded.codec !== "deflate") {
+    throw new Error(`Unsupported array codec: ${encoded.codec}`);
+  }
+  const itemSize = ITEM_SIZES[encoded.dtype];
+  if (!itemSize) {
+    throw new Error(`Unsupported array dtype: ${encoded.dtype}`);
+  }
+
+  let bytes = await inflate(extractBinary(encoded.data));
+  if (encoded.shuffle && itemSize > 1) {
+    bytes = unshuffleBytes(bytes, itemSize);
+  }
+  return { dtype: encoded.dtype, shape: encoded.shape, data: bytes };
+}
+
+/**
+ * Decompress every compressed array of a decoded msgpack value, so the
+ * synchronous decoders below can read them
+ */
+export async function inflateNdarrays<T>(value: T): Promise<T> {
+  if (isEncodedNdarray(value)) {
+    return (value.codec ? await inflateNdarray(value) : value) as T;
+  }
+  if (Array.isArray(value)) {
+    return (await Promise.all(value.map(item => inflateNdarrays(item)))) as T;
+  }
+  if (typeof value === "object" && value !== null && !(value instanceof Uint8Array) && !(value instanceof ExtData)) {
+    const entries = await Promise.all(
+      Object.entries(value).map(async ([key, item]) => [key, await inflateNdarrays(item)])
+    );
+    return Object.fromEntries(entries) as T;
+  }
+  return value;
+}
+
+/**
+ * Decoded body of a msgpack response, with its compressed arrays inflated
+ */
+export async function decodeMsgpackResponse(response: Response): Promise<Record<string, unknown>> {
+  const decoded = decode(new Uint8Array(await response.arrayBuffer())) as Record<string, unknown>;
+  return inflateNdarrays(decoded);
+}
+
+/**
+ * Float32 values of little-endian IEEE half precision floats
+ */
+function decodeFloat16(bytes: Uint8Array): Float32Array {
+  const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+  const result = new Float32Array(bytes.byteLength / 2);
+  for (let i = 0; i < result.length; i++) {
+    const half = view.getUint16(2 * i, true);
+    const sign = half & 0x8000 ? -1 : 1;
+    const exponent = (half >> 10) & 0x1f;
+    const mantissa = half & 0x3ff;
+    if (exponent === 0) {
+      // Zero or subnormal
+      result[i] = sign * mantissa * 2 ** -24;
+    } else if (exponent === 0x1f) {
+      result[i] = mantissa ? NaN : sign * Infinity;
+    } else {
+      result[i] = sign * (1 + mantissa / 1024) * 2 ** (exponent - 15);
+    }
+  }
+  return result;
+}
+
+/**
+ * View the encoded buffer as a flat typed array (copied only if misaligned).
+ * Compressed arrays must go through inflateNdarrays first, float16 arrays are
+ * widened to float32.
+ */
+export function decodeNdarray(encoded: EncodedNdarray): NumericTypedArray {
+  if (encoded.codec) {
+    throw new Error(`Compressed array (${encoded.codec}), inflate it with inflateNdarrays first`);
+  }
+  if (encoded.dtype === "<f2") {
+    return decodeFloat16(extractBinary(encoded.data));
+  }
+
+  const TypedArray = TYPED_ARRAY_CONSTRUCTORS[encoded.dtype];
+  if (!TypedArray) {
+    throw new Error(`Unsupported array dtype: ${encoded.dtype}`);
+  }
+
+  let bytes = extractBinary(encoded.data);
+  // Typed array views must start on a multiple of the element size
+  if (bytes.byteOffset % TypedArray.BYTES_PER_ELEMENT !== 0) {
+    bytes = bytes.slice();
+  }
+
+  return new TypedArray(
+    bytes.buffer as ArrayBuffer,
+    bytes.byteOffset,
+    bytes.byteLength / TypedArray.BYTES_PER_ELEMENT
+  );
+}
+
+/**
+ * Decode a 1D array into a plain number array
+ */
+export function decodeNdarray1D(encoded: EncodedNdarray): number[] {
+  return Array.from(decodeNdarray(encoded));
+}
+
+/**
+ * Decode a 2D array into nested row arrays
+ */
+export function decodeNdarray2D(encoded: EncodedNdarray): number[][] {
+  const flat = decodeNdarray(encoded);
+  const [rows, cols] = encoded.shape;
+  return Array.from({ length: rows }, (_, i) =>
+    Array.from(flat.subarray(i * cols, (i + 1) * cols))
+  );
+}
@@ -1,6 +1,5 @@
 // utils/handleRelayout.ts
 import { ResolutionDataType, TransformDataFunction } from '../types';
-import { calculateDifferenceArray } from './calculateDifferenceArray';
 
 interface HandleRelayoutProps {
   plotData: any;
@@ -71,9 +70,6 @@ export const handleRelayout = (
       normalizationMode,
     );
 
-    // Calculate difference using transformed data
-    const transformedDiff = calculateDifferenceArray(transformedArray1, transformedArray2);
-
     setPlotData(prev => ({
       ...prev,
       data: [
@@ -87,7 +83,7 @@ export const handleRelayout = (
         },
         {
           ...prev.data[2],
-          z: transformedDiff,
+          z: resolutionData.low.diff,
         }
       ],
       layout: {